@@ -1,103 +1,88 @@
 import os
 import csv
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from dotenv import load_dotenv
-import time
 import logging
+from poe_browser import BrowserSession
+from poe_earnings_store import EarningsStore
+from poe_metrics import metrics
+from poe_waits import wait_until, DEFAULT_PAGE_TIMEOUT
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=os.getenv('POE_LOG_LEVEL', 'INFO').upper(), format='%(asctime)s - %(levelname)s - %(message)s')
 load_dotenv()
 
-def setup_driver():
-    options = webdriver.ChromeOptions()
-    options.add_argument("start-maximized")
-    
-    # Add these lines to suppress Chrome logging
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    options.add_argument("--log-level=3")
-    
-    return webdriver.Chrome(options=options)
+CREATORS_URL = "https://poe.com/creators"
 
-def login_to_poe(driver, email):
-    try:
-        logging.info("Navigating to login page...")
-        driver.get("https://poe.com/login")
-        
-        logging.info("Waiting for email input field...")
-        email_input = WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='email']"))
-        )
-        
-        logging.info("Entering email...")
-        email_input.send_keys(email)
-        
-        logging.info("Clicking Go button...")
-        go_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[text()='Go']"))
-        )
-        go_button.click()
-        
-        logging.info("Waiting for verification code input...")
-        verification_input = WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input.VerificationCodeInput_verificationCodeInput__RgX85"))
-        )
-        
-        verification_code = input("Enter the verification code sent to your email: ")
-        verification_input.send_keys(verification_code)
-        
-        logging.info("Clicking Log In button...")
-        login_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[contains(@class, 'Button_buttonBase__Bv9Vx') and contains(@class, 'Button_primary__6UIn0') and text()='Log In']"))
-        )
-        login_button.click()
-        
-        logging.info("Waiting for login to complete...")
-        time.sleep(5)
-        
-        logging.info("Login process completed.")
-    except Exception as e:
-        logging.error(f"An error occurred during login: {str(e)}")
-        raise
+# Reads the headers and every data row of the table in one round trip. Rows
+# keep the same shape and cell classes as the per-element lookups it replaces.
+SNAPSHOT_TABLE_JS = """
+const table = arguments[0];
+const text = (node) => node ? node.innerText.trim() : null;
+const headers = Array.from(table.querySelectorAll("th"), text);
+const rows = [];
+for (const row of Array.from(table.querySelectorAll("tr")).slice(1)) {
+    const cols = row.querySelectorAll("td");
+    if (cols.length !== 6) { continue; }
+    const cells = [text(cols[0].querySelector(".CreatorHubBotMetricsTable_botName__XTijb"))];
+    for (let i = 1; i < 6; i++) {
+        cells.push(text(cols[i].querySelector(".CreatorHubBotMetricsTable_mainEarnings__byXzb")));
+    }
+    rows.push(cells);
+}
+const first = table.querySelectorAll("tr")[1];
+return {headers, rows, firstRow: first ? first.innerText : null};
+"""
 
-def extract_table_data(table):
-    rows = table.find_elements(By.TAG_NAME, "tr")[1:]  # Skip header row
+FIRST_ROW_JS = """
+const row = arguments[0].querySelectorAll("tr")[1];
+return row ? row.innerText : null;
+"""
+
+def snapshot_table(table):
+    snapshot = table.parent.execute_script(SNAPSHOT_TABLE_JS, table)
     data = []
-    
-    for row in rows:
-        cols = row.find_elements(By.TAG_NAME, "td")
-        if len(cols) == 6:
-            bot_name = cols[0].find_element(By.CLASS_NAME, "CreatorHubBotMetricsTable_botName__XTijb").text.strip()
-            earnings = cols[1].find_element(By.CLASS_NAME, "CreatorHubBotMetricsTable_mainEarnings__byXzb").text.strip()
-            messages = cols[2].find_element(By.CLASS_NAME, "CreatorHubBotMetricsTable_mainEarnings__byXzb").text.strip()
-            unique_users = cols[3].find_element(By.CLASS_NAME, "CreatorHubBotMetricsTable_mainEarnings__byXzb").text.strip()
-            followers = cols[4].find_element(By.CLASS_NAME, "CreatorHubBotMetricsTable_mainEarnings__byXzb").text.strip()
-            upvote_ratio = cols[5].find_element(By.CLASS_NAME, "CreatorHubBotMetricsTable_mainEarnings__byXzb").text.strip()
-            
-            data.append([bot_name, earnings, messages, unique_users, followers, upvote_ratio])
-    
-    return data
+    for row in snapshot['rows']:
+        if None in row:
+            raise NoSuchElementException(f"Earnings table row is missing a value: {row}")
+        data.append(row)
+    return snapshot['headers'], data, snapshot['firstRow']
+
+def extract_table_data(table):
+    return snapshot_table(table)[1]
+
+def wait_for_table_change(driver, table, previous_first_row, timeout):
+    # The table has moved on once the old element is detached or its first
+    # row no longer matches the page we just read
+    def changed(d):
+        try:
+            return EC.staleness_of(table)(d) or d.execute_script(FIRST_ROW_JS, table) != previous_first_row
+        except StaleElementReferenceException:
+            return True
+    return wait_until(driver, changed, timeout)
 
-def extract_creator_earnings(driver):
+def extract_creator_earnings(driver, page_timeout=DEFAULT_PAGE_TIMEOUT, creators_url=CREATORS_URL):
     logging.info("Navigating to creators page...")
-    driver.get("https://poe.com/creators")
-    
-    logging.info("Waiting for earnings table to load...")
-    table = WebDriverWait(driver, 30).until(
-        EC.presence_of_element_located((By.CLASS_NAME, "CreatorHubBotMetricsTable_table__8JeRY"))
-    )
-    
-    headers = [th.text.strip() for th in table.find_elements(By.TAG_NAME, "th")]
+    with metrics.phase("initial_load"):
+        driver.get(creators_url)
+        
+        logging.info("Waiting for earnings table to load...")
+        table = WebDriverWait(driver, 30).until(
+            EC.presence_of_element_located((By.CLASS_NAME, "CreatorHubBotMetricsTable_table__8JeRY"))
+        )
     
+    headers = None
     all_data = []
     page = 1
+    complete = True
     
     while True:
-        logging.info(f"Extracting data from page {page}")
-        page_data = extract_table_data(table)
+        logging.debug(f"Extracting data from page {page}")
+        with metrics.phase("extraction"):
+            page_headers, page_data, first_row = snapshot_table(table)
+        headers = headers or page_headers
         all_data.extend(page_data)
         
         try:
@@ -116,27 +101,32 @@ def extract_creator_earnings(driver):
                 logging.info("Next button is disabled or not found. Reached the last page.")
                 break
             
-            next_button.click()
-            logging.info(f"Clicked next page button. Moving to page {page + 1}")
-            
-            # Wait for the table to update
-            time.sleep(2)
-            
-            # Re-locate the table after page change
-            table = WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "CreatorHubBotMetricsTable_table__8JeRY"))
-            )
+            with metrics.phase("paging"):
+                next_button.click()
+                logging.debug(f"Clicked next page button. Moving to page {page + 1}")
+                
+                # Wait for the table to update
+                if not wait_for_table_change(driver, table, first_row, page_timeout):
+                    logging.warning("Table did not refresh after clicking next; reading it anyway")
+                
+                # Re-locate the table after page change
+                table = WebDriverWait(driver, 30).until(
+                    EC.presence_of_element_located((By.CLASS_NAME, "CreatorHubBotMetricsTable_table__8JeRY"))
+                )
             
             page += 1
         except TimeoutException:
             logging.info("No more pages to navigate")
             break
         except Exception as e:
+            # Later pages were never read, so this is only part of the table
             logging.error(f"An error occurred while navigating: {str(e)}")
+            complete = False
             break
     
-    logging.info(f"Extracted data for {len(all_data)} bots across {page} pages")
-    return headers, all_data
+    logging.info(f"Extracted data for {len(all_data)} bots across {page} pages{'' if complete else ' (incomplete)'}")
+    metrics.count('earnings_rows', len(all_data))
+    return headers, all_data, complete
 
 def save_to_csv(headers, data, filename):
     with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
@@ -145,20 +135,30 @@ def save_to_csv(headers, data, filename):
         writer.writerows(data)
     logging.info(f"Data exported successfully to {filename}")
 
-def export_poe_creator_earnings(output_file):
-    email = os.getenv('POE_EMAIL')
-    if not email:
-        raise ValueError("POE_EMAIL environment variable is not set")
+def save_to_store(data, store_path, partial=False):
+    store = EarningsStore(store_path)
+    try:
+        store.append_snapshot(data, partial=partial)
+    finally:
+        store.close()
+    logging.info(f"Snapshot appended to {store_path}")
 
-    driver = setup_driver()
+def export_poe_creator_earnings(output_file, store_path=None, browser=None):
+    metrics.reset("earnings")
+    session = browser or BrowserSession()
     
     try:
-        login_to_poe(driver, email)
-        headers, data = extract_creator_earnings(driver)
-        save_to_csv(headers, data, output_file)
+        headers, data, complete = extract_creator_earnings(session.driver)
+        with metrics.phase("write"):
+            save_to_csv(headers, data, output_file)
+            if store_path:
+                save_to_store(data, store_path, partial=not complete)
     finally:
-        driver.quit()
+        if browser is None:
+            session.close()
+        metrics.finish(os.path.dirname(os.path.abspath(output_file)))
 
 if __name__ == "__main__":
     output_file = input("Enter the output CSV filename (default: poe_creator_earnings.csv): ") or "poe_creator_earnings.csv"
-    export_poe_creator_earnings(output_file)
\ No newline at end of file
+    store_path = input("Enter the earnings history database to append to (leave empty to skip): ") or None
+    export_poe_creator_earnings(output_file, store_path)
\ No newline at end of file
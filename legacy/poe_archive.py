@@ -0,0 +1,211 @@
+import io
+import os
+import json
+import time
+import shutil
+import tarfile
+import zipfile
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+ARCHIVE_FORMATS = ("zip", "zip-stored", "tar")
+ARCHIVE_EXTENSIONS = {"zip": ".zip", "zip-stored": ".zip", "tar": ".tar"}
+MANIFEST_NAME = "manifest.json"
+# Download bodies of known length up to BUFFER_MAX_BODY are held in memory
+# until their entry is written, while every download together holds at most
+# BUFFER_MAX_TOTAL; anything else streams straight into its entry
+BUFFER_MAX_BODY = 1024 * 1024
+BUFFER_MAX_TOTAL = 32 * 1024 * 1024
+# Transcripts, and tar bodies of unknown length, are spooled because a tar
+# header needs the size before any content; past this they spill to a
+# temporary file next to the archive
+SPOOL_MAX_MEMORY = 16 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+
+def archive_path_for(save_dir, stem, archive_format):
+    return os.path.join(save_dir, stem + ARCHIVE_EXTENSIONS[archive_format])
+
+def new_spool(directory=None):
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY, dir=directory)
+
+class TarEntryWriter:
+    # File-like sink for one tar member whose header is already written.
+    # Refuses to write past the declared size; finish() zero-fills a short
+    # body so the members after it stay aligned.
+    def __init__(self, tar, size):
+        self.tar = tar
+        self.size = size
+        self.written = 0
+
+    def write(self, data):
+        if self.written + len(data) > self.size:
+            raise ValueError(f"Body is longer than the {self.size} bytes declared for its tar entry")
+        self.tar.fileobj.write(data)
+        self.written += len(data)
+
+    def finish(self):
+        missing = self.size - self.written
+        while missing > 0:
+            zeros = min(missing, COPY_BUFFER_SIZE)
+            self.tar.fileobj.write(tarfile.NUL * zeros)
+            missing -= zeros
+        blocks, remainder = divmod(self.size, tarfile.BLOCKSIZE)
+        if remainder:
+            self.tar.fileobj.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+            blocks += 1
+        self.tar.offset += blocks * tarfile.BLOCKSIZE
+
+class ArchiveWriter:
+    # Writes entries into one zip or tar file. Only one entry is ever open:
+    # `lock` is held while an entry is written, whether a download streams
+    # into it or a whole body is added from another thread. Download entries
+    # are named by their index, so a body can stream in before its hash is
+    # known; small bodies are buffered within a shared memory budget so
+    # duplicates among them are skipped before being written. Every URL,
+    # saved or not, is listed with its hash in a manifest written on close,
+    # and a streamed body whose content was already archived is marked there
+    # as a duplicate of the earlier entry.
+    def __init__(self, path, archive_format="zip"):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format {archive_format!r}; expected one of {', '.join(ARCHIVE_FORMATS)}")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.archive_format = archive_format
+        self.lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.names = set()
+        self.buffered = 0
+        self.hashes = {}
+        self.manifest = []
+        if archive_format == "tar":
+            self.tar = tarfile.open(path, 'w')
+            self.zip = None
+        else:
+            compression = zipfile.ZIP_STORED if archive_format == "zip-stored" else zipfile.ZIP_DEFLATED
+            self.zip = zipfile.ZipFile(path, 'w', compression=compression, allowZip64=True)
+            self.tar = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def spool(self):
+        return new_spool(os.path.dirname(os.path.abspath(self.path)))
+
+    def disk_spool(self):
+        return tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(self.path)))
+
+    def reserve(self, size):
+        # Claims room to buffer one body in memory; False means stream it
+        with self.state_lock:
+            if size > BUFFER_MAX_BODY or self.buffered + size > BUFFER_MAX_TOTAL:
+                return False
+            self.buffered += size
+            return True
+
+    def release(self, size):
+        with self.state_lock:
+            self.buffered -= size
+
+    def unique_name(self, name):
+        # A retried download gets a fresh entry beside its incomplete one
+        stem, extension = os.path.splitext(name)
+        with self.state_lock:
+            candidate, number = name, 2
+            while candidate in self.names:
+                candidate = f"{stem}_{number}{extension}"
+                number += 1
+            self.names.add(candidate)
+            return candidate
+
+    def entry_for_hash(self, content_hash):
+        return self.hashes.get(content_hash)
+
+    def claim(self, content_hash, name):
+        # Called from the event loop with no await since entry_for_hash, so
+        # two downloads of the same content cannot both claim it
+        self.hashes[content_hash] = name
+
+    def record(self, url, **fields):
+        self.manifest.append({'url': url, **fields})
+
+    def recorded_urls(self):
+        # URLs with a final outcome; an incomplete entry alone is not one
+        return {entry['url'] for entry in self.manifest if not entry.get('incomplete')}
+
+    @contextmanager
+    def open_entry(self, name, size=None):
+        # Yields a writable entry; the caller holds `lock` throughout. Tar needs
+        # size up front. Whatever was written stays in the archive if the
+        # body fails part way, so the caller records the entry as incomplete.
+        if self.tar is not None:
+            if size is None:
+                raise ValueError("A tar entry needs its size before any content")
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(time.time())
+            header = info.tobuf(self.tar.format, self.tar.encoding, self.tar.errors)
+            self.tar.fileobj.write(header)
+            self.tar.offset += len(header)
+            dest = TarEntryWriter(self.tar, size)
+            try:
+                yield dest
+            finally:
+                dest.finish()
+                self.tar.members.append(info)
+        else:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = self.zip.compression
+            if size is not None:
+                info.file_size = size
+            with self.zip.open(info, 'w', force_zip64=size is None or size > zipfile.ZIP64_LIMIT) as dest:
+                yield dest
+
+    def add_file(self, name, fileobj, size):
+        with self.lock:
+            with self.state_lock:
+                self.names.add(name)
+            with self.open_entry(name, size) as dest:
+                shutil.copyfileobj(fileobj, dest, COPY_BUFFER_SIZE)
+
+    def add_bytes(self, name, data):
+        self.add_file(name, io.BytesIO(data), len(data))
+
+    def add_path(self, name, path):
+        with open(path, 'rb') as f:
+            self.add_file(name, f, os.path.getsize(path))
+
+    @contextmanager
+    def open_text(self, name):
+        # Text written here is spooled like a download body, since a tar
+        # header needs the size before any content
+        spool = self.spool()
+        try:
+            text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+            yield text
+            text.flush()
+            size = spool.tell()
+            spool.seek(0)
+            self.add_file(name, spool, size)
+            text.detach()
+        finally:
+            spool.close()
+
+    def close(self):
+        if self.zip is None and self.tar is None:
+            return
+        self.add_bytes(MANIFEST_NAME, json.dumps({
+            'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'entries': self.manifest,
+        }, indent=2).encode('utf-8'))
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+        else:
+            self.zip.close()
+            self.zip = None
+        logging.info(f"Archive saved to {self.path}")
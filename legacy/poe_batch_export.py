@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import logging
+import multiprocessing
+from datetime import datetime
+from urllib.parse import urlparse
+
+from poe_browser import setup_driver, login_to_poe
+from poe_image_downloader import collect_chat_image_urls, failed_downloads
+from poe_text_downloader import collect_chat_messages, format_and_save_messages, known_keys_for, finish_transcript
+from poe_chat_exporter import UrlCollector, open_chat, scroll_and_harvest, unfinished_downloads
+from poe_transcript_writer import TranscriptWriter, OUTPUT_FORMATS, chat_url_part
+from poe_archive import ArchiveWriter, ARCHIVE_FORMATS, archive_path_for
+from poe_download_engine import download_images, DEFAULT_CONCURRENCY
+from poe_search_index import SearchIndex
+from poe_sync_state import SyncState, visible_pair_keys
+from poe_share_export import is_share_url, fetch_share_chat, pair_messages, bot_name_from, all_attachment_urls
+from poe_session import load_cookies, session_is_valid, restore_session, save_session, session_path
+
+MODES = ("images", "text", "both")
+REPORT_FILENAME = "batch_report.json"
+# How often the coordinator checks that its workers are still alive while
+# waiting for results
+RESULT_POLL_INTERVAL = 5.0
+
+def read_chat_urls(path):
+    with open(path, encoding='utf-8') as f:
+        lines = (line.strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line and not line.startswith('#')))
+
+def chat_dir_for(output_dir, url):
+    url_part = urlparse(url).path.split('/')[-1][:20] or "chat"
+    return os.path.join(output_dir, url_part)
+
+def login_once(session_file):
+    # Workers cannot prompt for a verification code, so make sure a valid
+    # session exists before any of them start
+    cookies = load_cookies(session_file)
+    if cookies and session_is_valid(cookies):
+        return
+    email = os.getenv('POE_EMAIL')
+    if not email:
+        raise ValueError("POE_EMAIL environment variable is not set")
+    driver = setup_driver()
+    try:
+        login_to_poe(driver, email)
+        save_session(driver, session_file)
+    finally:
+        driver.quit()
+
+def export_chat(driver, url, mode, output_dir, download_queue, output_format="text", search_index=None,
+                incremental=False, prune=None):
+    chat_dir = chat_dir_for(output_dir, url)
+    os.makedirs(chat_dir, exist_ok=True)
+    detail = {}
+    newest_keys = None
+
+    if is_share_url(url):
+        share_messages = fetch_share_chat(url)
+        if mode in ("text", "both"):
+            messages = pair_messages(share_messages)
+            bot_name = bot_name_from(share_messages)
+            detail['transcript'] = format_and_save_messages(messages, chat_dir, url, bot_name, output_format)
+            if search_index is not None:
+                search_index.index_transcript(url, messages, bot_name, detail['transcript'])
+            detail['message_pairs'] = len(messages)
+        img_urls = all_attachment_urls(share_messages)
+    elif mode == "both":
+        # One scroll collects the transcript and the image URLs together
+        writer = TranscriptWriter(chat_dir, url, output_format, search_index=search_index)
+        text_sync = SyncState(chat_dir, url, "text") if incremental else None
+        image_sync = SyncState(chat_dir, url, "images") if incremental else None
+        known_keys = known_keys_for(text_sync, output_format) if text_sync else None
+        collector = UrlCollector(unfinished_downloads(chat_dir) if incremental else ())
+        open_chat(driver(), url)
+        scroll_and_harvest(driver(), writer, collector, known_keys=known_keys, prune=prune)
+        img_urls = collector.urls
+        newest_keys = visible_pair_keys(driver()) if image_sync else None
+        detail['message_pairs'] = len(writer)
+        detail['transcript'] = finish_transcript(writer, text_sync, known_keys)
+    elif mode == "text":
+        writer = TranscriptWriter(chat_dir, url, output_format, search_index=search_index)
+        sync = SyncState(chat_dir, url, "text") if incremental else None
+        known_keys = known_keys_for(sync, output_format) if sync else None
+        collect_chat_messages(driver(), url, transcript=writer, known_keys=known_keys, prune=prune)
+        detail['message_pairs'] = len(writer)
+        detail['transcript'] = finish_transcript(writer, sync, known_keys)
+    else:
+        sync = SyncState(chat_dir, url, "images") if incremental else None
+        img_urls = collect_chat_image_urls(driver(), url, sync.known_keys if sync else None, prune)
+        # Saved by the downloader once every image has been fetched
+        newest_keys = visible_pair_keys(driver()) if sync else None
+
+    if mode in ("images", "both"):
+        detail['image_urls'] = len(img_urls)
+        download_queue.put((url, chat_dir, img_urls, detail.get('transcript'), newest_keys))
+    return detail
+
+def chat_worker(task_queue, download_queue, result_queue, mode, output_dir, session_file, output_format,
+                capture=None, search_index_path=None, incremental=False, prune=None):
+    # Each worker owns one browser, started on first use and reused across
+    # chats, and its own connection to the search index
+    browser = None
+    search_index = None
+
+    def driver():
+        nonlocal browser
+        if browser is None:
+            browser = setup_driver(capture)
+            if not restore_session(browser, session_file):
+                raise RuntimeError("Saved Poe session is not valid")
+        return browser
+
+    try:
+        if search_index_path and mode != "images":
+            search_index = SearchIndex(search_index_path)
+        for url in iter(task_queue.get, None):
+            started = time.time()
+            try:
+                detail = export_chat(driver, url, mode, output_dir, download_queue, output_format, search_index,
+                                     incremental, prune)
+                result_queue.put({'url': url, 'stage': 'collect', 'ok': True,
+                                  'seconds': round(time.time() - started, 2), **detail})
+            except Exception as e:
+                logging.error(f"Failed to export {url}: {str(e)}")
+                result_queue.put({'url': url, 'stage': 'collect', 'ok': False, 'error': str(e),
+                                  'seconds': round(time.time() - started, 2)})
+    finally:
+        if browser is not None:
+            browser.quit()
+        if search_index is not None:
+            search_index.close()
+
+def download_into_archive(img_urls, chat_dir, url, concurrency, archive_format, transcript=None, incremental=False):
+    # One archive per chat holding its images, its transcript and a manifest.
+    # Incremental runs keep the transcript on disk, since the sync state
+    # points at it and the next run appends to it, and timestamp the archive
+    # so the images of earlier runs are not overwritten.
+    stem = f"poe_chat_{chat_url_part(url)}"
+    if incremental:
+        stem += datetime.now().strftime("_%Y%m%d_%H%M%S")
+    archive_path = archive_path_for(chat_dir, stem, archive_format)
+    with ArchiveWriter(archive_path, archive_format) as archive:
+        results = download_images(img_urls, chat_dir, concurrency=concurrency, archive=archive)
+        if transcript:
+            archive.add_path(os.path.basename(transcript), transcript)
+    if transcript and not incremental:
+        os.remove(transcript)
+    return results
+
+def download_worker(download_queue, result_queue, concurrency, archive_format=None, incremental=False):
+    # A single downloader shares one connection pool across every chat
+    for url, chat_dir, img_urls, transcript, newest_keys in iter(download_queue.get, None):
+        started = time.time()
+        try:
+            if archive_format:
+                results = download_into_archive(img_urls, chat_dir, url, concurrency, archive_format, transcript,
+                                                incremental)
+            else:
+                results = download_images(img_urls, chat_dir, concurrency=concurrency)
+            failed = failed_downloads(results)
+            if newest_keys is not None and not failed:
+                SyncState(chat_dir, url, "images").save(newest_keys)
+            result_queue.put({'url': url, 'stage': 'download', 'ok': failed == 0,
+                              'downloaded': sum(1 for success, _ in results if success),
+                              'failed': failed, 'seconds': round(time.time() - started, 2)})
+        except Exception as e:
+            logging.error(f"Failed to download images for {url}: {str(e)}")
+            result_queue.put({'url': url, 'stage': 'download', 'ok': False, 'error': str(e),
+                              'seconds': round(time.time() - started, 2)})
+
+def drain(q):
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+
+def run_batch(chat_urls, output_dir, mode="both", workers=None, concurrency=DEFAULT_CONCURRENCY,
+              session_file=None, output_format="text", capture=None, archive_format=None,
+              search_index_path=None, incremental=False, prune=None):
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {', '.join(MODES)}")
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chat_urls) or 1))
+    # Resolved once here, so every worker process uses the same file
+    session_file = session_path(session_file)
+
+    if not all(is_share_url(url) for url in chat_urls):
+        login_once(session_file)
+
+    if search_index_path:
+        # Create the schema once, before the workers open their connections
+        SearchIndex(search_index_path).close()
+
+    task_queue = multiprocessing.Queue()
+    download_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for url in chat_urls:
+        task_queue.put(url)
+    for _ in range(workers):
+        task_queue.put(None)
+
+    chat_processes = [
+        multiprocessing.Process(target=chat_worker,
+                                args=(task_queue, download_queue, result_queue, mode, output_dir, session_file,
+                                      output_format, capture, search_index_path, incremental, prune))
+        for _ in range(workers)
+    ]
+    downloader = multiprocessing.Process(target=download_worker,
+                                         args=(download_queue, result_queue, concurrency, archive_format,
+                                               incremental))
+    for process in chat_processes + [downloader]:
+        process.start()
+
+    logging.info(f"Exporting {len(chat_urls)} chats with {workers} workers")
+    report = {url: {'url': url, 'ok': True, 'stages': {}} for url in chat_urls}
+    pending = set(chat_urls)
+
+    def record(url, stage, result):
+        report[url]['stages'][stage] = result
+        report[url]['ok'] = report[url]['ok'] and result['ok']
+        if not result['ok']:
+            logging.warning(f"{url} failed at {stage}: {result.get('error', 'some downloads failed')}")
+        # A chat is finished once both stages have reported, or after the
+        # collect stage alone when nothing was queued for download
+        stages = report[url]['stages']
+        if 'collect' in stages and (not stages['collect']['ok'] or mode == "text" or 'download' in stages):
+            pending.discard(url)
+
+    downloader_lost = False
+    while pending:
+        try:
+            result = result_queue.get(timeout=RESULT_POLL_INTERVAL)
+        except queue.Empty:
+            # A worker killed by a crash or the OOM killer never reports its
+            # chat. Once the downloader is gone no download can finish, and
+            # once every chat worker is gone no collect can.
+            if mode != "text" and not downloader_lost and not downloader.is_alive():
+                downloader_lost = True
+                error = f"download worker exited with code {downloader.exitcode}"
+                for url in sorted(pending):
+                    record(url, 'download', {'url': url, 'ok': False, 'error': error})
+            if not any(process.is_alive() for process in chat_processes):
+                codes = sorted({process.exitcode for process in chat_processes})
+                error = f"chat workers exited with code {', '.join(map(str, codes))} before reporting"
+                for url in sorted(pending):
+                    if 'collect' not in report[url]['stages']:
+                        record(url, 'collect', {'url': url, 'ok': False, 'error': error})
+            continue
+        url = result['url']
+        record(url, result.pop('stage'), result)
+
+    for process in chat_processes:
+        process.join(RESULT_POLL_INTERVAL)
+        while process.is_alive():
+            # A worker cannot exit while its queued chats sit unread in the
+            # pipe, so take them off the queue if nobody else will
+            if downloader_lost:
+                drain(download_queue)
+            process.join(RESULT_POLL_INTERVAL)
+    download_queue.put(None)
+    downloader.join()
+
+    report_path = os.path.join(output_dir, REPORT_FILENAME)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(list(report.values()), f, indent=2)
+    succeeded = sum(1 for entry in report.values() if entry['ok'])
+    logging.info(f"Exported {succeeded} of {len(chat_urls)} chats successfully; report saved to {report_path}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export many Poe chats in parallel.")
+    parser.add_argument("url_file", help="file with one chat URL per line")
+    parser.add_argument("-o", "--output-dir", default="PoeBatchExport")
+    parser.add_argument("-m", "--mode", choices=MODES, default="both")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="browser workers (default: CPU count)")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="text", help="transcript format")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="parallel downloads")
+    parser.add_argument("--capture", action="store_true", default=None,
+                        help="run workers headless without loading images, media or fonts")
+    parser.add_argument("-a", "--archive", choices=ARCHIVE_FORMATS, default=None,
+                        help="write each chat's images, transcript and manifest into one archive")
+    parser.add_argument("-i", "--search-index", default=None, help="search index file to update with each transcript")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only collect messages and images newer than each chat's last export")
+    parser.add_argument("--prune", action="store_true", default=None,
+                        help="empty message pairs once captured, so long chats keep a small DOM")
+    args = parser.parse_args()
+
+    report = run_batch(read_chat_urls(args.url_file), args.output_dir, args.mode, args.workers, args.concurrency,
+                       output_format=args.format, capture=args.capture, archive_format=args.archive,
+                       search_index_path=args.search_index, incremental=args.incremental,
+                       prune=args.prune)
+    sys.exit(0 if all(entry['ok'] for entry in report.values()) else 1)
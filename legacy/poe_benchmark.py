@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import logging
+import resource
+import tempfile
+import multiprocessing
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from poe_fixture_server import serve_fixtures, chat_url, creators_url, attachment_url
+from poe_browser import setup_driver
+from poe_image_downloader import scroll_and_collect_images
+from poe_text_downloader import scroll_and_collect_messages
+from poe_chat_exporter import scroll_and_harvest
+from poe_transcript_writer import TranscriptBuffer
+from creator_earnings import extract_creator_earnings
+from poe_download_engine import download_images, BackgroundDownloader, DEFAULT_CONCURRENCY
+from poe_metrics import metrics
+
+SCENARIOS = ("images", "text", "chat", "earnings", "download")
+
+def python_peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def process_tree_peak_rss_kb(pid):
+    # Sum of VmHWM over a process and its descendants; Linux only
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+def start_fixture_server():
+    # A separate process keeps the server's memory and CPU out of the numbers
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_fixtures, args=(port_queue,), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+def run_browser_scenario(name, scenario, capture):
+    metrics.reset(name)
+    driver = metrics.instrument_driver(setup_driver(capture))
+    try:
+        started = time.perf_counter()
+        result = scenario(driver)
+        seconds = time.perf_counter() - started
+        summary = metrics.summary()
+        result.update({
+            'scenario': name,
+            'seconds': round(seconds, 3),
+            'webdriver_calls': summary['counters']['webdriver_calls'],
+            'phases': summary['phases'],
+            'browser_peak_rss_kb': process_tree_peak_rss_kb(driver.service.process.pid),
+            'python_peak_rss_kb': python_peak_rss_kb(),
+        })
+        return result
+    finally:
+        driver.quit()
+
+def bench_images(base_url, args):
+    url = chat_url(base_url, messages=args.messages, page_size=args.page_size, latency=args.latency,
+                   images_every=args.images_every)
+    expected = 2 * len(range(0, args.messages, args.images_every))
+
+    def scenario(driver):
+        driver.get(url)
+        WebDriverWait(driver, 20).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div[class*='ChatMessagesView_messagePair']")))
+        started = time.perf_counter()
+        urls = scroll_and_collect_images(driver, prune=args.prune)
+        seconds = time.perf_counter() - started
+        return {'messages': args.messages, 'image_urls': len(urls), 'complete': len(urls) == expected,
+                'messages_per_second': round(args.messages / seconds, 1)}
+    return scenario
+
+def bench_text(base_url, args):
+    url = chat_url(base_url, messages=args.messages, page_size=args.page_size, latency=args.latency,
+                   images_every=args.images_every)
+
+    def scenario(driver):
+        driver.get(url)
+        WebDriverWait(driver, 20).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div[class*='ChatMessagesView_messagePair']")))
+        started = time.perf_counter()
+        transcript, _ = scroll_and_collect_messages(driver, prune=args.prune)
+        seconds = time.perf_counter() - started
+        pairs = list(transcript.iter_pairs())
+        in_order = all(human == f"Question number {i}" for i, (human, _) in enumerate(pairs))
+        return {'messages': len(pairs), 'complete': len(pairs) == args.messages and in_order,
+                'messages_per_second': round(len(pairs) / seconds, 1)}
+    return scenario
+
+def bench_chat(base_url, args):
+    # The single-pass exporter: transcript and images from one scroll, with
+    # the images downloading while it runs; timed until both are done. The
+    # download thread counts into the same metrics as the scroll loop, so the
+    # phases and counters reported cover both
+    url = chat_url(base_url, messages=args.messages, page_size=args.page_size, latency=args.latency,
+                   images_every=args.images_every)
+    expected = 2 * len(range(0, args.messages, args.images_every))
+
+    def scenario(driver):
+        driver.get(url)
+        WebDriverWait(driver, 20).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div[class*='ChatMessagesView_messagePair']")))
+        save_dir = tempfile.mkdtemp(prefix="poe_bench_")
+        try:
+            started = time.perf_counter()
+            transcript = TranscriptBuffer()
+            downloader = BackgroundDownloader(save_dir, concurrency=args.concurrency)
+            scroll_and_harvest(driver, transcript, downloader, prune=args.prune)
+            scrolled = time.perf_counter() - started
+            results = downloader.finish()
+            seconds = time.perf_counter() - started
+        finally:
+            shutil.rmtree(save_dir, ignore_errors=True)
+        pairs = list(transcript.iter_pairs())
+        in_order = all(human == f"Question number {i}" for i, (human, _) in enumerate(pairs))
+        downloaded = sum(1 for success, _ in results if success)
+        return {'messages': len(pairs), 'image_urls': len(results), 'images_saved': downloaded,
+                'complete': len(pairs) == args.messages and in_order and downloaded == expected,
+                'scroll_seconds': round(scrolled, 3), 'messages_per_second': round(len(pairs) / seconds, 1)}
+    return scenario
+
+def bench_earnings(base_url, args):
+    url = creators_url(base_url, bots=args.bots, per_page=args.per_page, latency=args.latency)
+
+    def scenario(driver):
+        started = time.perf_counter()
+        _, data, _ = extract_creator_earnings(driver, creators_url=url)
+        seconds = time.perf_counter() - started
+        return {'rows': len(data), 'complete': len(data) == args.bots,
+                'rows_per_second': round(len(data) / seconds, 1)}
+    return scenario
+
+def bench_download(base_url, args):
+    urls = [attachment_url(base_url, f"file_{i}.png", args.attachment_size, args.attachment_latency)
+            for i in range(args.downloads)]
+    save_dir = tempfile.mkdtemp(prefix="poe_bench_")
+    metrics.reset("download")
+    try:
+        started = time.perf_counter()
+        results = download_images(urls, save_dir, concurrency=args.concurrency)
+        seconds = time.perf_counter() - started
+        saved_bytes = sum(os.path.getsize(os.path.join(save_dir, name))
+                          for name in os.listdir(save_dir) if not name.startswith('.'))
+    finally:
+        shutil.rmtree(save_dir, ignore_errors=True)
+    downloaded = sum(1 for success, _ in results if success)
+    return {
+        'scenario': "download",
+        'files': downloaded,
+        'complete': downloaded == args.downloads,
+        'bytes': saved_bytes,
+        'seconds': round(seconds, 3),
+        'bytes_per_second': round(saved_bytes / seconds),
+        'python_peak_rss_kb': python_peak_rss_kb(),
+        'counters': metrics.summary()['counters'],
+    }
+
+BROWSER_SCENARIOS = {"images": bench_images, "text": bench_text, "chat": bench_chat, "earnings": bench_earnings}
+
+def run_benchmarks(args):
+    server, base_url = start_fixture_server()
+    try:
+        results = []
+        for name in args.scenarios:
+            print(f"Running {name} benchmark against {base_url}", file=sys.stderr)
+            if name == "download":
+                result = bench_download(base_url, args)
+            else:
+                result = run_browser_scenario(name, BROWSER_SCENARIOS[name](base_url, args), args.capture)
+            if not result['complete']:
+                logging.error(f"{name} benchmark did not collect everything: {result}")
+            results.append(result)
+    finally:
+        server.terminate()
+    return {'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), 'capture': args.capture,
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose')},
+            'results': results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the exporters against local fixture pages.")
+    parser.add_argument("-s", "--scenario", dest="scenarios", action="append", choices=SCENARIOS,
+                        help="scenario to run; repeat for several (default: all)")
+    parser.add_argument("-o", "--output", default=None, help="write results as JSON to this file (default: stdout)")
+    parser.add_argument("--capture", action="store_true", help="run Chrome in headless capture mode")
+    parser.add_argument("--prune", action="store_true", help="prune captured message pairs while scrolling")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=20, help="message pairs loaded per scroll")
+    parser.add_argument("--images-every", type=int, default=5, help="attach an image to every Nth pair")
+    parser.add_argument("--bots", type=int, default=200)
+    parser.add_argument("--per-page", type=int, default=10, help="earnings rows per table page")
+    parser.add_argument("--latency", type=int, default=50, help="page load latency in milliseconds")
+    parser.add_argument("--downloads", type=int, default=200)
+    parser.add_argument("--attachment-size", type=int, default=256 * 1024, help="bytes per attachment")
+    parser.add_argument("--attachment-latency", type=int, default=20, help="attachment latency in milliseconds")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("-v", "--verbose", action="store_true", help="keep the exporters' info logging")
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    # The exporters log every item at info; that is not what is being measured
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    report = run_benchmarks(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(0 if all(result['complete'] for result in report['results']) else 1)
@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import time
+
+INDEX_FILENAME = ".poe_index.sqlite3"
+
+class BlobStore:
+    # Content-addressed store for downloaded media. Files live in `root` with
+    # their MD5 in the filename; the SQLite index maps each hash to its stored path
+    # and each source URL to the hash and validators it was last fetched with,
+    # so re-exports can skip or revalidate URLs they have already seen.
+    def __init__(self, root, index_path=None):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.index_path = index_path or os.path.join(root, INDEX_FILENAME)
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                hash TEXT NOT NULL REFERENCES blobs(hash),
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def lookup_url(self, url):
+        row = self.conn.execute(
+            "SELECT urls.hash, urls.etag, urls.last_modified, blobs.path FROM urls "
+            "JOIN blobs ON blobs.hash = urls.hash WHERE urls.url = ?",
+            (url,),
+        ).fetchone()
+        if row is None or not os.path.exists(row[3]):
+            return None
+        return {'hash': row[0], 'etag': row[1], 'last_modified': row[2], 'path': row[3]}
+
+    def path_for_hash(self, content_hash):
+        row = self.conn.execute("SELECT path FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return row[0]
+
+    def add_blob(self, content_hash, path):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO blobs (hash, path, size, stored_at) VALUES (?, ?, ?, ?)",
+            (content_hash, path, os.path.getsize(path), time.time()),
+        )
+        self.conn.commit()
+
+    def record_url(self, url, content_hash, etag=None, last_modified=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO urls (url, hash, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (url, content_hash, etag, last_modified, time.time()),
+        )
+        self.conn.commit()
+
+    def merge_blob(self, old_hash, new_hash):
+        # The file stored for old_hash now holds new_hash's contents; its URLs
+        # follow, and the old blob row goes
+        with self.conn:
+            self.conn.execute("UPDATE urls SET hash = ? WHERE hash = ?", (new_hash, old_hash))
+            self.conn.execute("DELETE FROM blobs WHERE hash = ?", (old_hash,))
+
+    def touch_url(self, url):
+        self.conn.execute("UPDATE urls SET fetched_at = ? WHERE url = ?", (time.time(), url))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
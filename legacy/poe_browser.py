@@ -0,0 +1,115 @@
+import os
+import logging
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
+
+from poe_session import ensure_logged_in
+from poe_metrics import metrics
+from poe_capture import capture_mode_enabled, apply_capture_options, block_heavy_resources
+from poe_waits import wait_for_url_change, DEFAULT_LOGIN_TIMEOUT
+
+def setup_driver(capture=None):
+    capture = capture_mode_enabled() if capture is None else capture
+    options = webdriver.ChromeOptions()
+    if capture:
+        apply_capture_options(options)
+    else:
+        options.add_argument("start-maximized")
+
+    # Suppress Chrome's own console logging
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    options.add_argument("--log-level=3")
+
+    driver = webdriver.Chrome(options=options)
+    return block_heavy_resources(driver) if capture else driver
+
+def login_to_poe(driver, email, login_timeout=DEFAULT_LOGIN_TIMEOUT):
+    try:
+        logging.info("Navigating to login page...")
+        driver.get("https://poe.com/login")
+
+        logging.info("Waiting for email input field...")
+        email_input = WebDriverWait(driver, 30).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='email']"))
+        )
+
+        logging.info("Entering email...")
+        email_input.send_keys(email)
+
+        logging.info("Clicking Go button...")
+        go_button = WebDriverWait(driver, 10).until(
+            EC.element_to_be_clickable((By.XPATH, "//button[text()='Go']"))
+        )
+        go_button.click()
+
+        logging.info("Waiting for verification code input...")
+        verification_input = WebDriverWait(driver, 30).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "input.VerificationCodeInput_verificationCodeInput__RgX85"))
+        )
+
+        verification_code = input("Enter the verification code sent to your email: ")
+        verification_input.send_keys(verification_code)
+
+        logging.info("Clicking Log In button...")
+        login_button = WebDriverWait(driver, 10).until(
+            EC.element_to_be_clickable((By.XPATH, "//button[contains(@class, 'Button_buttonBase__Bv9Vx') and contains(@class, 'Button_primary__6UIn0') and text()='Log In']"))
+        )
+        login_button.click()
+
+        logging.info("Waiting for login to complete...")
+        if not wait_for_url_change(driver, "/login", login_timeout):
+            logging.warning("Still on the login page; proceeding anyway...")
+
+        logging.info("Login process completed.")
+    except TimeoutException as e:
+        logging.error(f"Timeout occurred: {str(e)}")
+        logging.info("Current page source:")
+        logging.info(driver.page_source)
+        raise
+    except NoSuchElementException as e:
+        logging.error(f"Element not found: {str(e)}")
+        logging.info("Current page source:")
+        logging.info(driver.page_source)
+        raise
+    except Exception as e:
+        logging.error(f"An error occurred during login: {str(e)}")
+        raise
+
+class BrowserSession:
+    # A logged-in Chrome that several exports can share. The browser starts
+    # and logs in on first use, so runs that never need one never pay for it.
+    # Exports given a session leave it open; whoever created it closes it.
+    def __init__(self, capture=None):
+        self.capture = capture
+        self._driver = None
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            email = os.getenv('POE_EMAIL')
+            if not email:
+                raise ValueError("POE_EMAIL environment variable is not set")
+            with metrics.phase("driver_start"):
+                driver = metrics.instrument_driver(setup_driver(self.capture))
+            try:
+                with metrics.phase("login"):
+                    ensure_logged_in(driver, email, login_to_poe)
+            except Exception:
+                driver.quit()
+                raise
+            self._driver = driver
+        return self._driver
+
+    def close(self):
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,53 @@
+import os
+import logging
+
+# Attachment bytes are fetched later by the download engine; the browser only
+# needs the DOM, so image, media and font requests are dropped before they
+# leave Chrome. Content settings catch images served without an extension.
+# CDN URLs are usually signed, so each extension is also blocked when a
+# query string follows it.
+BLOCKED_EXTENSIONS = [
+    "png", "jpg", "jpeg", "gif", "webp", "avif", "bmp", "ico", "svg",
+    "mp4", "webm", "mov", "m4v", "mp3", "m4a", "wav", "ogg", "m3u8",
+    "woff", "woff2", "ttf", "otf", "eot",
+]
+BLOCKED_URL_PATTERNS = [pattern for extension in BLOCKED_EXTENSIONS
+                        for pattern in (f"*.{extension}", f"*.{extension}?*")]
+CAPTURE_ARGUMENTS = [
+    "--headless=new",
+    "--window-size=1920,1080",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-notifications",
+    "--disable-component-update",
+    "--no-first-run",
+    "--mute-audio",
+    "--autoplay-policy=user-gesture-required",
+    "--blink-settings=imagesEnabled=false",
+]
+CAPTURE_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.media_stream': 2,
+    'profile.default_content_setting_values.notifications': 2,
+}
+
+def capture_mode_enabled():
+    # Read at driver start so values loaded from .env are seen
+    return os.getenv('POE_CAPTURE_MODE', '').lower() in ('1', 'true', 'yes')
+
+def apply_capture_options(options):
+    for argument in CAPTURE_ARGUMENTS:
+        options.add_argument(argument)
+    options.add_experimental_option('prefs', CAPTURE_PREFS)
+    return options
+
+def block_heavy_resources(driver):
+    # setBlockedURLs only takes effect once the Network domain is enabled, and
+    # must be sent before the first navigation
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+    logging.info("Capture mode: headless, blocking image, media and font requests")
+    return driver
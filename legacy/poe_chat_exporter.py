@@ -0,0 +1,261 @@
+import os
+import time
+import argparse
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+
+from poe_image_downloader import failed_downloads, INSTALL_MEDIA_OBSERVER_JS, DRAIN_MEDIA_BUFFER_JS
+from poe_text_downloader import EXTRACT_MESSAGE_PAIRS_JS, record_pairs, find_bot_name, known_keys_for, finish_transcript
+from poe_transcript_writer import TranscriptWriter, OUTPUT_FORMATS, save_transcript, chat_url_part
+from poe_download_engine import BackgroundDownloader, DEFAULT_CONCURRENCY
+from poe_download_journal import DownloadJournal, JOURNAL_FILENAME
+from poe_archive import ArchiveWriter, ARCHIVE_FORMATS, archive_path_for
+from poe_search_index import SearchIndex
+from poe_sync_state import SyncState, visible_pair_keys
+from poe_dom_pruning import pruning_enabled
+from poe_browser import BrowserSession
+from poe_metrics import metrics
+from poe_share_export import is_share_url, fetch_share_chat, pair_messages, bot_name_from, all_attachment_urls
+from poe_waits import wait_for_more_messages, wait_for_network_idle, DEFAULT_NETWORK_IDLE_TIMEOUT, DEFAULT_SCROLL_TIMEOUT
+
+logging.basicConfig(level=os.getenv('POE_LOG_LEVEL', 'INFO').upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+load_dotenv()
+
+# One round trip per iteration: the media URLs the observer saw since the last
+# call, then every unpruned message pair. With pruning, the drain only empties
+# pairs the extractor has already returned with text (data-poe-captured), so a
+# pair that was empty or still rendering stays until its text is captured.
+HARVEST_JS = f"""
+const media = (function () {{ {DRAIN_MEDIA_BUFFER_JS} }}).call(null, arguments[0], true);
+if (media === null) {{ return null; }}
+const text = (function () {{ {EXTRACT_MESSAGE_PAIRS_JS} }}).call(null, false);
+return {{media, text}};
+"""
+
+# Scrolls to the top and brings the paging trigger into view in one round
+# trip; returns whether the trigger is still there
+SCROLL_UP_JS = """
+const wrapper = document.querySelector("div[class*='ChatMessagesScrollWrapper']");
+if (wrapper) { wrapper.scrollTop = 0; }
+const trigger = document.querySelector("div[class*='InfiniteScroll_pagingTrigger']");
+if (trigger) { trigger.scrollIntoView(true); }
+return trigger !== null;
+"""
+
+class UrlCollector:
+    # Stands in for a BackgroundDownloader when the media URLs are downloaded
+    # somewhere else, as in the batch exporter's download process
+    def __init__(self, img_urls=()):
+        self.urls = list(dict.fromkeys(img_urls))
+        self.seen = set(self.urls)
+
+    def add(self, img_urls):
+        added = 0
+        for img_url in img_urls:
+            if img_url not in self.seen:
+                self.seen.add(img_url)
+                self.urls.append(img_url)
+                added += 1
+        return added
+
+    def __len__(self):
+        return len(self.urls)
+
+def unfinished_downloads(save_dir):
+    # An incremental scroll stops at the last export, so images that failed
+    # then are only found again through the journal
+    if not os.path.exists(os.path.join(save_dir, JOURNAL_FILENAME)):
+        return []
+    journal = DownloadJournal(save_dir)
+    try:
+        return journal.unfinished()
+    finally:
+        journal.close()
+
+def harvest(driver, transcript, downloader, known_keys=None, prune=False):
+    with metrics.phase("extraction"):
+        harvested = driver.execute_script(HARVEST_JS, prune)
+        if harvested is None:
+            # The page was replaced since the observer was installed
+            driver.execute_script(INSTALL_MEDIA_OBSERVER_JS)
+            harvested = driver.execute_script(HARVEST_JS, prune)
+    # Downloads start on the downloader's thread while scrolling goes on
+    new_urls = downloader.add(harvested['media']['urls'])
+    metrics.count('image_urls', new_urls)
+    added = record_pairs(transcript, harvested['text']['pairs'], known_keys)
+    return added, new_urls, harvested['text']['total']
+
+def scroll_and_harvest(driver, transcript, downloader, max_scroll_time=600, scroll_timeout=DEFAULT_SCROLL_TIMEOUT,
+                       known_keys=None, prune=None):
+    logging.info("Scrolling and collecting messages and images...")
+    start_time = time.time()
+    prune = pruning_enabled() if prune is None else prune
+    no_new_content_count = 0
+    max_no_new_content = 5
+
+    driver.execute_script(INSTALL_MEDIA_OBSERVER_JS)
+    # Take what the page already shows first, so downloads start right away
+    # and an incremental run may not need to scroll at all
+    _, _, pair_count = harvest(driver, transcript, downloader, known_keys, prune)
+
+    while not transcript.reached_known and time.time() - start_time < max_scroll_time:
+        with metrics.phase("scroll"):
+            if not driver.execute_script(SCROLL_UP_JS):
+                logging.info("Infinite scroll trigger not found. Might have reached the top.")
+                break
+            state = wait_for_more_messages(driver, pair_count, scroll_timeout)
+
+        added, new_urls, pair_count = harvest(driver, transcript, downloader, known_keys, prune)
+        if state and not state['trigger']:
+            logging.info("Infinite scroll trigger is gone. Reached the top of the chat.")
+            break
+
+        if added or new_urls:
+            no_new_content_count = 0
+        else:
+            no_new_content_count += 1
+            logging.debug(f"No new content found. Count: {no_new_content_count}")
+        if no_new_content_count >= max_no_new_content:
+            logging.info(f"No new content found for {max_no_new_content} consecutive scrolls. Assuming we've reached the top.")
+            break
+
+    if transcript.reached_known:
+        logging.info("Reached messages saved by the last export. Stopping scroll.")
+    logging.info(f"Scrolling completed in {time.time() - start_time:.2f} seconds")
+    transcript.bot_name = find_bot_name(driver)
+    return transcript.bot_name
+
+def open_chat(driver, url, initial_load_timeout=DEFAULT_NETWORK_IDLE_TIMEOUT):
+    logging.info(f"Navigating to chat URL: {url}")
+    with metrics.phase("initial_load"):
+        driver.get(url)
+        try:
+            WebDriverWait(driver, 30).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "div[class*='ChatMessagesView_messagePair']"))
+            )
+            logging.info("Chat messages loaded successfully")
+        except TimeoutException:
+            logging.warning("Timeout waiting for chat messages to load. Proceeding anyway...")
+        wait_for_network_idle(driver, initial_load_timeout)
+
+def finish_downloads(downloader):
+    results = downloader.finish()
+    successful_downloads = sum(1 for success, _ in results if success)
+    logging.info(f"Successfully downloaded {successful_downloads} unique images out of {len(results)} URLs")
+    return results
+
+def export_share_chat(url, save_dir, output_format, concurrency, archive, search_index):
+    # Share pages embed the whole conversation; no browser or login needed
+    with metrics.phase("initial_load"):
+        share_messages = fetch_share_chat(url)
+    downloader = BackgroundDownloader(save_dir, concurrency, archive=archive)
+    metrics.count('image_urls', downloader.add(all_attachment_urls(share_messages)))
+
+    with metrics.phase("extraction"):
+        messages = pair_messages(share_messages)
+    metrics.count('message_pairs', len(messages))
+    bot_name = bot_name_from(share_messages)
+    with metrics.phase("write"):
+        saved_file = save_transcript(messages, save_dir, url, bot_name, output_format, archive)
+        if search_index is not None:
+            search_index.index_transcript(url, messages, bot_name, saved_file)
+    return saved_file, finish_downloads(downloader)
+
+def export_live_chat(url, save_dir, output_format, concurrency, archive, search_index, incremental, prune, capture,
+                     browser=None):
+    text_sync = SyncState(save_dir, url, "text") if incremental else None
+    image_sync = SyncState(save_dir, url, "images") if incremental else None
+    known_keys = known_keys_for(text_sync, output_format) if text_sync else None
+    retry_urls = unfinished_downloads(save_dir) if incremental and archive is None else []
+
+    writer = TranscriptWriter(save_dir, url, output_format, search_index=search_index)
+    downloader = BackgroundDownloader(save_dir, concurrency, archive=archive)
+    downloader.add(retry_urls)
+    session = browser or BrowserSession(capture)
+
+    newest_keys = None
+    try:
+        driver = session.driver
+        open_chat(driver, url)
+        scroll_and_harvest(driver, writer, downloader, known_keys=known_keys, prune=prune)
+        newest_keys = visible_pair_keys(driver) if image_sync else None
+    except Exception as e:
+        # Keep what was collected, then let the caller see the failure
+        logging.error(f"An error occurred: {str(e)}")
+        finish_downloads(downloader)
+        if len(writer):
+            saved_file = writer.finish(keep_checkpoint=True, archive=archive)
+            print(f"Partial chat transcript saved to: {saved_file}")
+        raise
+    finally:
+        # The browser is not needed for the downloads still running
+        if browser is None:
+            session.close()
+
+    with metrics.phase("write"):
+        saved_file = finish_transcript(writer, text_sync, known_keys, archive)
+    results = finish_downloads(downloader)
+    if image_sync is not None:
+        if failed_downloads(results):
+            logging.warning("Some downloads failed; they are retried from the journal on the next incremental run")
+        else:
+            image_sync.save(newest_keys)
+    return saved_file, results
+
+def save_poe_chat(url, save_dir, output_format="text", concurrency=DEFAULT_CONCURRENCY, archive_format=None,
+                  search_index_path=None, incremental=False, prune=None, capture=None, previews=False, browser=None):
+    # One browser, one login and one scroll collect the transcript and the
+    # images together; images download while the scroll is still going
+    metrics.reset("chat")
+    os.makedirs(save_dir, exist_ok=True)
+    search_index = SearchIndex(search_index_path) if search_index_path else None
+    archive = None
+    if archive_format:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        archive = ArchiveWriter(archive_path_for(save_dir, f"poe_chat_{chat_url_part(url)}_{timestamp}",
+                                                 archive_format), archive_format)
+    try:
+        if is_share_url(url):
+            saved_file, results = export_share_chat(url, save_dir, output_format, concurrency, archive, search_index)
+        else:
+            saved_file, results = export_live_chat(url, save_dir, output_format, concurrency, archive, search_index,
+                                                   incremental, prune, capture, browser)
+        if saved_file:
+            print(f"Chat transcript saved to: {saved_file}")
+        if previews and archive is None:
+            # Imported here so Pillow stays optional
+            from poe_thumbnails import build_previews
+            with metrics.phase("previews"):
+                build_previews(save_dir)
+        return saved_file, results
+    finally:
+        if archive is not None:
+            archive.close()
+        if search_index is not None:
+            search_index.close()
+        metrics.finish(save_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a Poe chat's transcript and images in a single pass.")
+    parser.add_argument("url", help="Poe chat or share URL")
+    parser.add_argument("-o", "--output-dir", default="PoeChatExport")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="text", help="transcript format")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="parallel downloads")
+    parser.add_argument("-a", "--archive", choices=ARCHIVE_FORMATS, default=None,
+                        help="write the images, transcript and manifest into one archive")
+    parser.add_argument("-i", "--search-index", default=None, help="search index file to update with the transcript")
+    parser.add_argument("--incremental", action="store_true", help="only collect content newer than the last export")
+    parser.add_argument("--prune", action="store_true", default=None,
+                        help="empty message pairs once captured, so long chats keep a small DOM")
+    parser.add_argument("--capture", action="store_true", default=None,
+                        help="run Chrome headless without loading images, media or fonts")
+    parser.add_argument("--thumbnails", action="store_true", help="make thumbnails and a contact sheet afterwards")
+    args = parser.parse_args()
+
+    save_poe_chat(args.url, args.output_dir, args.format, args.concurrency, args.archive, args.search_index,
+                  args.incremental, args.prune, args.capture, args.thumbnails)
@@ -0,0 +1,30 @@
+import os
+
+# Shared by the extractors. A pruned pair keeps its node, since React inserts
+# older pairs relative to the existing ones, but loses its whole subtree. It
+# keeps its rendered height, so the scroll position, the scroll anchor and the
+# paging trigger above it do not move, and it still counts as a pair, so
+# positional keys and the pair counts scroll waits rely on stay the same.
+# The DOM message ids are kept in the attribute, so keys survive pruning.
+PAIR_JS_FUNCTIONS = """
+function pairIds(pair) {
+    if (pair.hasAttribute("data-poe-pruned")) { return pair.getAttribute("data-poe-pruned"); }
+    return Array.from(pair.querySelectorAll("[id^='message'], [data-message-id]"),
+        (node) => node.getAttribute("data-message-id") || node.id).join("|");
+}
+function prunePairs(pairs) {
+    // Read every height before writing any, so layout runs once
+    const heights = pairs.map((pair) => pair.offsetHeight);
+    pairs.forEach((pair, index) => {
+        const ids = pairIds(pair);
+        pair.style.height = heights[index] + "px";
+        pair.style.contain = "strict";
+        pair.replaceChildren();
+        pair.setAttribute("data-poe-pruned", ids);
+    });
+}
+"""
+
+def pruning_enabled():
+    # Read at scroll time so values loaded from .env are seen
+    return os.getenv('POE_PRUNE_DOM', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,524 @@
+import os
+import re
+import time
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+
+import aiohttp
+
+from poe_blob_store import BlobStore
+from poe_download_journal import DownloadJournal, QUEUED, IN_PROGRESS, DONE, FAILED
+from poe_metrics import metrics
+from poe_archive import ArchiveWriter, archive_path_for
+from poe_transcript_writer import chat_url_part
+from poe_download_scheduler import (HostScheduler, RetryableDownloadError, parse_retry_after, backoff_delay,
+                                    RETRY_STATUSES, DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_ATTEMPTS)
+
+DEFAULT_CONCURRENCY = 20
+DEFAULT_CHUNK_SIZE = 64 * 1024
+ARCHIVE_LOCK_POLL_INTERVAL = 0.01
+JOURNAL_PROGRESS_INTERVAL = 8 * 1024 * 1024
+UNSATISFIED_RANGE_PATTERN = re.compile(r"^bytes \*/(\d+)$")
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=30)
+
+def file_extension_for(url):
+    return os.path.splitext(urlparse(url).path)[1] or '.jpg'
+
+def part_path_for(save_dir, url):
+    # Named after the URL rather than the list index so a later run finds it
+    return os.path.join(save_dir, f".{hashlib.md5(url.encode('utf-8')).hexdigest()}.part")
+
+def range_total(content_range):
+    # The complete length from an unsatisfied range's "bytes */N"
+    match = UNSATISFIED_RANGE_PATTERN.match(content_range or '')
+    return int(match.group(1)) if match else None
+
+def hash_existing(path, md5, chunk_size):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+
+async def download_to_file(session, limiter, img_url, save_dir, index, store, journal, chunk_size, revalidate=False):
+    known = store.lookup_url(img_url)
+    headers = {}
+    if known:
+        if not revalidate:
+            logging.debug(f"Already downloaded, skipping: {img_url}")
+            metrics.count('url_cache_hits')
+            return False, known['hash']
+        if known['etag']:
+            headers['If-None-Match'] = known['etag']
+        if known['last_modified']:
+            headers['If-Modified-Since'] = known['last_modified']
+
+    # Continue a partial file left by an interrupted run with a Range request.
+    # If-Range makes the server send the full body instead if the file changed.
+    part_path = part_path_for(save_dir, img_url)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    previous = journal.get(img_url) or {}
+    etag = previous.get('etag')
+    last_modified = previous.get('last_modified')
+    if offset and not known:
+        headers['Range'] = f"bytes={offset}-"
+        if etag or last_modified:
+            headers['If-Range'] = etag or last_modified
+
+    # Stream into the part file and hash while writing, so memory use per
+    # download never exceeds one chunk regardless of the file size.
+    md5 = hashlib.md5()
+    try:
+        async with limiter.slot() as started, session.get(img_url, headers=headers) as response:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            limiter.record_response(response.status, time.monotonic() - started, retry_after)
+            if response.status == 304 and known:
+                logging.debug(f"Not modified, skipping: {img_url}")
+                metrics.count('url_cache_hits')
+                store.touch_url(img_url)
+                journal.record(img_url, DONE, hash=known['hash'])
+                return False, known['hash']
+            if response.status == 416 and offset:
+                total = range_total(response.headers.get('Content-Range'))
+                if total != offset:
+                    # Start over from byte zero on the next attempt
+                    journal.record(img_url, FAILED, error="part file does not match the remote size", offset=0)
+                    os.remove(part_path)
+                    raise RetryableDownloadError(f"HTTP 416 for a {offset} byte part of a {total} byte file")
+                # A crash after the last chunk but before the rename left the
+                # whole body in the part file; hash it and finish as usual
+                logging.debug(f"Part file is already complete: {img_url}")
+                await asyncio.to_thread(hash_existing, part_path, md5, chunk_size)
+            elif response.status not in (200, 206):
+                journal.record(img_url, FAILED, status=response.status, offset=offset, etag=etag,
+                               last_modified=last_modified)
+                if response.status in RETRY_STATUSES:
+                    raise RetryableDownloadError(f"HTTP {response.status}", response.status, retry_after)
+                logging.error(f"Failed to download image from {img_url} (HTTP {response.status})")
+                metrics.count('downloads_failed')
+                return False, None
+            else:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                content_range = response.headers.get('Content-Range', '')
+                if response.status == 206 and content_range.startswith(f"bytes {offset}-"):
+                    logging.debug(f"Resuming {img_url} at byte {offset}")
+                    await asyncio.to_thread(hash_existing, part_path, md5, chunk_size)
+                    mode = 'ab'
+                elif response.status == 206:
+                    # Start over from byte zero on the next attempt
+                    journal.record(img_url, FAILED, error="unexpected Content-Range", offset=0)
+                    os.remove(part_path)
+                    raise RetryableDownloadError(f"unexpected Content-Range {content_range}")
+                else:
+                    offset = 0
+                    mode = 'wb'
+
+                journal.record(img_url, IN_PROGRESS, offset=offset, etag=etag, last_modified=last_modified)
+                last_recorded = offset
+                with open(part_path, mode) as f:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        md5.update(chunk)
+                        f.write(chunk)
+                        offset += len(chunk)
+                        metrics.count('bytes_downloaded', len(chunk))
+                        if offset - last_recorded >= JOURNAL_PROGRESS_INTERVAL:
+                            f.flush()
+                            journal.record(img_url, IN_PROGRESS, offset=offset, etag=etag,
+                                           last_modified=last_modified)
+                            last_recorded = offset
+
+        img_hash = md5.hexdigest()
+
+        # Check and claim the hash with no await in between; the event loop
+        # runs one coroutine at a time, so concurrent duplicates cannot race.
+        existing_path = store.path_for_hash(img_hash)
+        if existing_path:
+            logging.debug(f"Duplicate image found for URL: {img_url}")
+            metrics.count('dedup_hits')
+            os.remove(part_path)
+            store.record_url(img_url, img_hash, etag, last_modified)
+            journal.record(img_url, DONE, hash=img_hash, duplicate=True)
+            return False, img_hash
+
+        safe_filename = f"image_{index}_{img_hash}{file_extension_for(img_url)}"
+        file_path = os.path.join(save_dir, safe_filename)
+        os.replace(part_path, file_path)
+        store.add_blob(img_hash, file_path)
+        store.record_url(img_url, img_hash, etag, last_modified)
+        journal.record(img_url, DONE, hash=img_hash, path=file_path)
+        logging.debug(f"Saved {safe_filename}")
+        metrics.count('images_saved')
+        return True, img_hash
+    except RetryableDownloadError:
+        raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Keep the part file; the retry continues from where this one stopped
+        limiter.record_error()
+        journal.record(img_url, FAILED, error=str(e) or type(e).__name__, offset=offset, etag=etag,
+                       last_modified=last_modified)
+        raise RetryableDownloadError(str(e) or type(e).__name__)
+    except Exception as e:
+        logging.error(f"Error downloading image from {img_url}: {str(e)}")
+        metrics.count('downloads_failed')
+        journal.record(img_url, FAILED, error=str(e), offset=offset, etag=etag, last_modified=last_modified)
+        return False, None
+
+def body_length(response):
+    # Content-Length only gives the body size when aiohttp is not decoding it
+    if response.headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    return response.content_length
+
+@asynccontextmanager
+async def archive_writer_lock(archive):
+    # The archive lock is a thread lock shared with add_file callers, so it is
+    # polled here rather than blocking the event loop
+    while not archive.lock.acquire(blocking=False):
+        await asyncio.sleep(ARCHIVE_LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        archive.lock.release()
+
+async def archive_buffered(response, img_url, index, archive, chunk_size):
+    # Small bodies are held in memory so a duplicate is skipped unwritten
+    md5 = hashlib.md5()
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(chunk_size):
+        md5.update(chunk)
+        body += chunk
+        metrics.count('bytes_downloaded', len(chunk))
+    img_hash = md5.hexdigest()
+    existing_entry = archive.entry_for_hash(img_hash)
+    if existing_entry:
+        logging.debug(f"Duplicate image found for URL: {img_url}")
+        metrics.count('dedup_hits')
+        archive.record(img_url, hash=img_hash, duplicate_of=existing_entry)
+        return False, img_hash
+    entry = archive.unique_name(f"image_{index}{file_extension_for(img_url)}")
+    archive.claim(img_hash, entry)
+    # The thread keeps the event loop free to stream other downloads while
+    # this one waits for the archive lock
+    await asyncio.to_thread(archive.add_bytes, entry, bytes(body))
+    archive.record(img_url, hash=img_hash, entry=entry, size=len(body))
+    return True, img_hash
+
+async def archive_spooled(response, img_url, index, archive, chunk_size):
+    # A tar header needs the size first, so a tar body of unknown length goes
+    # through a temporary file beside the archive instead of memory
+    md5 = hashlib.md5()
+    with archive.disk_spool() as spool:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            md5.update(chunk)
+            spool.write(chunk)
+            metrics.count('bytes_downloaded', len(chunk))
+        img_hash = md5.hexdigest()
+        existing_entry = archive.entry_for_hash(img_hash)
+        if existing_entry:
+            logging.debug(f"Duplicate image found for URL: {img_url}")
+            metrics.count('dedup_hits')
+            archive.record(img_url, hash=img_hash, duplicate_of=existing_entry)
+            return False, img_hash
+        entry = archive.unique_name(f"image_{index}{file_extension_for(img_url)}")
+        archive.claim(img_hash, entry)
+        size = spool.tell()
+        spool.seek(0)
+        await asyncio.to_thread(archive.add_file, entry, spool, size)
+    archive.record(img_url, hash=img_hash, entry=entry, size=size)
+    return True, img_hash
+
+async def archive_streamed(response, img_url, index, archive, chunk_size, size):
+    # Written into its entry as it arrives, so the hash is only known once
+    # the entry is complete; a duplicate stays stored and is marked as such
+    md5 = hashlib.md5()
+    written = 0
+    entry = archive.unique_name(f"image_{index}{file_extension_for(img_url)}")
+    async with archive_writer_lock(archive):
+        try:
+            with archive.open_entry(entry, size) as dest:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    md5.update(chunk)
+                    dest.write(chunk)
+                    written += len(chunk)
+                    metrics.count('bytes_downloaded', len(chunk))
+        except BaseException:
+            archive.record(img_url, entry=entry, size=written, incomplete=True)
+            raise
+    if size is not None and written != size:
+        archive.record(img_url, entry=entry, size=written, incomplete=True)
+        raise RetryableDownloadError(f"Body ended after {written} of {size} bytes")
+    img_hash = md5.hexdigest()
+    existing_entry = archive.entry_for_hash(img_hash)
+    if existing_entry:
+        logging.debug(f"Duplicate image found for URL: {img_url}")
+        metrics.count('dedup_hits')
+        archive.record(img_url, hash=img_hash, entry=entry, size=written, duplicate_of=existing_entry)
+        return False, img_hash
+    archive.claim(img_hash, entry)
+    archive.record(img_url, hash=img_hash, entry=entry, size=written)
+    return True, img_hash
+
+async def download_to_archive(session, limiter, img_url, index, archive, chunk_size):
+    # Like download_to_file, but the body goes into an archive entry named by
+    # its index; nothing is written to the save directory
+    try:
+        async with limiter.slot() as started, session.get(img_url) as response:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            limiter.record_response(response.status, time.monotonic() - started, retry_after)
+            if response.status in RETRY_STATUSES:
+                raise RetryableDownloadError(f"HTTP {response.status}", response.status, retry_after)
+            if response.status != 200:
+                logging.error(f"Failed to download image from {img_url} (HTTP {response.status})")
+                metrics.count('downloads_failed')
+                archive.record(img_url, error=f"HTTP {response.status}")
+                return False, None
+            size = body_length(response)
+            if size is not None and archive.reserve(size):
+                try:
+                    saved, img_hash = await archive_buffered(response, img_url, index, archive, chunk_size)
+                finally:
+                    archive.release(size)
+            elif size is None and archive.archive_format == "tar":
+                saved, img_hash = await archive_spooled(response, img_url, index, archive, chunk_size)
+            else:
+                saved, img_hash = await archive_streamed(response, img_url, index, archive, chunk_size, size)
+        if saved:
+            logging.debug(f"Archived {img_url}")
+            metrics.count('images_saved')
+        return saved, img_hash
+    except RetryableDownloadError:
+        raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        limiter.record_error()
+        raise RetryableDownloadError(str(e) or type(e).__name__)
+    except Exception as e:
+        logging.error(f"Error downloading image from {img_url}: {str(e)}")
+        metrics.count('downloads_failed')
+        archive.record(img_url, error=str(e))
+        return False, None
+
+async def download_with_retries(fetch, img_url, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    # fetch makes one attempt and raises RetryableDownloadError when another
+    # one may succeed
+    for attempt in range(max_attempts):
+        try:
+            return await fetch()
+        except RetryableDownloadError as e:
+            if attempt + 1 == max_attempts:
+                logging.error(f"Giving up on {img_url} after {max_attempts} attempts: {str(e)}")
+                metrics.count('downloads_failed')
+                return False, None
+            delay = backoff_delay(attempt, e.retry_after)
+            logging.warning(f"Retrying {img_url} in {delay:.1f}s ({str(e)})")
+            metrics.count('download_retries')
+            await asyncio.sleep(delay)
+
+async def run_download_workers(pending, fetch, concurrency, max_concurrency):
+    # pending is an asyncio.Queue of (index, img_url) items ended by None, and
+    # fetch(session, limiter, img_url, index) makes one attempt at one URL.
+    # concurrency is where each host's limit starts; the scheduler moves it
+    # between 1 and max_concurrency as responses come back. One pooled session
+    # keeps TLS connections alive across downloads, and the fixed worker count
+    # caps in-flight memory at max_concurrency * chunk_size.
+    results = {}
+    max_concurrency = max(concurrency, max_concurrency)
+    scheduler = HostScheduler(concurrency, max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT) as session:
+        async def worker():
+            while True:
+                item = await pending.get()
+                if item is None:
+                    # Put the end marker back for the other workers
+                    pending.put_nowait(None)
+                    return
+                i, img_url = item
+                limiter = scheduler.for_url(img_url)
+                results[i] = await download_with_retries(lambda: fetch(session, limiter, img_url, i), img_url)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, max_concurrency))))
+    scheduler.log_limits()
+    return results
+
+async def run_downloads(img_urls, fetch, concurrency, max_concurrency):
+    pending = asyncio.Queue()
+    for item in enumerate(img_urls):
+        pending.put_nowait(item)
+    pending.put_nowait(None)
+    results = await run_download_workers(pending, fetch, concurrency, max_concurrency)
+    return [results[i] for i in range(len(img_urls))]
+
+def failed_urls(img_urls, results):
+    return [img_url for img_url, (success, img_hash) in zip(img_urls, results) if not success and img_hash is None]
+
+async def download_all(img_urls, save_dir, concurrency=DEFAULT_CONCURRENCY, chunk_size=DEFAULT_CHUNK_SIZE,
+                       index_path=None, revalidate=False, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    store = BlobStore(save_dir, index_path)
+    journal = DownloadJournal(save_dir)
+    for img_url in img_urls:
+        if journal.state(img_url) is None:
+            journal.record(img_url, QUEUED)
+
+    async def fetch(session, limiter, img_url, index):
+        return await download_to_file(session, limiter, img_url, save_dir, index, store, journal, chunk_size,
+                                      revalidate)
+
+    try:
+        results = await run_downloads(img_urls, fetch, concurrency, max_concurrency)
+    finally:
+        journal.close()
+        store.close()
+
+    failed = failed_urls(img_urls, results)
+    if failed:
+        # The journal keeps each failure, and the next run tries them again
+        logging.error(f"{len(failed)} of {len(img_urls)} downloads failed and are marked in the journal for the "
+                      f"next run: {', '.join(failed[:5])}{' ...' if len(failed) > 5 else ''}")
+    return results
+
+async def download_all_to_archive(img_urls, archive, concurrency=DEFAULT_CONCURRENCY, chunk_size=DEFAULT_CHUNK_SIZE,
+                                  max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    async def fetch(session, limiter, img_url, index):
+        return await download_to_archive(session, limiter, img_url, index, archive, chunk_size)
+
+    results = await run_downloads(img_urls, fetch, concurrency, max_concurrency)
+    failed = failed_urls(img_urls, results)
+    recorded = archive.recorded_urls()
+    for img_url in failed:
+        if img_url not in recorded:
+            archive.record(img_url, error="gave up after retries")
+    if failed:
+        logging.error(f"{len(failed)} of {len(img_urls)} downloads failed and are listed in the archive manifest: "
+                      f"{', '.join(failed[:5])}{' ...' if len(failed) > 5 else ''}")
+    return results
+
+async def download_stream(url_queue, img_urls, save_dir, concurrency=DEFAULT_CONCURRENCY,
+                          chunk_size=DEFAULT_CHUNK_SIZE, index_path=None, revalidate=False,
+                          max_concurrency=DEFAULT_MAX_CONCURRENCY, archive=None):
+    # Like download_all, for URLs that are still being found: url_queue is a
+    # queue.Queue of (index, img_url) items filled from another thread and
+    # ended by None, and img_urls is the list the indexes refer to. The store
+    # and journal are opened here, on the thread that uses them.
+    store = BlobStore(save_dir, index_path) if archive is None else None
+    journal = DownloadJournal(save_dir) if archive is None else None
+    pending = asyncio.Queue()
+
+    async def feed():
+        while True:
+            item = await asyncio.to_thread(url_queue.get)
+            if item is not None and journal is not None and journal.state(item[1]) is None:
+                journal.record(item[1], QUEUED)
+            pending.put_nowait(item)
+            if item is None:
+                return
+
+    async def fetch(session, limiter, img_url, index):
+        if archive is not None:
+            return await download_to_archive(session, limiter, img_url, index, archive, chunk_size)
+        return await download_to_file(session, limiter, img_url, save_dir, index, store, journal, chunk_size,
+                                      revalidate)
+
+    try:
+        feeder = asyncio.create_task(feed())
+        results = await run_download_workers(pending, fetch, concurrency, max_concurrency)
+        await feeder
+    finally:
+        if journal is not None:
+            journal.close()
+            store.close()
+
+    results = [results.get(i, (False, None)) for i in range(len(img_urls))]
+    failed = failed_urls(img_urls, results)
+    if failed:
+        where = "are marked in the journal for the next run"
+        if archive is not None:
+            where = "are listed in the archive manifest"
+            recorded = archive.recorded_urls()
+            for img_url in failed:
+                if img_url not in recorded:
+                    archive.record(img_url, error="gave up after retries")
+        logging.error(f"{len(failed)} of {len(img_urls)} downloads failed and {where}: "
+                      f"{', '.join(failed[:5])}{' ...' if len(failed) > 5 else ''}")
+    return results
+
+class BackgroundDownloader:
+    # Runs downloads on a thread of its own, so the caller can keep scrolling
+    # while images are fetched. add() queues URLs as they are found and skips
+    # any already queued; finish() waits for the rest and returns the results
+    # in the order the URLs were added, like download_images.
+    def __init__(self, save_dir, concurrency=DEFAULT_CONCURRENCY, chunk_size=DEFAULT_CHUNK_SIZE, index_path=None,
+                 revalidate=False, max_concurrency=DEFAULT_MAX_CONCURRENCY, archive=None):
+        self.img_urls = []
+        self.queued = set()
+        self.url_queue = queue.Queue()
+        self.results = None
+        self.error = None
+        self.thread = threading.Thread(
+            target=self._run, daemon=True,
+            args=(save_dir, concurrency, chunk_size, index_path, revalidate, max_concurrency, archive))
+        self.thread.start()
+
+    def _run(self, *args):
+        try:
+            with metrics.phase("download"):
+                self.results = asyncio.run(download_stream(self.url_queue, self.img_urls, *args))
+        except Exception as e:
+            self.error = e
+
+    def add(self, img_urls):
+        added = 0
+        for img_url in img_urls:
+            if img_url not in self.queued:
+                self.queued.add(img_url)
+                # Append before queueing, so the download thread never sees
+                # an index the list does not have yet
+                self.img_urls.append(img_url)
+                self.url_queue.put((len(self.img_urls) - 1, img_url))
+                added += 1
+        return added
+
+    def __len__(self):
+        return len(self.img_urls)
+
+    def finish(self):
+        self.url_queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+def download_images(img_urls, save_dir, concurrency=DEFAULT_CONCURRENCY, chunk_size=DEFAULT_CHUNK_SIZE,
+                    index_path=None, revalidate=False, max_concurrency=DEFAULT_MAX_CONCURRENCY, archive=None):
+    # With an ArchiveWriter, images go into the archive instead of save_dir
+    with metrics.phase("download"):
+        if archive is not None:
+            return asyncio.run(download_all_to_archive(img_urls, archive, concurrency, chunk_size, max_concurrency))
+        return asyncio.run(download_all(img_urls, save_dir, concurrency, chunk_size, index_path, revalidate,
+                                        max_concurrency))
+
+def download_chat_images(img_urls, url, save_dir, concurrency=DEFAULT_CONCURRENCY, index_path=None, revalidate=False,
+                         archive_format=None, previews=False):
+    if archive_format:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        archive_path = archive_path_for(save_dir, f"poe_chat_{chat_url_part(url)}_{timestamp}", archive_format)
+        with ArchiveWriter(archive_path, archive_format) as archive:
+            results = download_images(img_urls, save_dir, concurrency=concurrency, archive=archive)
+    else:
+        results = download_images(img_urls, save_dir, concurrency=concurrency,
+                                  index_path=index_path, revalidate=revalidate)
+    successful_downloads = sum(1 for success, _ in results if success)
+    logging.info(f"Successfully downloaded {successful_downloads} unique images out of {len(img_urls)} URLs")
+    if previews:
+        if archive_format:
+            logging.warning("Thumbnails are only made for loose files; skipping them for the archive")
+        else:
+            # Imported here so Pillow stays optional for plain downloads
+            from poe_thumbnails import build_previews
+            with metrics.phase("previews"):
+                build_previews(save_dir)
+    return results
@@ -0,0 +1,58 @@
+import os
+import json
+import time
+
+JOURNAL_FILENAME = ".poe_journal.jsonl"
+
+QUEUED = "queued"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+class DownloadJournal:
+    # Append-only log of per-URL download state. Each line is a JSON record;
+    # the last record for a URL wins. The log is compacted to one line per URL
+    # when opened so it does not grow without bound across runs.
+    def __init__(self, save_dir, path=None):
+        self.path = path or os.path.join(save_dir, JOURNAL_FILENAME)
+        self.states = {}
+        if os.path.exists(self.path):
+            self._load()
+            self._compact()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a truncated final line
+                    continue
+                self.states[record['url']] = record
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.states.values():
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def state(self, url):
+        record = self.states.get(url)
+        return record['state'] if record else None
+
+    def get(self, url):
+        return self.states.get(url)
+
+    def unfinished(self):
+        return [url for url, record in self.states.items() if record['state'] != DONE]
+
+    def record(self, url, state, **fields):
+        record = {'url': url, 'state': state, 'time': time.time(), **fields}
+        self.states[url] = record
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
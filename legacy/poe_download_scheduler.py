@@ -0,0 +1,127 @@
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+DEFAULT_MAX_CONCURRENCY = 64
+MIN_CONCURRENCY = 1
+DEFAULT_MAX_ATTEMPTS = 6
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 60.0
+LATENCY_EWMA_WEIGHT = 0.2
+# Latency counts as rising once the average is this many times the fastest
+# seen, plus a fixed slack so sub-millisecond jitter on fast hosts is ignored
+LATENCY_TOLERANCE = 2.0
+LATENCY_SLACK = 0.05
+BASELINE_DRIFT = 0.01
+THROTTLE_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+DECREASE_INTERVAL = 1.0
+
+def parse_retry_after(value):
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    # Full jitter keeps retries from many workers from arriving in lockstep
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after) if retry_after is not None else delay
+
+class RetryableDownloadError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class AdaptiveLimiter:
+    # AIMD concurrency limit for one host. Each fast response adds 1/limit,
+    # so the limit grows by about one per round of requests; a 429 or 503
+    # halves it and rising time-to-first-byte trims it, at most once per
+    # DECREASE_INTERVAL so one burst of errors only counts once. Retry-After
+    # pauses every request to the host.
+    def __init__(self, host, initial, maximum):
+        self.host = host
+        self.maximum = maximum
+        self.limit = float(max(MIN_CONCURRENCY, min(initial, maximum)))
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+        self.paused_until = 0.0
+        self.latency = None
+        self.fastest = None
+        self.last_decrease = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self.condition:
+            while self.in_flight >= int(self.limit):
+                await self.condition.wait()
+            self.in_flight += 1
+        try:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            # The start time lets the caller measure time to first byte
+            yield time.monotonic()
+        finally:
+            async with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    def _decrease(self, factor, reason):
+        now = time.monotonic()
+        if now - self.last_decrease < DECREASE_INTERVAL:
+            return
+        self.last_decrease = now
+        self.limit = max(MIN_CONCURRENCY, self.limit * factor)
+        logging.debug(f"{self.host}: {reason}, concurrency lowered to {int(self.limit)}")
+
+    def record_response(self, status, latency, retry_after=None):
+        if status in THROTTLE_STATUSES:
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self._decrease(THROTTLE_DECREASE, f"HTTP {status}")
+            return
+        # The baseline drifts slowly toward current latency, so one unusually
+        # fast response cannot keep the limit shrinking forever
+        self.fastest = latency if self.fastest is None else min(
+            latency, self.fastest + (latency - self.fastest) * BASELINE_DRIFT)
+        self.latency = latency if self.latency is None else (
+            LATENCY_EWMA_WEIGHT * latency + (1 - LATENCY_EWMA_WEIGHT) * self.latency)
+        if self.latency > self.fastest * LATENCY_TOLERANCE + LATENCY_SLACK:
+            self._decrease(LATENCY_DECREASE, f"latency {self.latency:.2f}s")
+        elif status < 500:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def record_error(self):
+        # Connection errors and timeouts are treated like throttling
+        self._decrease(THROTTLE_DECREASE, "connection error")
+
+class HostScheduler:
+    def __init__(self, initial, maximum=DEFAULT_MAX_CONCURRENCY):
+        self.initial = initial
+        self.maximum = maximum
+        self.limiters = {}
+
+    def for_url(self, url):
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveLimiter(host, self.initial, self.maximum)
+        return self.limiters[host]
+
+    def log_limits(self):
+        for host, limiter in self.limiters.items():
+            logging.info(f"{host}: concurrency settled at {int(limiter.limit)}")
@@ -0,0 +1,144 @@
+import re
+import time
+import sqlite3
+import logging
+
+METRIC_COLUMNS = ('earnings', 'messages', 'unique_users', 'followers', 'upvote_ratio')
+NUMBER_PATTERN = re.compile(r"^(-?\d+(?:\.\d+)?)\s*([kmb])?$", re.IGNORECASE)
+SUFFIX_MULTIPLIERS = {None: 1, 'k': 1_000, 'm': 1_000_000, 'b': 1_000_000_000}
+
+def parse_number(text):
+    # "$1,234.56" -> 1234.56, "95%" -> 95.0, "1.2K" -> 1200.0; "-" and
+    # anything else that is not one number ("1.2.3", "N/A") -> None
+    cleaned = (text or "").strip().replace("$", "").replace(",", "").replace("%", "")
+    match = NUMBER_PATTERN.match(cleaned)
+    if not match:
+        return None
+    suffix = match.group(2).lower() if match.group(2) else None
+    return float(match.group(1)) * SUFFIX_MULTIPLIERS[suffix]
+
+def parse_count(text):
+    value = parse_number(text)
+    return None if value is None else int(round(value))
+
+def parse_row(row):
+    bot_name, earnings, messages, unique_users, followers, upvote_ratio = row
+    return (bot_name, parse_number(earnings), parse_count(messages), parse_count(unique_users),
+            parse_count(followers), parse_number(upvote_ratio))
+
+class EarningsStore:
+    # Typed history of creator earnings. Each snapshot stores only the bots
+    # whose values changed since their previous row, keyed by (bot, ts); reads
+    # carry the last known values forward until a bot is marked removed.
+    # Snapshot totals cover only the rows scraped in that snapshot. A partial
+    # snapshot (paging failed part way) never marks missing bots as removed.
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                ts REAL PRIMARY KEY,
+                bots INTEGER NOT NULL,
+                total_earnings REAL,
+                total_messages INTEGER,
+                total_unique_users INTEGER,
+                total_followers INTEGER,
+                partial INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS bot_metrics (
+                bot TEXT NOT NULL,
+                ts REAL NOT NULL,
+                earnings REAL,
+                messages INTEGER,
+                unique_users INTEGER,
+                followers INTEGER,
+                upvote_ratio REAL,
+                removed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bot, ts)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS bot_metrics_ts ON bot_metrics (ts);
+            CREATE TABLE IF NOT EXISTS latest (
+                bot TEXT PRIMARY KEY,
+                ts REAL NOT NULL,
+                earnings REAL,
+                messages INTEGER,
+                unique_users INTEGER,
+                followers INTEGER,
+                upvote_ratio REAL
+            );
+        """)
+
+    def append_snapshot(self, data, ts=None, partial=False):
+        ts = time.time() if ts is None else ts
+        latest = {row[0]: row[1:] for row in self.conn.execute(
+            f"SELECT bot, {', '.join(METRIC_COLUMNS)} FROM latest")}
+
+        rows = {}
+        for row in data:
+            parsed = parse_row(row)
+            rows[parsed[0]] = parsed[1:]
+        changed = [(bot, ts) + values for bot, values in rows.items() if latest.get(bot) != values]
+        removed = [] if partial else sorted(set(latest) - set(rows))
+
+        def total(column):
+            return sum(values[column] or 0 for values in rows.values())
+
+        placeholders = ", ".join("?" * (2 + len(METRIC_COLUMNS)))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO bot_metrics (bot, ts, {', '.join(METRIC_COLUMNS)}) VALUES ({placeholders})",
+                changed)
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO latest (bot, ts, {', '.join(METRIC_COLUMNS)}) VALUES ({placeholders})",
+                changed)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO bot_metrics (bot, ts, removed) VALUES (?, ?, 1)",
+                [(bot, ts) for bot in removed])
+            self.conn.executemany("DELETE FROM latest WHERE bot = ?", [(bot,) for bot in removed])
+            # Totals are kept per snapshot so aggregate reads are a plain scan
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ts, len(rows), float(total(0)), total(1), total(2), total(3), int(partial)))
+        logging.info(f"Stored {'partial ' if partial else ''}earnings snapshot: {len(changed)} of {len(rows)} bots "
+                     f"changed, {len(removed)} removed")
+        return len(changed)
+
+    def bot_history(self, bot, since=None, until=None):
+        # Returns (ts, earnings, messages, unique_users, followers, upvote_ratio)
+        # for every snapshot in range, filling unchanged snapshots forward and
+        # skipping snapshots from the bot's removal until it reappears
+        since = float('-inf') if since is None else since
+        until = float('inf') if until is None else until
+        changes = self.conn.execute(
+            f"SELECT ts, removed, {', '.join(METRIC_COLUMNS)} FROM bot_metrics WHERE bot = ? AND ts <= ? ORDER BY ts",
+            (bot, until)).fetchall()
+        snapshot_times = [ts for (ts,) in self.conn.execute(
+            "SELECT ts FROM snapshots WHERE ts >= ? AND ts <= ? ORDER BY ts", (since, until))]
+
+        history = []
+        current = None
+        i = 0
+        for ts in snapshot_times:
+            while i < len(changes) and changes[i][0] <= ts:
+                current = None if changes[i][1] else changes[i][2:]
+                i += 1
+            if current is not None:
+                history.append((ts,) + current)
+        return history
+
+    def aggregate_history(self, since=None, until=None):
+        # Returns (ts, total_earnings, total_messages, total_unique_users,
+        # total_followers, bot_count, partial) per snapshot, across the bots
+        # scraped in that snapshot
+        since = float('-inf') if since is None else since
+        until = float('inf') if until is None else until
+        return self.conn.execute(
+            "SELECT ts, total_earnings, CAST(total_messages AS INTEGER), CAST(total_unique_users AS INTEGER), "
+            "CAST(total_followers AS INTEGER), bots, partial FROM snapshots WHERE ts >= ? AND ts <= ? ORDER BY ts",
+            (since, until)).fetchall()
+
+    def bots(self):
+        return [bot for (bot,) in self.conn.execute("SELECT bot FROM latest ORDER BY bot")]
+
+    def close(self):
+        self.conn.close()
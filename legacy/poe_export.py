@@ -0,0 +1,174 @@
+import os
+import sys
+import argparse
+import logging
+
+from poe_transcript_writer import OUTPUT_FORMATS
+from poe_archive import ARCHIVE_FORMATS
+from poe_metrics import metrics
+
+# One entry point for cron jobs. Only the standard library and the three
+# modules above are loaded up front; each subcommand imports what its path
+# needs, so --help and share-link exports never load Selenium. All exports
+# in a run share one browser, started and logged in by the first chat that
+# needs it, and count into one poe_metrics.json written when the run ends.
+
+def given(**options):
+    # Unset options fall back to each exporter's own defaults
+    return {name: value for name, value in options.items() if value is not None}
+
+def export_each(urls, export):
+    # One failed chat does not stop the others, but the run still fails
+    failed = []
+    for url in urls:
+        try:
+            export(url)
+        except Exception as e:
+            logging.error(f"Export of {url} failed: {str(e)}")
+            failed.append(url)
+    return failed
+
+def raise_if_failed(failed, total):
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {total} chats failed: {', '.join(failed)}")
+
+def metrics_dir(args):
+    if args.command == "earnings":
+        return os.path.dirname(os.path.abspath(args.output))
+    return args.output_dir
+
+def export_images(args, browser):
+    from poe_share_export import is_share_url
+
+    def export(url):
+        if is_share_url(url):
+            from poe_share_export import export_share_images
+            export_share_images(url, args.output_dir, args.concurrency, args.index, args.revalidate, args.archive,
+                                args.thumbnails)
+        else:
+            from poe_image_downloader import save_poe_chat_images
+            save_poe_chat_images(url, args.output_dir, archive_format=args.archive, previews=args.thumbnails,
+                                 incremental=args.incremental, revalidate=args.revalidate, browser=browser(),
+                                 **given(concurrency=args.concurrency, index_path=args.index))
+    raise_if_failed(export_each(args.urls, export), len(args.urls))
+
+def export_text(args, browser):
+    from poe_share_export import is_share_url
+    from poe_search_index import SearchIndex
+    search_index = SearchIndex(args.search_index) if args.search_index else None
+
+    def export(url):
+        if is_share_url(url):
+            from poe_share_export import export_share_text
+            export_share_text(url, args.output_dir, args.format, search_index)
+        else:
+            from poe_text_downloader import export_chat_text, DEFAULT_NETWORK_IDLE_TIMEOUT
+            export_chat_text(url, args.output_dir, DEFAULT_NETWORK_IDLE_TIMEOUT, args.format, search_index,
+                             args.incremental, browser())
+    try:
+        failed = export_each(args.urls, export)
+    finally:
+        if search_index is not None:
+            search_index.close()
+    raise_if_failed(failed, len(args.urls))
+
+def export_earnings(args, browser, output_file=None):
+    from creator_earnings import export_poe_creator_earnings
+    export_poe_creator_earnings(output_file or args.output, args.store, browser())
+
+def export_all(args, browser):
+    # Transcript and images come from one scroll per chat, then earnings
+    # reuse the same logged-in browser
+    from poe_chat_exporter import save_poe_chat
+
+    def export(url):
+        save_poe_chat(url, args.output_dir, args.format, archive_format=args.archive,
+                      search_index_path=args.search_index, incremental=args.incremental, prune=args.prune,
+                      previews=args.thumbnails, browser=browser(), **given(concurrency=args.concurrency))
+    failed = export_each(args.urls, export)
+    if not args.no_earnings:
+        os.makedirs(args.output_dir, exist_ok=True)
+        export_earnings(args, browser, os.path.join(args.output_dir, args.earnings_file))
+    raise_if_failed(failed, len(args.urls))
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--capture", action="store_true", default=None,
+                        help="run Chrome headless without loading images, media or fonts")
+
+    parser = argparse.ArgumentParser(description="Export Poe chats, images and Creator earnings.")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    images = commands.add_parser("images", parents=[common], help="download the images of one or more chats")
+    images.add_argument("urls", nargs="+", metavar="url", help="Poe chat or share URL")
+    images.add_argument("-o", "--output-dir", default="PoeChatImages")
+    images.add_argument("-c", "--concurrency", type=int, default=None, help="parallel downloads (default: 20)")
+    images.add_argument("-a", "--archive", choices=ARCHIVE_FORMATS, default=None,
+                        help="write the images and a manifest into one archive")
+    images.add_argument("--index", default=None, help="download index file (default: in the output directory)")
+    images.add_argument("--revalidate", action="store_true", help="check indexed images for changes on the server")
+    images.add_argument("--thumbnails", action="store_true", help="make thumbnails and a contact sheet afterwards")
+    images.add_argument("--incremental", action="store_true", help="only scroll back to the last export")
+    images.set_defaults(run=export_images)
+
+    text = commands.add_parser("text", parents=[common], help="save the transcripts of one or more chats")
+    text.add_argument("urls", nargs="+", metavar="url", help="Poe chat or share URL")
+    text.add_argument("-o", "--output-dir", default="PoeChatTranscripts")
+    text.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="text", help="transcript format")
+    text.add_argument("-i", "--search-index", default=None, help="search index file to update with each transcript")
+    text.add_argument("--incremental", action="store_true", help="only add messages newer than the last export")
+    text.set_defaults(run=export_text)
+
+    earnings = commands.add_parser("earnings", parents=[common], help="save Creator earnings to CSV")
+    earnings.add_argument("-o", "--output", default="poe_creator_earnings.csv", help="CSV file to write")
+    earnings.add_argument("-s", "--store", default=None, help="earnings history database to append to")
+    earnings.set_defaults(run=export_earnings)
+
+    everything = commands.add_parser("all", parents=[common],
+                                     help="export transcripts and images of chats, then Creator earnings")
+    everything.add_argument("urls", nargs="*", metavar="url", help="Poe chat or share URL")
+    everything.add_argument("-o", "--output-dir", default="PoeExport")
+    everything.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="text", help="transcript format")
+    everything.add_argument("-c", "--concurrency", type=int, default=None, help="parallel downloads (default: 20)")
+    everything.add_argument("-a", "--archive", choices=ARCHIVE_FORMATS, default=None,
+                            help="write each chat's images, transcript and manifest into one archive")
+    everything.add_argument("-i", "--search-index", default=None, help="search index file to update with each transcript")
+    everything.add_argument("--incremental", action="store_true", help="only collect content newer than the last export")
+    everything.add_argument("--prune", action="store_true", default=None,
+                            help="empty message pairs once captured, so long chats keep a small DOM")
+    everything.add_argument("--thumbnails", action="store_true", help="make thumbnails and a contact sheet afterwards")
+    everything.add_argument("--earnings-file", default="poe_creator_earnings.csv",
+                            help="earnings CSV name inside the output directory")
+    everything.add_argument("-s", "--store", default=None, help="earnings history database to append to")
+    everything.add_argument("--no-earnings", action="store_true", help="skip Creator earnings")
+    everything.set_defaults(run=export_all)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=os.getenv('POE_LOG_LEVEL', 'INFO').upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    session = None
+
+    def browser():
+        nonlocal session
+        if session is None:
+            from poe_browser import BrowserSession
+            session = BrowserSession(args.capture)
+        return session
+
+    try:
+        with metrics.run(args.command, metrics_dir(args)):
+            args.run(args, browser)
+    except Exception as e:
+        logging.error(f"{args.command} export failed: {str(e)}")
+        return 1
+    finally:
+        if session is not None:
+            session.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
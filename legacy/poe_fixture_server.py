@@ -0,0 +1,235 @@
+import re
+import json
+import time
+import hashlib
+import argparse
+import logging
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Synthetic Poe-like pages for benchmarking the exporters without an account.
+# The class names match the selectors the scroll, extract and paging code use.
+DEFAULT_CHAT = {'messages': 500, 'page_size': 20, 'latency': 50, 'images_every': 5,
+                'attachment_size': 64 * 1024, 'attachment_latency': 0}
+DEFAULT_CREATORS = {'bots': 200, 'per_page': 10, 'latency': 50}
+STREAM_CHUNK = 64 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d+)-$")
+
+CHAT_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Fixture chat</title><style>
+body { margin: 0; font-family: sans-serif; }
+.ChatMessagesScrollWrapper_scrollableContainerWrapper__x8H4Q { height: 100vh; overflow-y: auto; overflow-anchor: none; }
+.InfiniteScroll_pagingTrigger__cdz9I { height: 1px; }
+.ChatMessagesView_messagePair__ZEXUz { min-height: 120px; padding: 8px; border-bottom: 1px solid #ddd; }
+img { width: 64px; height: 64px; }
+</style></head><body>
+<div class="BotHeader_textContainer__kVf_I"><p>FixtureBot</p></div>
+<div class="ChatMessagesScrollWrapper_scrollableContainerWrapper__x8H4Q">
+<div class="InfiniteScroll_pagingTrigger__cdz9I"></div>
+<div id="messages"></div>
+</div>
+<script>
+const config = __CONFIG__;
+const wrapper = document.querySelector("div[class*='ChatMessagesScrollWrapper']");
+const trigger = document.querySelector("div[class*='InfiniteScroll_pagingTrigger']");
+const list = document.getElementById("messages");
+let loaded = 0;
+let loading = false;
+
+function attachment(i, name) {
+    return `${location.origin}/attachments/${config.attachment_size}/${config.attachment_latency}/${name}_${i}`;
+}
+
+function pairHtml(i) {
+    let media = "";
+    if (config.images_every && i % config.images_every === 0) {
+        media = `<img src="${attachment(i, "img")}.png"><p>See ${attachment(i, "link")}.jpg for the original</p>`;
+    }
+    return `<div class="ChatMessagesView_messagePair__ZEXUz">
+<div class="ChatMessage_rightSideMessageWrapper__r0roB" data-message-id="m${i}h">
+<div class="Message_rightSideMessageBubble__ioa_i"><div><p>Question number ${i}</p></div></div></div>
+<div class="Message_leftSideMessageBubble__VPdk6" data-message-id="m${i}b">
+<div class="Markdown_markdownContainer__Tz3HQ"><p>Answer number ${i} ${"lorem ipsum ".repeat(20)}</p>${media}</div></div>
+</div>`;
+}
+
+function renderPage() {
+    const end = config.messages - loaded;
+    const start = Math.max(0, end - config.page_size);
+    const parts = [];
+    for (let i = start; i < end; i++) { parts.push(pairHtml(i)); }
+    // Keep the visible content in place, as the real chat does
+    const before = wrapper.scrollHeight;
+    list.insertAdjacentHTML("afterbegin", parts.join(""));
+    wrapper.scrollTop += wrapper.scrollHeight - before;
+    loaded += end - start;
+    if (loaded >= config.messages) {
+        observer.disconnect();
+        trigger.remove();
+    }
+}
+
+const observer = new IntersectionObserver((entries) => {
+    if (loading || !entries.some((entry) => entry.isIntersecting)) { return; }
+    loading = true;
+    setTimeout(() => {
+        renderPage();
+        loading = false;
+        if (trigger.isConnected) {
+            // Re-observing reports the current state, so a trigger that is
+            // still visible keeps loading
+            observer.unobserve(trigger);
+            observer.observe(trigger);
+        }
+    }, config.latency);
+}, {root: wrapper});
+
+renderPage();
+wrapper.scrollTop = wrapper.scrollHeight;
+if (trigger.isConnected) { observer.observe(trigger); }
+</script>
+</body></html>
+"""
+
+CREATORS_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Fixture creators</title></head><body>
+<div id="hub"></div>
+<div class="CreatorHubBotMetricsTable_pagingSection__gyBfy">
+<button id="prev">Previous</button><button id="next">Next</button>
+</div>
+<script>
+const config = __CONFIG__;
+const pages = Math.max(1, Math.ceil(config.bots / config.per_page));
+let page = 0;
+
+function money(n) { return "$" + n.toLocaleString("en-US", {minimumFractionDigits: 2, maximumFractionDigits: 2}); }
+
+function render() {
+    const headers = ["Bot", "Earnings", "Messages", "Unique users", "Followers", "Upvote ratio"];
+    const rows = [];
+    for (let i = page * config.per_page; i < Math.min(config.bots, (page + 1) * config.per_page); i++) {
+        const values = [money(i * 13.37), (i * 101).toLocaleString("en-US"), String(i * 7), String(i * 3), (50 + i % 50) + "%"];
+        rows.push(`<tr><td><div class="CreatorHubBotMetricsTable_botName__XTijb">Bot ${i}</div></td>` +
+            values.map((v) => `<td><div class="CreatorHubBotMetricsTable_mainEarnings__byXzb">${v}</div></td>`).join("") +
+            "</tr>");
+    }
+    // A fresh table element per page, so old references go stale
+    document.getElementById("hub").innerHTML = `<table class="CreatorHubBotMetricsTable_table__8JeRY">` +
+        `<tr>${headers.map((h) => `<th>${h}</th>`).join("")}</tr>${rows.join("")}</table>`;
+    document.getElementById("prev").disabled = page === 0;
+    document.getElementById("next").disabled = page === pages - 1;
+}
+
+document.getElementById("next").addEventListener("click", () => {
+    if (page < pages - 1) { page += 1; setTimeout(render, config.latency); }
+});
+document.getElementById("prev").addEventListener("click", () => {
+    if (page > 0) { page -= 1; setTimeout(render, config.latency); }
+});
+render();
+</script>
+</body></html>
+"""
+
+def query_config(query, defaults):
+    params = parse_qs(query)
+    return {key: int(params[key][0]) if key in params else value for key, value in defaults.items()}
+
+def chat_url(base_url, **config):
+    return f"{base_url}/chat?" + "&".join(f"{key}={value}" for key, value in {**DEFAULT_CHAT, **config}.items())
+
+def creators_url(base_url, **config):
+    return f"{base_url}/creators?" + "&".join(f"{key}={value}" for key, value in {**DEFAULT_CREATORS, **config}.items())
+
+def attachment_url(base_url, name, size, latency=0):
+    return f"{base_url}/attachments/{size}/{latency}/{name}"
+
+def attachment_block(name):
+    # Content depends on the name, so distinct attachments never dedup
+    return hashlib.sha256(name.encode('utf-8')).digest() * (STREAM_CHUNK // 32)
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def send_page(self, template, config):
+        body = template.replace("__CONFIG__", json.dumps(config)).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_attachment(self, parts):
+        try:
+            size, latency, name = int(parts[0]), int(parts[1]), parts[2]
+        except (IndexError, ValueError):
+            self.send_error(404)
+            return
+        time.sleep(latency / 1000)
+        etag = '"' + hashlib.md5(f"{name}:{size}".encode('utf-8')).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        # Honours "bytes=N-" ranges like a CDN, so resumed downloads can be
+        # tested; If-Range with another validator gets the full body
+        start = 0
+        match = RANGE_PATTERN.match(self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range", etag) == etag:
+            start = int(match.group(1))
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(size - start))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        block = attachment_block(name)
+        position = start
+        while position < size:
+            offset = position % len(block)
+            chunk = block[offset:offset + min(size - position, len(block) - offset)]
+            self.wfile.write(chunk)
+            position += len(chunk)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        parts = parsed.path.strip("/").split("/")
+        if parsed.path == "/chat":
+            self.send_page(CHAT_PAGE, query_config(parsed.query, DEFAULT_CHAT))
+        elif parsed.path == "/creators":
+            self.send_page(CREATORS_PAGE, query_config(parsed.query, DEFAULT_CREATORS))
+        elif parts[0] == "attachments":
+            self.send_attachment(parts[1:])
+        else:
+            self.send_error(404)
+
+def serve_fixtures(port_queue, host="127.0.0.1", port=0):
+    # Process entry point: reports the bound port, then serves until killed
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Serve synthetic Poe pages for benchmarking.")
+    parser.add_argument("-p", "--port", type=int, default=8800)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FixtureHandler)
+    logging.info(f"Fixture chat:     {chat_url(f'http://127.0.0.1:{args.port}')}")
+    logging.info(f"Fixture creators: {creators_url(f'http://127.0.0.1:{args.port}')}")
+    server.serve_forever()
@@ -1,198 +1,180 @@
 import os
-import requests
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
-from urllib.parse import urlparse
 import time
 from dotenv import load_dotenv
 import logging
-import re
-import concurrent.futures
-import hashlib
+from poe_browser import BrowserSession
+from poe_metrics import metrics
+from poe_waits import wait_for_more_messages, count_message_pairs, DEFAULT_SCROLL_TIMEOUT
+from poe_download_engine import download_chat_images, DEFAULT_CONCURRENCY
+from poe_share_export import is_share_url, export_share_images
+from poe_sync_state import SyncState, reached_known_pairs, visible_pair_keys
+from poe_dom_pruning import PAIR_JS_FUNCTIONS, pruning_enabled
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=os.getenv('POE_LOG_LEVEL', 'INFO').upper(), format='%(asctime)s - %(levelname)s - %(message)s')
 load_dotenv()
 
-def setup_driver():
-    options = webdriver.ChromeOptions()
-    options.add_argument("start-maximized")
-    return webdriver.Chrome(options=options)
+# Injected once per page. Buffers media URLs from nodes as they are added, so
+# each scroll iteration only pays for content that appeared since the last one.
+INSTALL_MEDIA_OBSERVER_JS = r"""
+if (window.__poeMediaHarvester) { return false; }
+const imageSelector = "img[src^='http']";
+const markdownSelector = "div[class*='Markdown_markdownContainer']";
+const urlPattern = /(https?:\/\/\S+\.(?:jpg|jpeg|png|gif))/g;
+const seen = new Set();
+const buffer = [];
+function addUrl(url) {
+    if (url && !seen.has(url)) {
+        seen.add(url);
+        buffer.push(url);
+    }
+}
+function scanMarkdown(container) {
+    for (const match of container.innerText.matchAll(urlPattern)) {
+        addUrl(match[1]);
+    }
+}
+function scan(node) {
+    if (node.nodeType === Node.TEXT_NODE) {
+        node = node.parentElement;
+    }
+    if (!node || node.nodeType !== Node.ELEMENT_NODE) { return; }
+    if (node.matches(imageSelector)) { addUrl(node.src); }
+    node.querySelectorAll(imageSelector).forEach((img) => addUrl(img.src));
+    const enclosing = node.closest(markdownSelector);
+    if (enclosing) {
+        scanMarkdown(enclosing);
+    } else {
+        node.querySelectorAll(markdownSelector).forEach(scanMarkdown);
+    }
+}
+const observer = new MutationObserver((mutations) => {
+    for (const mutation of mutations) {
+        if (mutation.type === "attributes") {
+            scan(mutation.target);
+        } else {
+            mutation.addedNodes.forEach(scan);
+        }
+    }
+});
+scan(document.body);
+observer.observe(document.body, {childList: true, subtree: true, attributes: true, attributeFilter: ["src"]});
+window.__poeMediaHarvester = {buffer, observer};
+return true;
+"""
 
-def login_to_poe(driver, email):
-    try:
-        # Navigate to the login page
-        logging.info("Navigating to login page...")
-        driver.get("https://poe.com/login")
-        
-        # Wait for the email input field to be present
-        logging.info("Waiting for email input field...")
-        email_input = WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='email']"))
-        )
-        
-        # Enter email
-        logging.info("Entering email...")
-        email_input.send_keys(email)
-        
-        # Find and click the "Go" button
-        logging.info("Clicking Go button...")
-        go_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[text()='Go']"))
-        )
-        go_button.click()
-        
-        # Wait for the verification code input field
-        logging.info("Waiting for verification code input...")
-        verification_input = WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input.VerificationCodeInput_verificationCodeInput__RgX85"))
-        )
-        
-        # Prompt user for verification code
-        verification_code = input("Enter the verification code sent to your email: ")
-        verification_input.send_keys(verification_code)
-        
-        # Find and click the "Log In" button
-        logging.info("Clicking Log In button...")
-        login_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[contains(@class, 'Button_buttonBase__Bv9Vx') and contains(@class, 'Button_primary__6UIn0') and text()='Log In']"))
-        )
-        login_button.click()
-        
-        # Wait for a short time to allow login process to complete
-        logging.info("Waiting for login to complete...")
-        time.sleep(5)  # Wait for 5 seconds
-        
-        logging.info("Login process completed.")
-    except TimeoutException as e:
-        logging.error(f"Timeout occurred: {str(e)}")
-        logging.info("Current page source:")
-        logging.info(driver.page_source)
-        raise
-    except NoSuchElementException as e:
-        logging.error(f"Element not found: {str(e)}")
-        logging.info("Current page source:")
-        logging.info(driver.page_source)
-        raise
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {str(e)}")
-        raise
+# With arguments[0] set, pairs already present at the previous drain are
+# pruned: the observer scanned them when they were added, and a full
+# iteration has passed for late src changes to arrive. With arguments[1]
+# also set, only pairs the text extractor has marked data-poe-captured are
+# pruned, so a pair still rendering when first seen keeps its text.
+DRAIN_MEDIA_BUFFER_JS = PAIR_JS_FUNCTIONS + """
+const harvester = window.__poeMediaHarvester;
+if (!harvester) { return null; }
+if (arguments[0]) {
+    const pairSelector = "div[class*='ChatMessagesView_messagePair']";
+    const prunable = pairSelector + "[data-poe-seen]" + (arguments[1] ? "[data-poe-captured]" : "");
+    prunePairs(Array.from(document.querySelectorAll(prunable + ":not([data-poe-pruned])")));
+    document.querySelectorAll(pairSelector + ":not([data-poe-seen])").forEach(
+        (pair) => pair.setAttribute("data-poe-seen", ""));
+}
+return {
+    urls: harvester.buffer.splice(0),
+    pairs: document.querySelectorAll("div[class*='ChatMessagesView_messagePair']").length,
+};
+"""
 
-def scroll_and_collect_images(driver, max_scroll_time=600):
+def drain_media_buffer(driver, prune=False):
+    drained = driver.execute_script(DRAIN_MEDIA_BUFFER_JS, prune)
+    if drained is None:
+        # The page was replaced since the observer was installed
+        driver.execute_script(INSTALL_MEDIA_OBSERVER_JS)
+        drained = driver.execute_script(DRAIN_MEDIA_BUFFER_JS, prune)
+    return drained['urls'], drained['pairs']
+
+def scroll_and_collect_images(driver, max_scroll_time=600, scroll_timeout=DEFAULT_SCROLL_TIMEOUT, known_keys=None,
+                              prune=None):
     logging.info("Scrolling and collecting image URLs...")
     start_time = time.time()
-    image_urls = set()
-    last_image_count = 0
-    scroll_pause_time = 2
+    # Pruning keeps the page small on long chats: scanned pairs are emptied
+    prune = pruning_enabled() if prune is None else prune
+    image_urls = {}
+    # Seeded with what is on the page, so the first wait really waits
+    last_pair_count = count_message_pairs(driver)
     no_new_content_count = 0
     max_no_new_content = 5
     
     scroll_container_js_path = """document.querySelector("div[class*='ChatMessagesScrollWrapper']")"""
+
+    driver.execute_script(INSTALL_MEDIA_OBSERVER_JS)
+    # With a high-water mark from an earlier export, the newest messages may
+    # already reach it; then there is nothing to scroll for
+    reached_known = bool(known_keys) and reached_known_pairs(driver, known_keys)
     
-    while time.time() - start_time < max_scroll_time:
-        # Scroll to top of the conversation container
-        driver.execute_script(f"arguments[0].scrollTop = 0;", driver.execute_script(f"return {scroll_container_js_path}"))
-        time.sleep(scroll_pause_time)
-        
-        # Try to find and interact with the infinite scroll trigger
-        try:
-            trigger = driver.find_element(By.CSS_SELECTOR, "div[class*='InfiniteScroll_pagingTrigger']")
-            driver.execute_script("arguments[0].scrollIntoView(true);", trigger)
-            time.sleep(scroll_pause_time)  # Wait for content to load
-        except NoSuchElementException:
-            logging.info("Infinite scroll trigger not found. Might have reached the top.")
-        
-        # Collect image URLs from all possible sources
-        new_images_found = False
-        
-        # Look for images in message pairs
-        message_pairs = driver.find_elements(By.CSS_SELECTOR, "div[class*='ChatMessagesView_messagePair']")
-        logging.info(f"Found {len(message_pairs)} message pairs")
-        
-        # Look for images in any container within the chat
-        img_elements = driver.find_elements(By.CSS_SELECTOR, "img[src^='http']")
-        
-        for img in img_elements:
-            try:
-                src = img.get_attribute('src')
-                if src and src not in image_urls:
-                    image_urls.add(src)
-                    new_images_found = True
-                    logging.info(f"Added new image URL: {src}")
-            except StaleElementReferenceException:
-                continue
-        
-        # Look for image URLs in text content (e.g., markdown links)
-        text_elements = driver.find_elements(By.CSS_SELECTOR, "div[class*='Markdown_markdownContainer']")
-        for elem in text_elements:
+    while not reached_known and time.time() - start_time < max_scroll_time:
+        with metrics.phase("scroll"):
+            # Scroll to top of the conversation container
+            driver.execute_script(f"arguments[0].scrollTop = 0;", driver.execute_script(f"return {scroll_container_js_path}"))
+            
+            # Try to find and interact with the infinite scroll trigger
+            reached_top = False
             try:
-                text = elem.text
-                urls = re.findall(r'(https?://\S+\.(?:jpg|jpeg|png|gif))', text)
-                for url in urls:
-                    if url not in image_urls:
-                        image_urls.add(url)
-                        new_images_found = True
-                        logging.info(f"Added new image URL from text: {url}")
-            except StaleElementReferenceException:
-                continue
+                trigger = driver.find_element(By.CSS_SELECTOR, "div[class*='InfiniteScroll_pagingTrigger']")
+                driver.execute_script("arguments[0].scrollIntoView(true);", trigger)
+                # Wait for content to load, or for the trigger to disappear
+                state = wait_for_more_messages(driver, last_pair_count, scroll_timeout)
+                reached_top = bool(state) and not state['trigger']
+            except NoSuchElementException:
+                reached_top = True
+        if reached_top:
+            logging.info("Infinite scroll trigger not found. Might have reached the top.")
         
-        if new_images_found:
-            logging.info(f"Found {len(image_urls)} unique images so far...")
+        # Collect the image URLs the observer saw since the last iteration,
+        # from both image sources and markdown links, in one round trip
+        with metrics.phase("extraction"):
+            new_urls, pair_count = drain_media_buffer(driver, prune)
+        logging.debug(f"Found {pair_count} message pairs")
+        for url in new_urls:
+            if url not in image_urls:
+                image_urls[url] = None
+                logging.debug(f"Added new image URL: {url}")
+        
+        if new_urls or pair_count != last_pair_count:
+            logging.debug(f"Found {len(image_urls)} unique images so far...")
             no_new_content_count = 0
         else:
             no_new_content_count += 1
-            logging.info(f"No new images found. Count: {no_new_content_count}")
+            logging.debug(f"No new content found. Count: {no_new_content_count}")
+        last_pair_count = pair_count
+        
+        if known_keys and reached_known_pairs(driver, known_keys):
+            reached_known = True
+            break
+        
+        if reached_top:
+            break
         
         if no_new_content_count >= max_no_new_content:
             logging.info(f"No new content found for {max_no_new_content} consecutive scrolls. Assuming we've reached the top.")
             break
     
+    if reached_known:
+        logging.info("Reached messages saved by the last export. Stopping scroll.")
+        # Pick up whatever the observer saw since the last drain
+        new_urls, _ = drain_media_buffer(driver)
+        image_urls.update(dict.fromkeys(new_urls))
     logging.info(f"Scrolling completed in {time.time() - start_time:.2f} seconds")
+    metrics.count('image_urls', len(image_urls))
     return list(image_urls)
 
-def download_image(img_url, save_dir, index, existing_hashes):
-    try:
-        response = requests.get(img_url, timeout=10)
-        if response.status_code == 200:
-            # Hash the image content
-            img_content = response.content
-            img_hash = hashlib.md5(img_content).hexdigest()
-            
-            # Check if this image hash already exists
-            if img_hash in existing_hashes:
-                logging.info(f"Duplicate image found for URL: {img_url}")
-                return False, img_hash
-            
-            file_extension = os.path.splitext(urlparse(img_url).path)[1] or '.jpg'
-            safe_filename = f"image_{index}_{img_hash}{file_extension}"
-            file_path = os.path.join(save_dir, safe_filename)
-            
-            with open(file_path, 'wb') as f:
-                f.write(img_content)
-            logging.info(f"Saved {safe_filename}")
-            return True, img_hash
-        else:
-            logging.warning(f"Failed to download image from {img_url}")
-            return False, None
-    except Exception as e:
-        logging.error(f"Error downloading image from {img_url}: {str(e)}")
-        return False, None
-
-def save_poe_chat_images(url, save_dir):
-    email = os.getenv('POE_EMAIL')
-    if not email:
-        raise ValueError("POE_EMAIL environment variable is not set")
-
-    driver = setup_driver()
-    
-    try:
-        login_to_poe(driver, email)
-        
-        logging.info(f"Navigating to chat URL: {url}")
+def collect_chat_image_urls(driver, url, known_keys=None, prune=None):
+    logging.info(f"Navigating to chat URL: {url}")
+    with metrics.phase("initial_load"):
         driver.get(url)
         
         try:
@@ -201,27 +183,53 @@ def save_poe_chat_images(url, save_dir):
             )
         except TimeoutException:
             logging.warning("Timeout waiting for chat messages to load. Proceeding anyway...")
-        
-        img_urls = scroll_and_collect_images(driver)
-        logging.info(f"Found {len(img_urls)} unique image URLs")
-        
-        os.makedirs(save_dir, exist_ok=True)
-        
-        existing_hashes = set()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            futures = [executor.submit(download_image, img_url, save_dir, i, existing_hashes) for i, img_url in enumerate(img_urls)]
-            for future in concurrent.futures.as_completed(futures):
-                success, img_hash = future.result()
-                if success and img_hash:
-                    existing_hashes.add(img_hash)
-        
-        successful_downloads = len(existing_hashes)
-        logging.info(f"Successfully downloaded {successful_downloads} unique images out of {len(img_urls)} URLs")
+    
+    img_urls = scroll_and_collect_images(driver, known_keys=known_keys, prune=prune)
+    logging.info(f"Found {len(img_urls)} unique image URLs")
+    return img_urls
+
+def failed_downloads(results):
+    return sum(1 for success, img_hash in results if not success and img_hash is None)
+
+def save_poe_chat_images(url, save_dir, concurrency=DEFAULT_CONCURRENCY, index_path=None, revalidate=False,
+                         archive_format=None, previews=False, incremental=False, browser=None):
+    metrics.reset("images")
+    if is_share_url(url):
+        # Share pages embed every attachment URL; no browser or login needed
+        try:
+            export_share_images(url, save_dir, concurrency, index_path, revalidate, archive_format, previews)
+        finally:
+            metrics.finish(save_dir)
+        return
+
+    session = browser or BrowserSession()
+    try:
+        driver = session.driver
+        
+        # Media already downloaded is skipped by the URL index, so an
+        # incremental run only has to stop scrolling at the last export
+        sync = SyncState(save_dir, url, "images") if incremental else None
+        img_urls = collect_chat_image_urls(driver, url, sync.known_keys if sync else None)
+        newest_keys = visible_pair_keys(driver) if sync else None
+        
+        results = download_chat_images(img_urls, url, save_dir, concurrency, index_path, revalidate, archive_format,
+                                       previews)
+        if sync is not None:
+            if failed_downloads(results):
+                logging.warning("Some downloads failed; the next incremental run will scan this chat again")
+            else:
+                sync.save(newest_keys)
         
     finally:
-        driver.quit()
+        if browser is None:
+            session.close()
+        metrics.finish(save_dir)
 
 if __name__ == "__main__":
     poe_chat_url = input("Enter the Poe chat URL: ")
     save_directory = input("Enter the directory to save images (default: PoeChatImages): ") or "PoeChatImages"
-    save_poe_chat_images(poe_chat_url, save_directory)
+    archive_format = input("Enter an archive format to write instead of loose files, zip, zip-stored or tar (leave empty for loose files): ") or None
+    previews = input("Make thumbnails and a contact sheet after downloading? (y/N): ").strip().lower() == 'y'
+    incremental = input("Only scroll back to the last export of this chat? (y/N): ").strip().lower() == 'y'
+    save_poe_chat_images(poe_chat_url, save_directory, archive_format=archive_format, previews=previews,
+                         incremental=incremental)
@@ -0,0 +1,217 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from poe_blob_store import BlobStore, INDEX_FILENAME
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+DEFAULT_THRESHOLD = 6
+REPORT_FILENAME = "near_duplicates.json"
+HASH_SIZE = 8
+STORED_NAME_PATTERN = re.compile(r"^image_(\d+)_([0-9a-f]{32})\.\w+$")
+
+def require_pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("Near-duplicate detection needs Pillow: pip install Pillow")
+    return Image
+
+def dhash(path, hash_size=HASH_SIZE):
+    # Difference hash: compares neighbouring pixels of a tiny grayscale copy,
+    # so re-encoded or resized copies of an image land within a few bits
+    Image = require_pillow()
+    with Image.open(path) as img:
+        size = img.size
+        # Let JPEG decode at reduced scale; the hash only needs a few pixels
+        img.draft('L', (hash_size * 8, hash_size * 8))
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value, size
+
+def hash_file(path):
+    try:
+        value, size = dhash(path)
+        return path, value, size[0] * size[1], os.path.getsize(path)
+    except Exception as e:
+        logging.warning(f"Could not hash {path}: {str(e)}")
+        return path, None, 0, 0
+
+def list_images(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith('.')
+    )
+
+def popcount(value):
+    return bin(value).count('1')
+
+class MultiIndex:
+    # Multi-index hashing over Hamming distance: the hash is cut into
+    # threshold + 1 bands, and two hashes within `threshold` bits must agree
+    # exactly on at least one band. Each band is bucketed by its value, so a
+    # query only popcounts hashes sharing a band with it. Removed items drop
+    # out of their buckets, which keeps later queries small.
+    def __init__(self, threshold, bits=HASH_SIZE * HASH_SIZE):
+        self.threshold = threshold
+        band_count = threshold + 1
+        if band_count > bits:
+            # Every pair is within the threshold; one catch-all bucket
+            self.bands = [(0, 0)]
+        else:
+            self.bands = []
+            low = 0
+            for band in range(band_count):
+                width = bits // band_count + (band < bits % band_count)
+                self.bands.append((low, (1 << width) - 1))
+                low += width
+        self.buckets = [{} for _ in self.bands]
+        self.values = {}
+
+    def keys(self, value):
+        return [(value >> low) & mask for low, mask in self.bands]
+
+    def add(self, value, item):
+        self.values[item] = value
+        for buckets, key in zip(self.buckets, self.keys(value)):
+            buckets.setdefault(key, set()).add(item)
+
+    def remove(self, item):
+        value = self.values.pop(item)
+        for buckets, key in zip(self.buckets, self.keys(value)):
+            buckets[key].discard(item)
+
+    def search(self, value):
+        candidates = set()
+        for buckets, key in zip(self.buckets, self.keys(value)):
+            candidates.update(buckets.get(key, ()))
+        matches = []
+        for item in candidates:
+            distance = popcount(value ^ self.values[item])
+            if distance <= self.threshold:
+                matches.append((item, distance))
+        return matches
+
+def compute_hashes(paths, workers=None):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [result for result in executor.map(hash_file, paths, chunksize=64) if result[1] is not None]
+
+def group_near_duplicates(hashed, threshold=DEFAULT_THRESHOLD):
+    # Images are taken largest first (ties go to the bigger file, then the
+    # path). Each image not yet grouped is kept and collects every ungrouped
+    # image within `threshold` bits of it, so a group never chains through
+    # intermediate images to members far from the kept one.
+    order = sorted(range(len(hashed)), key=lambda i: (-hashed[i][2], -hashed[i][3], hashed[i][0]))
+    index = MultiIndex(threshold)
+    for i, (_, value, _, _) in enumerate(hashed):
+        index.add(value, i)
+
+    groups = []
+    for i in order:
+        if i not in index.values:
+            continue
+        index.remove(i)
+        matches = index.search(hashed[i][1])
+        if not matches:
+            continue
+        for j, _ in matches:
+            index.remove(j)
+        matches.sort(key=lambda match: (match[1], hashed[match[0]][0]))
+        groups.append({
+            'keep': hashed[i][0],
+            'duplicates': [{'path': hashed[j][0], 'distance': distance} for j, distance in matches],
+        })
+    return groups
+
+def file_md5(path, chunk_size=1 << 20):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def linked_name(path, old_hash, new_hash, keep_path):
+    # Downloaded files are named image_<index>_<md5><ext>; once linked, the
+    # name carries the kept image's hash and extension. Other names stay.
+    directory, name = os.path.split(path)
+    match = STORED_NAME_PATTERN.match(name)
+    if not match or match.group(2) != old_hash:
+        return path
+    return os.path.join(directory, f"image_{match.group(1)}_{new_hash}{os.path.splitext(keep_path)[1]}")
+
+def hardlink_duplicates(groups, store=None):
+    # Replaces each duplicate with a hard link to the kept image. Renamed
+    # files and, with a BlobStore, the index follow the new contents: the
+    # duplicate's URLs point at the kept hash and its blob row is dropped.
+    linked = 0
+    for group in groups:
+        keep_hash = file_md5(group['keep'])
+        if store is not None and store.path_for_hash(keep_hash) is None:
+            store.add_blob(keep_hash, group['keep'])
+        for duplicate in group['duplicates']:
+            old_path = duplicate['path']
+            old_hash = file_md5(old_path)
+            new_path = linked_name(old_path, old_hash, keep_hash, group['keep'])
+            if new_path != old_path and os.path.exists(new_path):
+                new_path = old_path
+            tmp_path = old_path + ".link"
+            os.link(group['keep'], tmp_path)
+            os.replace(tmp_path, new_path)
+            if new_path != old_path:
+                os.remove(old_path)
+                duplicate['path'] = new_path
+            if store is not None and old_hash != keep_hash:
+                store.merge_blob(old_hash, keep_hash)
+            linked += 1
+    return linked
+
+def find_near_duplicates(directory, threshold=DEFAULT_THRESHOLD, workers=None, report_path=None, hardlink=False,
+                         index_path=None):
+    paths = list_images(directory)
+    logging.info(f"Hashing {len(paths)} images in {directory}")
+    hashed = compute_hashes(paths, workers)
+    groups = group_near_duplicates(hashed, threshold)
+    duplicate_count = sum(len(group['duplicates']) for group in groups)
+    logging.info(f"Found {duplicate_count} near-duplicates in {len(groups)} groups")
+
+    if hardlink:
+        # Only an existing download index is updated; none is created
+        index_path = index_path or os.path.join(directory, INDEX_FILENAME)
+        store = BlobStore(directory, index_path) if os.path.exists(index_path) else None
+        try:
+            linked = hardlink_duplicates(groups, store)
+        finally:
+            if store is not None:
+                store.close()
+        logging.info(f"Replaced {linked} near-duplicates with hard links to the kept image")
+
+    report_path = report_path or os.path.join(directory, REPORT_FILENAME)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({'directory': directory, 'threshold': threshold, 'images': len(hashed), 'groups': groups}, f, indent=2)
+    logging.info(f"Near-duplicate report saved to {report_path}")
+    return groups
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Find re-encoded or resized copies of the same image.")
+    parser.add_argument("directory", help="directory of downloaded images")
+    parser.add_argument("-t", "--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help="maximum differing hash bits out of 64 (default: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="hashing processes (default: CPU count)")
+    parser.add_argument("-r", "--report", default=None, help=f"report path (default: <directory>/{REPORT_FILENAME})")
+    parser.add_argument("--hardlink", action="store_true", help="replace each near-duplicate with a hard link to the kept image")
+    parser.add_argument("--index", default=None,
+                        help=f"download index to update when linking (default: <directory>/{INDEX_FILENAME})")
+    args = parser.parse_args()
+
+    find_near_duplicates(args.directory, args.threshold, args.workers, args.report, args.hardlink, args.index)
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+METRICS_FILENAME = "poe_metrics.json"
+COUNTERS = ('webdriver_calls', 'message_pairs', 'image_urls', 'bytes_downloaded', 'images_saved',
+            'dedup_hits', 'url_cache_hits', 'download_retries', 'downloads_failed', 'earnings_rows')
+
+class RunMetrics:
+    # Phase timings and counters for one export run. Phases record how often
+    # they ran, their total and their longest duration; nested phases are
+    # timed independently, so totals are not additive across nesting levels.
+    # Downloads update counters from their own thread, so every update and
+    # read of phases and counters holds the lock.
+    def __init__(self, script=None):
+        self.lock = threading.Lock()
+        self.held = False
+        self.reset(script)
+
+    def reset(self, script=None):
+        if self.held:
+            return
+        with self.lock:
+            self.script = script
+            self.started = time.time()
+            self.phases = {}
+            self.counters = dict.fromkeys(COUNTERS, 0)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                stats = self.phases.setdefault(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+                stats['count'] += 1
+                stats['seconds'] += elapsed
+                stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def instrument_driver(self, driver):
+        # Every command, including those sent by WebElements, goes through
+        # driver.execute, so an instance-level wrapper sees all round trips
+        original = driver.execute
+
+        def execute(command, params=None):
+            self.count('webdriver_calls')
+            return original(command, params)
+        driver.execute = execute
+        return driver
+
+    def summary(self):
+        with self.lock:
+            return {
+                'script': self.script,
+                'started': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                'seconds': round(time.time() - self.started, 3),
+                'phases': {name: {'count': stats['count'], 'seconds': round(stats['seconds'], 3),
+                                  'max_seconds': round(stats['max_seconds'], 3)}
+                           for name, stats in self.phases.items()},
+                'counters': dict(self.counters),
+            }
+
+    def prometheus_text(self):
+        summary = self.summary()
+        labels = f'script="{self.script}"'
+        lines = [
+            "# HELP poe_export_run_seconds Wall time of the last export run.",
+            "# TYPE poe_export_run_seconds gauge",
+            f"poe_export_run_seconds{{{labels}}} {summary['seconds']}",
+            "# HELP poe_export_last_run_timestamp_seconds Unix time the last export run started.",
+            "# TYPE poe_export_last_run_timestamp_seconds gauge",
+            f"poe_export_last_run_timestamp_seconds{{{labels}}} {round(self.started, 3)}",
+            "# HELP poe_export_phase_seconds Time spent in each phase of the last export run.",
+            "# TYPE poe_export_phase_seconds gauge",
+        ]
+        lines += [f'poe_export_phase_seconds{{{labels},phase="{name}"}} {stats["seconds"]}'
+                  for name, stats in summary['phases'].items()]
+        lines += ["# HELP poe_export_phase_runs Number of times each phase ran in the last export run.",
+                  "# TYPE poe_export_phase_runs gauge"]
+        lines += [f'poe_export_phase_runs{{{labels},phase="{name}"}} {stats["count"]}'
+                  for name, stats in summary['phases'].items()]
+        for name, value in summary['counters'].items():
+            lines += [f"# TYPE poe_export_{name} gauge", f"poe_export_{name}{{{labels}}} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path, textfile_dir=None):
+        # Read at write time so values loaded from .env are seen
+        textfile_dir = textfile_dir or os.getenv('POE_PROMETHEUS_DIR')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        logging.info(f"Run metrics saved to {json_path}")
+        if textfile_dir:
+            # One file per script, so runs of different scripts do not
+            # overwrite each other; the textfile collector may read at any
+            # time, so replace atomically
+            textfile_path = os.path.join(textfile_dir, f"poe_export_{self.script}.prom")
+            tmp_path = textfile_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, textfile_path)
+
+    def log_summary(self):
+        summary = self.summary()
+        for name, stats in sorted(summary['phases'].items(), key=lambda item: -item[1]['seconds']):
+            logging.info(f"Phase {name}: {stats['seconds']:.2f}s over {stats['count']} runs "
+                         f"(longest {stats['max_seconds']:.2f}s)")
+        logging.info("Counters: " + ", ".join(f"{name}={value}" for name, value in summary['counters'].items()
+                                              if value))
+
+    def finish(self, directory):
+        if self.held:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.log_summary()
+        self.write(os.path.join(directory, METRICS_FILENAME))
+
+    @contextmanager
+    def run(self, script, directory):
+        # One run made of several exports, such as a poe_export.py command;
+        # the exports' own reset and finish calls are ignored until it ends,
+        # so their counts add up and one file is written at the end
+        self.reset(script)
+        self.held = True
+        try:
+            yield
+        finally:
+            self.held = False
+            self.finish(directory)
+
+# One run per process; scripts reset it at the start of an export
+metrics = RunMetrics()
@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import logging
+
+DEFAULT_INDEX_PATH = "poe_search.db"
+DEFAULT_LIMIT = 20
+SNIPPET_TOKENS = 16
+ROLES = ("human", "bot")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    chat_url TEXT NOT NULL,
+    pair_key TEXT NOT NULL,
+    role TEXT NOT NULL,
+    pair_index INTEGER,
+    bot_name TEXT,
+    transcript TEXT,
+    body TEXT NOT NULL,
+    UNIQUE (chat_url, pair_key, role)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    body, content='entries', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, body) VALUES (new.id, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, body) VALUES ('delete', old.id, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE OF body ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    INSERT INTO entries_fts(rowid, body) VALUES (new.id, new.body);
+END;
+"""
+
+class SearchIndex:
+    # SQLite FTS5 index over every exported message. Rows are keyed by chat
+    # URL, pair key and role, so re-exporting a chat updates its rows in place
+    # and triggers keep the full-text table in step; nothing is ever rebuilt.
+    # Pairs are indexed as the transcript writer receives them, newest batch
+    # first, so their position and the bot name are filled in by finish_chat.
+    # Positional keys ("tail:N", "share:N") shift as a chat grows, so once
+    # numbered they are stored as "pair:<index>", and a full export drops
+    # every row of the chat it did not see.
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # WAL lets batch export workers write while queries run
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_pairs(self, chat_url, pairs, bot_name=None):
+        # pairs are (key, human, bot); unchanged messages are left untouched
+        rows = [(chat_url, key, role, bot_name, body)
+                for key, human, bot in pairs
+                for role, body in zip(ROLES, (human, bot)) if body]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO entries (chat_url, pair_key, role, bot_name, body) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (chat_url, pair_key, role) DO UPDATE SET body = excluded.body "
+                "WHERE body != excluded.body", rows)
+        return len(rows)
+
+    def finish_chat(self, chat_url, keys, bot_name=None, transcript=None, first_index=1, replace=False):
+        # keys are the chat's pair keys oldest first, numbered from first_index.
+        # replace means keys are the whole chat rather than an appended tail.
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE entries SET pair_index = ?, bot_name = ?, transcript = ? WHERE chat_url = ? AND pair_key = ?",
+                ((index, bot_name, transcript, chat_url, key) for index, key in enumerate(keys, first_index)))
+            if replace:
+                current = set(keys)
+                stale = [(chat_url, key) for (key,) in self.connection.execute(
+                    "SELECT DISTINCT pair_key FROM entries WHERE chat_url = ?", (chat_url,)) if key not in current]
+                self.connection.executemany("DELETE FROM entries WHERE chat_url = ? AND pair_key = ?", stale)
+            # A numbered pair replaces any earlier row at its position. The
+            # delete is explicit so entries_ad keeps the full-text table in step;
+            # REPLACE conflict resolution would drop rows without the trigger.
+            positional = ("chat_url = ? AND pair_index IS NOT NULL "
+                          "AND (pair_key LIKE 'tail:%' OR pair_key LIKE 'share:%')")
+            self.connection.execute(
+                "DELETE FROM entries WHERE chat_url = ? AND pair_key IN "
+                f"(SELECT 'pair:' || pair_index FROM entries WHERE {positional})", (chat_url, chat_url))
+            self.connection.execute(
+                f"UPDATE entries SET pair_key = 'pair:' || pair_index WHERE {positional}", (chat_url,))
+
+    def index_transcript(self, chat_url, pairs, bot_name=None, transcript=None):
+        # For transcripts that arrive whole and in order, such as share pages
+        keyed = [(f"share:{index}", human, bot) for index, (human, bot) in enumerate(pairs, 1)]
+        self.add_pairs(chat_url, keyed, bot_name)
+        self.finish_chat(chat_url, [key for key, _, _ in keyed], bot_name, transcript, replace=True)
+
+    def search(self, query, limit=DEFAULT_LIMIT, chat_url=None, role=None):
+        sql = ("SELECT e.chat_url, e.bot_name, e.pair_index, e.role, e.transcript, "
+               f"snippet(entries_fts, 0, '[', ']', '...', {SNIPPET_TOKENS}), bm25(entries_fts) "
+               "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid WHERE entries_fts MATCH ?")
+        params = [query]
+        if chat_url:
+            sql += " AND e.chat_url = ?"
+            params.append(chat_url)
+        if role:
+            sql += " AND e.role = ?"
+            params.append(role)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return [{'chat_url': row[0], 'bot_name': row[1], 'pair_index': row[2], 'role': row[3],
+                 'transcript': row[4], 'snippet': row[5], 'score': round(row[6], 3)}
+                for row in self.connection.execute(sql, params)]
+
+    def close(self):
+        self.connection.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Search exported Poe transcripts.")
+    parser.add_argument("query", help="FTS5 query, e.g. 'rust AND lifetimes' or '\"exact phrase\"'")
+    parser.add_argument("-i", "--index", default=DEFAULT_INDEX_PATH, help="search index file")
+    parser.add_argument("-n", "--limit", type=int, default=DEFAULT_LIMIT, help="maximum number of hits")
+    parser.add_argument("-c", "--chat", default=None, help="only search this chat URL")
+    parser.add_argument("-r", "--role", choices=ROLES, default=None, help="only search human or bot messages")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.index):
+        parser.error(f"Search index {args.index} does not exist")
+    with SearchIndex(args.index) as index:
+        started = time.perf_counter()
+        try:
+            hits = index.search(args.query, args.limit, args.chat, args.role)
+        except sqlite3.OperationalError as e:
+            print(f"Invalid query: {str(e)}", file=sys.stderr)
+            sys.exit(2)
+        elapsed = (time.perf_counter() - started) * 1000
+
+    for hit in hits:
+        speaker = (hit['bot_name'] or "Bot") if hit['role'] == "bot" else "Human"
+        position = f"pair {hit['pair_index']}" if hit['pair_index'] else "pair ?"
+        print(f"{hit['chat_url']} ({position}, {speaker})")
+        print(f"    {hit['snippet']}")
+        if hit['transcript']:
+            print(f"    {hit['transcript']}")
+    print(f"{len(hits)} hits in {elapsed:.1f} ms", file=sys.stderr)
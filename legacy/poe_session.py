@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import logging
+from http.cookies import SimpleCookie, CookieError
+
+import requests
+
+from poe_share_export import USER_AGENT
+
+POE_HOME_URL = "https://poe.com/"
+SESSION_CHECK_URL = "https://poe.com/settings"
+DEFAULT_SESSION_FILE = ".poe_session.json"
+# Poe's login cookie. The settings page answers 200 without it too, showing
+# the login form, so the status alone does not prove a session is live.
+AUTH_COOKIE = "p-b"
+LOGIN_FORM_MARKER = 'type="email"'
+COOKIE_FIELDS = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'expiry', 'sameSite')
+
+def session_path(path=None):
+    # Read at call time so a POE_SESSION_FILE loaded from .env is seen
+    return path or os.getenv('POE_SESSION_FILE') or DEFAULT_SESSION_FILE
+
+def load_cookies(path=None):
+    path = session_path(path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable session file {path}: {str(e)}")
+        return None
+
+def save_session(driver, path=None):
+    path = session_path(path)
+    cookies = [{k: c[k] for k in COOKIE_FIELDS if k in c} for c in driver.get_cookies()]
+    # The cookies grant full account access, so keep the file private
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(cookies, f)
+    logging.info(f"Saved Poe session to {path}")
+
+def has_auth_cookie(cookies):
+    now = time.time()
+    return any(c['name'] == AUTH_COOKIE and c.get('value') and c.get('expiry', now + 1) > now for c in cookies)
+
+def clears_auth_cookie(response):
+    # Poe blanks or expires the auth cookie when it rejects it
+    for header in response.raw.headers.getlist('Set-Cookie'):
+        cookie = SimpleCookie()
+        try:
+            cookie.load(header)
+        except CookieError:
+            continue
+        if AUTH_COOKIE in cookie and (not cookie[AUTH_COOKIE].value or cookie[AUTH_COOKIE]['max-age'] == "0"):
+            return True
+    return False
+
+def session_is_valid(cookies, timeout=10):
+    # A logged-out request is redirected to the login page or shown the
+    # login form; a live session keeps its auth cookie
+    if not has_auth_cookie(cookies):
+        return False
+    jar = requests.cookies.RequestsCookieJar()
+    for c in cookies:
+        jar.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path', '/'))
+    try:
+        response = requests.get(SESSION_CHECK_URL, cookies=jar, headers={'User-Agent': USER_AGENT},
+                                allow_redirects=False, timeout=timeout)
+    except requests.RequestException as e:
+        logging.warning(f"Could not check saved session: {str(e)}")
+        return False
+    if response.status_code != 200 or LOGIN_FORM_MARKER in response.text:
+        return False
+    return not clears_auth_cookie(response)
+
+def restore_session(driver, path=None):
+    cookies = load_cookies(path)
+    if not cookies or not session_is_valid(cookies):
+        return False
+
+    # Cookies can only be added for the domain currently loaded
+    driver.get(POE_HOME_URL)
+    for cookie in cookies:
+        driver.add_cookie(cookie)
+    return True
+
+def ensure_logged_in(driver, email, login, path=None):
+    if restore_session(driver, path):
+        logging.info("Reusing saved Poe session")
+        return
+    logging.info("No valid saved session; logging in")
+    login(driver, email)
+    save_session(driver, path)
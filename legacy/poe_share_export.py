@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import codecs
+import logging
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from poe_metrics import metrics
+from poe_transcript_writer import save_transcript
+
+ALLOWED_HOST = "poe.com"
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36"
+SHARE_PATH_PATTERN = re.compile(r"^/s/[^/]+$")
+READ_CHUNK_SIZE = 64 * 1024
+
+_session = None
+
+def get_session():
+    # Shared across calls so repeated exports reuse pooled keep-alive connections
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers['User-Agent'] = USER_AGENT
+        _session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return _session
+
+def normalize_share_url(raw_url):
+    try:
+        url = urlparse(raw_url.strip())
+    except ValueError:
+        return None
+    if url.scheme != "https" or url.username or url.password:
+        return None
+    if url.hostname != ALLOWED_HOST or url.query or url.fragment:
+        return None
+    if not SHARE_PATH_PATTERN.match(url.path):
+        return None
+    return f"https://{ALLOWED_HOST}{url.path}"
+
+def is_share_url(raw_url):
+    return normalize_share_url(raw_url) is not None
+
+class NextDataParser(HTMLParser):
+    # Collects the text of <script id="__NEXT_DATA__"> as the page streams in
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.in_next_data = False
+        self.saw_next_data = False
+        self.done = False
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "script" and dict(attrs).get("id") == "__NEXT_DATA__":
+            self.in_next_data = True
+            self.saw_next_data = True
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self.in_next_data:
+            self.in_next_data = False
+            self.done = True
+
+    def handle_data(self, data):
+        if self.in_next_data:
+            self.parts.append(data)
+
+def fetch_next_data(share_url, session=None):
+    session = session or get_session()
+    parser = NextDataParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    with session.get(share_url, stream=True, timeout=(10, 30)) as response:
+        if response.status_code == 404:
+            raise ValueError(f"Share not found: {share_url}")
+        response.raise_for_status()
+        # Stop reading as soon as the script element closes
+        for chunk in response.iter_content(READ_CHUNK_SIZE):
+            parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+
+    if not parser.saw_next_data:
+        raise ValueError("Missing __NEXT_DATA__ payload")
+    try:
+        return json.loads("".join(parser.parts))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid __NEXT_DATA__ payload: {str(e)}")
+
+def parse_share_messages(next_data):
+    # Mirrors parseJsonChatMessages in fullstack/chat-data.ts
+    chat_share = (((next_data.get('props') or {}).get('pageProps') or {}).get('data') or {})
+    chat_share = ((chat_share.get('mainQuery') or {}).get('chatShare') or {})
+
+    edges = (chat_share.get('messagesConnection') or {}).get('edges')
+    if isinstance(edges, list):
+        raw_messages = [(edge or {}).get('node') for edge in edges]
+    elif isinstance(chat_share.get('messages'), list):
+        raw_messages = chat_share['messages']
+    else:
+        raise ValueError("Chat data missing from __NEXT_DATA__ payload")
+
+    messages = []
+    for message in raw_messages:
+        message = message or {}
+        text = message.get('text')
+        messages.append({
+            'role': "human" if message.get('author') == "human" else "bot",
+            'author': message.get('author'),
+            'text': text if isinstance(text, str) else "",
+            'attachments': collect_attachment_urls(message.get('attachments')),
+        })
+    return messages
+
+def collect_attachment_urls(attachments):
+    if not isinstance(attachments, list):
+        return []
+    urls = []
+    for attachment in attachments:
+        attachment = attachment or {}
+        url = (attachment.get('file') or {}).get('url') or attachment.get('url')
+        if isinstance(url, str) and url.strip() and url.strip() not in urls:
+            urls.append(url.strip())
+    return urls
+
+def pair_messages(messages):
+    # Group into the (human, bot) pairs used by the Selenium text exporter; a
+    # bot message with no preceding human message gets an empty human side
+    pairs = []
+    human = None
+    for message in messages:
+        if message['role'] == "human":
+            if human is not None:
+                pairs.append((human, ""))
+            human = message['text']
+        else:
+            pairs.append((human or "", message['text']))
+            human = None
+    if human is not None:
+        pairs.append((human, ""))
+    return pairs
+
+def bot_name_from(messages):
+    for message in messages:
+        if message['role'] == "bot" and message['author']:
+            return message['author']
+    return None
+
+def all_attachment_urls(messages):
+    urls = {}
+    for message in messages:
+        for url in message['attachments']:
+            urls[url] = None
+    return list(urls)
+
+def fetch_share_chat(raw_url, session=None):
+    share_url = normalize_share_url(raw_url)
+    if not share_url:
+        raise ValueError("Invalid share URL. Expected https://poe.com/s/<share-id>.")
+    logging.info(f"Fetching share page without a browser: {share_url}")
+    messages = parse_share_messages(fetch_next_data(share_url, session))
+    logging.info(f"Found {len(messages)} messages in share page")
+    return messages
+
+def export_share_images(url, save_dir, concurrency=None, index_path=None, revalidate=False, archive_format=None,
+                        previews=False):
+    # Imported here so text exports of share pages do not load aiohttp
+    from poe_download_engine import download_chat_images, DEFAULT_CONCURRENCY
+    with metrics.phase("initial_load"):
+        img_urls = all_attachment_urls(fetch_share_chat(url))
+    metrics.count('image_urls', len(img_urls))
+    logging.info(f"Found {len(img_urls)} unique image URLs")
+    return download_chat_images(img_urls, url, save_dir, concurrency or DEFAULT_CONCURRENCY, index_path, revalidate,
+                                archive_format, previews)
+
+def export_share_text(url, save_dir, output_format="text", search_index=None):
+    with metrics.phase("initial_load"):
+        share_messages = fetch_share_chat(url)
+    with metrics.phase("extraction"):
+        messages = pair_messages(share_messages)
+    metrics.count('message_pairs', len(messages))
+    logging.info(f"Collected {len(messages)} message pairs")
+    os.makedirs(save_dir, exist_ok=True)
+    bot_name = bot_name_from(share_messages)
+    with metrics.phase("write"):
+        saved_file = save_transcript(messages, save_dir, url, bot_name, output_format)
+        if search_index is not None:
+            search_index.index_transcript(url, messages, bot_name, saved_file)
+    print(f"Chat transcript saved to: {saved_file}")
+    return saved_file
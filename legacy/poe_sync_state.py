@@ -0,0 +1,84 @@
+import os
+import json
+import logging
+from datetime import datetime
+
+from poe_transcript_writer import chat_state_name
+from poe_dom_pruning import PAIR_JS_FUNCTIONS
+
+# Enough of the newest pairs that deleting or regenerating the last few
+# messages of a chat still leaves a known one to stop at
+KEPT_KEYS = 20
+
+# Keys of every message pair in DOM order (oldest first), built the same way
+# as the text extractor's. Pairs without a DOM message id are left out: their
+# positional keys shift whenever newer messages arrive, so they cannot mark
+# where the last export ended.
+PAIR_KEYS_JS = PAIR_JS_FUNCTIONS + """
+const pairs = document.querySelectorAll("div[class*='ChatMessagesView_messagePair']");
+return Array.from(pairs, pairIds).filter((key) => key);
+"""
+
+def stable_keys(keys):
+    return [key for key in keys if key and not key.startswith("tail:")]
+
+def pairs_after_known(pairs, known_keys):
+    # pairs are in DOM order; everything after the newest known pair is new.
+    # Returns the new pairs and whether a known pair was found at all.
+    for position in range(len(pairs) - 1, -1, -1):
+        if pairs[position]['key'] in known_keys:
+            return pairs[position + 1:], True
+    return pairs, False
+
+class SyncState:
+    # High-water mark of one chat for one kind of export ("text" or "images"):
+    # the DOM ids of its newest message pairs as of the last complete export,
+    # plus whatever the exporter needs to merge the next run into it. Each chat
+    # and kind has its own file, so batch export processes never share one.
+    def __init__(self, save_dir, chat_url, kind):
+        self.chat_url = chat_url
+        self.path = os.path.join(save_dir, f".poe_chat_{chat_state_name(chat_url)}.{kind}.sync.json")
+        self.data = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable sync state {self.path}: {str(e)}")
+            return {}
+        if data.get('chat_url') != self.chat_url:
+            logging.warning(f"Sync state {self.path} belongs to {data.get('chat_url')}; doing a full export")
+            return {}
+        return data
+
+    @property
+    def known_keys(self):
+        return set(self.data.get('keys', ()))
+
+    def get(self, name, default=None):
+        return self.data.get(name, default)
+
+    def save(self, newest_keys, **fields):
+        # newest_keys are oldest first; keys from earlier runs fill in when
+        # this run saw fewer than KEPT_KEYS pairs with DOM ids
+        newest_keys = list(dict.fromkeys(stable_keys(newest_keys)))
+        seen = set(newest_keys)
+        keys = ([key for key in self.data.get('keys', []) if key not in seen] + newest_keys)[-KEPT_KEYS:]
+        if not keys:
+            logging.warning("No message ids found on the page; the next incremental run will do a full export")
+        self.data = {'chat_url': self.chat_url, 'synced': datetime.now().isoformat(timespec='seconds'),
+                     'keys': keys, **fields}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def visible_pair_keys(driver):
+    return driver.execute_script(PAIR_KEYS_JS)
+
+def reached_known_pairs(driver, known_keys):
+    return not known_keys.isdisjoint(visible_pair_keys(driver))
@@ -1,115 +1,134 @@
 import os
 import sys
 import signal
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
-from datetime import datetime
-from urllib.parse import urlparse
 import time
 from dotenv import load_dotenv
 import logging
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from poe_transcript_writer import TranscriptBuffer, TranscriptWriter, save_transcript
+from poe_search_index import SearchIndex
+from poe_sync_state import SyncState, pairs_after_known
+from poe_dom_pruning import PAIR_JS_FUNCTIONS, pruning_enabled
+from poe_browser import BrowserSession
+from poe_metrics import metrics
+from poe_share_export import is_share_url, export_share_text
+from poe_waits import (wait_for_more_messages, wait_for_network_idle, count_message_pairs,
+                       DEFAULT_NETWORK_IDLE_TIMEOUT, DEFAULT_SCROLL_TIMEOUT)
+
+logging.basicConfig(level=os.getenv('POE_LOG_LEVEL', 'INFO').upper(), format='%(asctime)s - %(levelname)s - %(message)s')
 load_dotenv()
 
-def setup_driver():
-    options = webdriver.ChromeOptions()
-    options.add_argument("start-maximized")
-    return webdriver.Chrome(options=options)
-
-def login_to_poe(driver, email):
-    try:
-        logging.info("Navigating to login page...")
-        driver.get("https://poe.com/login")
-
-        logging.info("Waiting for email input field...")
-        email_input = WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='email']"))
-        )
-
-        logging.info("Entering email...")
-        email_input.send_keys(email)
-
-        logging.info("Clicking Go button...")
-        go_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[text()='Go']"))
-        )
-        go_button.click()
-
-        logging.info("Waiting for verification code input...")
-        verification_input = WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input.VerificationCodeInput_verificationCodeInput__RgX85"))
-        )
-
-        verification_code = input("Enter the verification code sent to your email: ")
-        verification_input.send_keys(verification_code)
-
-        logging.info("Clicking Log In button...")
-        login_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[contains(@class, 'Button_buttonBase__Bv9Vx') and contains(@class, 'Button_primary__6UIn0') and text()='Log In']"))
-        )
-        login_button.click()
-
-        logging.info("Waiting for login to complete...")
-        time.sleep(5)
-
-        logging.info("Login process completed.")
-    except Exception as e:
-        logging.error(f"An error occurred during login: {str(e)}")
-        raise
-
-def scroll_and_collect_messages(driver, max_scroll_time=600):
+# Returns every visible message pair in DOM order (oldest first) in a single
+# round trip, with the total number of pair nodes. Pairs are keyed by a DOM
+# message id when one is present, else by their position counted from the
+# newest pair, which stays stable because infinite scroll only ever adds older
+# pairs above the existing ones. With arguments[0] set, pairs with content are
+# pruned once returned; pruned pairs are skipped but still count for
+# positions. Pairs returned with content are marked data-poe-captured, so the
+# media drain knows which it may prune.
+EXTRACT_MESSAGE_PAIRS_JS = PAIR_JS_FUNCTIONS + """
+const prune = arguments[0];
+const humanSelector = "div.ChatMessage_rightSideMessageWrapper__r0roB div.Message_rightSideMessageBubble__ioa_i > div > p";
+const botSelector = "div.Message_leftSideMessageBubble__VPdk6 > div > p";
+const pairs = document.querySelectorAll("div[class*='ChatMessagesView_messagePair']");
+const extracted = [];
+const captured = [];
+pairs.forEach((pair, position) => {
+    if (pair.hasAttribute("data-poe-pruned")) { return; }
+    const human = pair.querySelector(humanSelector);
+    const bot = pair.querySelector(botSelector);
+    const ids = pairIds(pair);
+    const entry = {
+        key: ids || "tail:" + (pairs.length - position),
+        human: human ? human.innerText : "",
+        bot: bot ? bot.innerText : "",
+    };
+    extracted.push(entry);
+    if (entry.human || entry.bot) {
+        if (!pair.hasAttribute("data-poe-captured")) { pair.setAttribute("data-poe-captured", ""); }
+        if (prune) { captured.push(pair); }
+    }
+});
+prunePairs(captured);
+return {pairs: extracted, total: pairs.length};
+"""
+
+def harvest_visible_pairs(driver, transcript, known_keys=None, prune=False):
+    # Extract all visible message pairs in one call
+    with metrics.phase("extraction"):
+        try:
+            extracted = driver.execute_script(EXTRACT_MESSAGE_PAIRS_JS, prune)
+            pairs, pair_count = extracted['pairs'], extracted['total']
+        except Exception as e:
+            logging.error(f"Error extracting message pairs: {str(e)}")
+            pairs, pair_count = [], 0
+    return record_pairs(transcript, pairs, known_keys), pair_count
+
+def record_pairs(transcript, pairs, known_keys=None):
+    if known_keys:
+        # Only pairs newer than the last export are collected
+        pairs, reached_known = pairs_after_known(pairs, known_keys)
+        transcript.reached_known = transcript.reached_known or reached_known
+
+    # Pairs not seen before are older than everything collected so far;
+    # the transcript keeps them in order and drops keys it already has
+    batch = []
+    for pair in pairs:
+        human_message = pair['human']
+        bot_message = pair['bot']
+
+        # If either message is non-empty, add the pair
+        if (human_message or bot_message) and pair['key'] not in transcript.seen:
+            batch.append((pair['key'], human_message, bot_message))
+            logging.debug(f"New message pair found. Human: {human_message[:50]}... Bot: {bot_message[:50]}...")
+
+    with metrics.phase("write"):
+        added = transcript.add_batch(batch)
+    metrics.count('message_pairs', added)
+    return added
+
+def scroll_and_collect_messages(driver, max_scroll_time=600, scroll_timeout=DEFAULT_SCROLL_TIMEOUT, transcript=None,
+                                known_keys=None, prune=None):
     logging.info("Scrolling and collecting messages...")
     start_time = time.time()
-    messages = []
-    last_message_count = 0
-    scroll_pause_time = 2
+    # Pruning keeps the page small on long chats: captured pairs are emptied
+    prune = pruning_enabled() if prune is None else prune
+    transcript = transcript if transcript is not None else TranscriptBuffer()
+    # Seeded with what is on the page, so the first wait really waits
+    last_pair_count = count_message_pairs(driver)
     no_new_messages_count = 0
     max_no_new_messages = 5  # After this many scrolls with no new messages, we'll stop
 
     scroll_container_js_path = """document.querySelector("div[class*='ChatMessagesScrollWrapper']")"""
 
-    while time.time() - start_time < max_scroll_time:
-        # Scroll to top
-        driver.execute_script(f"arguments[0].scrollTop = 0;", driver.execute_script(f"return {scroll_container_js_path}"))
-        time.sleep(scroll_pause_time)
-
-        # Find all message pairs
-        message_pairs = driver.find_elements(By.CSS_SELECTOR, "div[class*='ChatMessagesView_messagePair']")
-
-        new_messages_found = False
-        for pair in message_pairs:
-            try:
-                human_message = ""
-                bot_message = ""
-
-                human_elements = pair.find_elements(By.CSS_SELECTOR, "div.ChatMessage_rightSideMessageWrapper__r0roB div.Message_rightSideMessageBubble__ioa_i > div > p")
-                bot_elements = pair.find_elements(By.CSS_SELECTOR, "div.Message_leftSideMessageBubble__VPdk6 > div > p")
-
-                if human_elements:
-                    human_message = human_elements[0].text
-                if bot_elements:
-                    bot_message = bot_elements[0].text
-
-                # If either message is non-empty, add the pair
-                if human_message or bot_message:
-                    if (human_message, bot_message) not in messages:
-                        messages.append((human_message, bot_message))
-                        new_messages_found = True
-                        logging.info(f"New message pair found. Human: {human_message[:50]}... Bot: {bot_message[:50]}...")
-            except Exception as e:
-                logging.error(f"Error extracting message pair: {str(e)}")
+    if known_keys:
+        # With a high-water mark from an earlier export, the newest messages
+        # may already reach it; check before scrolling at all
+        _, last_pair_count = harvest_visible_pairs(driver, transcript, known_keys, prune)
+
+    while not transcript.reached_known and time.time() - start_time < max_scroll_time:
+        with metrics.phase("scroll"):
+            # Scroll to top
+            driver.execute_script(f"arguments[0].scrollTop = 0;", driver.execute_script(f"return {scroll_container_js_path}"))
+
+            # Wait until older messages arrive or the paging trigger goes away
+            wait_for_more_messages(driver, last_pair_count, scroll_timeout)
+
+        added, last_pair_count = harvest_visible_pairs(driver, transcript, known_keys, prune)
+        if transcript.reached_known:
+            break
+        new_messages_found = added > 0
 
         if new_messages_found:
             no_new_messages_count = 0
         else:
             no_new_messages_count += 1
-            logging.info(f"No new messages found. Count: {no_new_messages_count}")
+            logging.debug(f"No new messages found. Count: {no_new_messages_count}")
 
         if no_new_messages_count >= max_no_new_messages:
             logging.info("Reached the top of the chat or no new messages. Stopping scroll.")
@@ -123,66 +142,31 @@ def scroll_and_collect_messages(driver, max_scroll_time=600):
             logging.info("Infinite scroll trigger not found. Might have reached the top.")
             break
 
+    if transcript.reached_known:
+        logging.info("Reached messages saved by the last export. Stopping scroll.")
     logging.info(f"Scrolling completed in {time.time() - start_time:.2f} seconds")
 
-    # Extract bot name
+    bot_name = find_bot_name(driver)
+    transcript.bot_name = bot_name
+    return transcript, bot_name
+
+def find_bot_name(driver):
     try:
         bot_name_element = driver.find_element(By.CSS_SELECTOR, "div[class*='BotHeader_textContainer'] p")
         bot_name = bot_name_element.text
         logging.info(f"Bot name found: {bot_name}")
+        return bot_name
     except NoSuchElementException:
-        bot_name = None
         logging.warning("Bot name not found")
+        return None
 
-    return messages[::-1], bot_name  # Reverse the list to get oldest messages first
-
-def format_and_save_messages(messages, save_dir, chat_url, bot_name):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    url_part = urlparse(chat_url).path.split('/')[-1][:20]
-    filename = f"poe_chat_{url_part}_{timestamp}.txt"
-    filepath = os.path.join(save_dir, filename)
-
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(f"Poe Chat Transcript\n")
-        f.write(f"URL: {chat_url}\n")
-        f.write(f"Bot Name: {bot_name or 'Unknown'}\n")
-        f.write(f"Downloaded on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        f.write("=" * 80 + "\n\n")
-        for i, (human, bot) in enumerate(messages, 1):
-            f.write(f"Message Pair {i}:\n")
-            if human:
-                f.write("Human: " + human.strip() + "\n\n")
-            if bot:
-                f.write(f"{bot_name or 'Bot'}: " + bot.strip() + "\n\n")
-            if not human and not bot:
-                f.write("(Empty message pair)\n\n")
-            f.write("-" * 80 + "\n\n")
-    logging.info(f"Messages saved to {filepath}")
-    return filepath
-
-def save_poe_chat_text(url, save_dir):
-    email = os.getenv('POE_EMAIL')
-    if not email:
-        raise ValueError("POE_EMAIL environment variable is not set")
-
-    driver = setup_driver()
-    messages = []
-    bot_name = None
-
-    def signal_handler(sig, frame):
-        logging.info("Interrupt received, saving collected messages...")
-        if messages:
-            saved_file = format_and_save_messages(messages, save_dir, url, bot_name)
-            print(f"Partial chat transcript saved to: {saved_file}")
-        driver.quit()
-        sys.exit(0)
-
-    signal.signal(signal.SIGINT, signal_handler)
+def format_and_save_messages(messages, save_dir, chat_url, bot_name, output_format="text"):
+    return save_transcript(messages, save_dir, chat_url, bot_name, output_format)
 
-    try:
-        login_to_poe(driver, email)
-
-        logging.info(f"Navigating to chat URL: {url}")
+def collect_chat_messages(driver, url, initial_load_timeout=DEFAULT_NETWORK_IDLE_TIMEOUT, transcript=None,
+                          known_keys=None, prune=None):
+    logging.info(f"Navigating to chat URL: {url}")
+    with metrics.phase("initial_load"):
         driver.get(url)
 
         try:
@@ -193,25 +177,94 @@ def save_poe_chat_text(url, save_dir):
         except TimeoutException:
             logging.warning("Timeout waiting for chat messages to load. Proceeding anyway...")
 
-        # Add a longer delay to ensure all messages are loaded
-        time.sleep(10)
+        # Let the initial batch of messages finish loading
+        wait_for_network_idle(driver, initial_load_timeout)
+
+    transcript, bot_name = scroll_and_collect_messages(driver, transcript=transcript, known_keys=known_keys, prune=prune)
+    logging.info(f"Collected {len(transcript)} message pairs")
+    return transcript, bot_name
+
+def known_keys_for(sync, output_format):
+    # A high-water mark is only usable while the transcript it was merged
+    # into still exists in the same format
+    transcript = sync.get('transcript')
+    if sync.known_keys and transcript and os.path.exists(transcript) and sync.get('format') == output_format:
+        return sync.known_keys
+    logging.info("No earlier export to continue from; doing a full export")
+    return None
+
+def finish_transcript(writer, sync=None, known_keys=None, archive=None):
+    # Appends to the earlier transcript when scrolling reached it; otherwise
+    # every message was collected and a new transcript is written
+    if known_keys and writer.reached_known:
+        pair_count = sync.get('pairs', 0)
+        saved_file = writer.finish(append_to=sync.get('transcript'), first_index=pair_count + 1)
+    else:
+        pair_count = 0
+        saved_file = writer.finish(archive=archive)
+    if sync is not None:
+        sync.save(writer.keys, transcript=saved_file, pairs=pair_count + len(writer), format=writer.output_format)
+    return saved_file
+
+def save_poe_chat_text(url, save_dir, initial_load_timeout=DEFAULT_NETWORK_IDLE_TIMEOUT, output_format="text",
+                       search_index_path=None, incremental=False, browser=None):
+    metrics.reset("text")
+    search_index = SearchIndex(search_index_path) if search_index_path else None
+    try:
+        export_chat_text(url, save_dir, initial_load_timeout, output_format, search_index, incremental, browser)
+    finally:
+        if search_index is not None:
+            search_index.close()
 
-        messages, bot_name = scroll_and_collect_messages(driver)
-        logging.info(f"Collected {len(messages)} message pairs")
+def export_chat_text(url, save_dir, initial_load_timeout, output_format, search_index, incremental=False, browser=None):
+    if is_share_url(url):
+        # Share pages embed the whole conversation; no browser or login needed
+        try:
+            export_share_text(url, save_dir, output_format, search_index)
+        finally:
+            metrics.finish(save_dir)
+        return
+
+    # Pairs are streamed to disk as they are found; an earlier interrupted
+    # run for the same chat and directory is resumed from its checkpoint
+    writer = TranscriptWriter(save_dir, url, output_format, search_index=search_index)
+    sync = SyncState(save_dir, url, "text") if incremental else None
+    known_keys = known_keys_for(sync, output_format) if sync else None
+    session = browser or BrowserSession()
 
-        os.makedirs(save_dir, exist_ok=True)
-        saved_file = format_and_save_messages(messages, save_dir, url, bot_name)
+    def signal_handler(sig, frame):
+        logging.info("Interrupt received, saving collected messages...")
+        if len(writer):
+            saved_file = writer.finish(keep_checkpoint=True)
+            print(f"Partial chat transcript saved to: {saved_file}")
+        session.close()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, signal_handler)
+
+    try:
+        collect_chat_messages(session.driver, url, initial_load_timeout, transcript=writer, known_keys=known_keys)
+
+        with metrics.phase("write"):
+            saved_file = finish_transcript(writer, sync, known_keys)
         print(f"Chat transcript saved to: {saved_file}")
 
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
-        if messages:
-            saved_file = format_and_save_messages(messages, save_dir, url, bot_name)
+        if len(writer):
+            saved_file = writer.finish(keep_checkpoint=True)
             print(f"Partial chat transcript saved to: {saved_file}")
+        raise
     finally:
-        driver.quit()
+        if browser is None:
+            session.close()
+        metrics.finish(save_dir)
 
 if __name__ == "__main__":
     poe_chat_url = input("Enter the Poe chat URL: ")
     save_directory = input("Enter the directory to save the transcript (default: PoeChatTranscripts): ") or "PoeChatTranscripts"
-    save_poe_chat_text(poe_chat_url, save_directory)
+    output_format = input("Enter the transcript format, text or jsonl (default: text): ") or "text"
+    search_index_path = input("Enter a search index file to update (leave empty to skip): ") or None
+    incremental = input("Only add messages newer than the last export of this chat? (y/N): ").strip().lower() == 'y'
+    save_poe_chat_text(poe_chat_url, save_directory, output_format=output_format, search_index_path=search_index_path,
+                       incremental=incremental)
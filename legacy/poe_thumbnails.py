@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import html
+import hashlib
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from poe_media_dedup import list_images, require_pillow
+
+THUMBS_DIRNAME = ".thumbs"
+CACHE_FILENAME = "cache.json"
+INDEX_FILENAME = "index.html"
+DEFAULT_THUMB_SIZE = 256
+DEFAULT_PREVIEW_SIZE = 1280
+THUMB_QUALITY = 75
+PREVIEW_QUALITY = 82
+SAVED_NAME_PATTERN = re.compile(r"^image_(\d+)_([0-9a-f]{32})\.")
+
+def content_hash_for(path):
+    # Downloaded files carry their MD5 in the name; anything else is hashed
+    match = SAVED_NAME_PATTERN.match(os.path.basename(path))
+    if match:
+        return match.group(2)
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def cache_key_for(content_hash, thumb_size, preview_size):
+    # The sizes are part of the key and the file names, so changing either
+    # option renders new previews instead of reusing ones of the old size
+    return f"{content_hash}_{thumb_size}_{preview_size}"
+
+def sort_key(path):
+    match = SAVED_NAME_PATTERN.match(os.path.basename(path))
+    return (int(match.group(1)) if match else float('inf'), os.path.basename(path))
+
+def render_previews(path, key, thumbs_dir, thumb_size, preview_size):
+    # Runs in a worker process; the preview is made first and the thumbnail
+    # is scaled down from it rather than from the full image
+    Image = require_pillow()
+    from PIL import ImageOps
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            img.draft('RGB', (preview_size, preview_size))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert('RGB')
+            img.thumbnail((preview_size, preview_size), Image.LANCZOS)
+            img.save(os.path.join(thumbs_dir, f"{key}_preview.jpg"), 'JPEG',
+                     quality=PREVIEW_QUALITY, optimize=True, progressive=True)
+            img.thumbnail((thumb_size, thumb_size), Image.LANCZOS)
+            img.save(os.path.join(thumbs_dir, f"{key}_thumb.jpg"), 'JPEG', quality=THUMB_QUALITY, optimize=True)
+            return key, {'width': width, 'height': height, 'thumb': list(img.size)}
+    except Exception as e:
+        logging.warning(f"Could not make previews for {path}: {str(e)}")
+        return key, None
+
+def load_cache(thumbs_dir):
+    path = os.path.join(thumbs_dir, CACHE_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_cache(thumbs_dir, cache):
+    tmp_path = os.path.join(thumbs_dir, CACHE_FILENAME + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, os.path.join(thumbs_dir, CACHE_FILENAME))
+
+def is_cached(thumbs_dir, key, cache):
+    # Unreadable images are cached as None so re-runs do not retry them
+    if key in cache and cache[key] is None:
+        return True
+    return key in cache and all(
+        os.path.exists(os.path.join(thumbs_dir, f"{key}_{kind}.jpg")) for kind in ("thumb", "preview"))
+
+def write_contact_sheet(directory, images, cache):
+    # Thumbnails load lazily with fixed dimensions, so the page lays out at
+    # once even for tens of thousands of images
+    tiles = []
+    for path, key in images:
+        info = cache.get(key)
+        if not info:
+            continue
+        name = html.escape(os.path.basename(path), quote=True)
+        thumb_width, thumb_height = info['thumb']
+        tiles.append(
+            f'<figure><a href="{THUMBS_DIRNAME}/{key}_preview.jpg">'
+            f'<img src="{THUMBS_DIRNAME}/{key}_thumb.jpg" width="{thumb_width}" height="{thumb_height}" '
+            f'loading="lazy" alt="{name}"></a>'
+            f'<figcaption><a href="{name}">{name}</a> {info["width"]}&times;{info["height"]}</figcaption></figure>')
+    index_path = os.path.join(directory, INDEX_FILENAME)
+    with open(index_path, 'w', encoding='utf-8') as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+                f"<title>{html.escape(os.path.basename(os.path.abspath(directory)))}: {len(tiles)} images</title>"
+                "<style>body{font-family:sans-serif;margin:8px;background:#222;color:#ddd}"
+                "main{display:flex;flex-wrap:wrap;gap:8px}figure{margin:0;width:256px;text-align:center}"
+                "img{max-width:256px;height:auto;background:#333}figcaption{font-size:11px;word-break:break-all}"
+                "a{color:#9cf}</style></head><body><main>\n")
+        f.write("\n".join(tiles))
+        f.write("\n</main></body></html>\n")
+    return index_path
+
+def build_previews(directory, workers=None, thumb_size=DEFAULT_THUMB_SIZE, preview_size=DEFAULT_PREVIEW_SIZE):
+    require_pillow()
+    thumbs_dir = os.path.join(directory, THUMBS_DIRNAME)
+    os.makedirs(thumbs_dir, exist_ok=True)
+    cache = load_cache(thumbs_dir)
+
+    images = [(path, cache_key_for(content_hash_for(path), thumb_size, preview_size))
+              for path in sorted(list_images(directory), key=sort_key)]
+    todo = {}
+    for path, key in images:
+        if not is_cached(thumbs_dir, key, cache):
+            todo.setdefault(key, path)
+    logging.info(f"Making previews for {len(todo)} of {len(images)} images; the rest are cached")
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_previews, path, key, thumbs_dir, thumb_size, preview_size)
+                       for key, path in todo.items()]
+            for future in futures:
+                key, info = future.result()
+                cache[key] = info
+        save_cache(thumbs_dir, cache)
+
+    index_path = write_contact_sheet(directory, images, cache)
+    logging.info(f"Contact sheet saved to {index_path}")
+    return index_path
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Make thumbnails, previews and a contact sheet for downloaded images.")
+    parser.add_argument("directory", help="directory of downloaded images")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--thumb-size", type=int, default=DEFAULT_THUMB_SIZE, help="longest thumbnail side in pixels")
+    parser.add_argument("--preview-size", type=int, default=DEFAULT_PREVIEW_SIZE, help="longest preview side in pixels")
+    args = parser.parse_args()
+
+    build_previews(args.directory, args.workers, args.thumb_size, args.preview_size)
@@ -0,0 +1,240 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from urllib.parse import urlparse
+
+OUTPUT_FORMATS = ("text", "jsonl")
+DEFAULT_CHECKPOINT_EVERY = 50
+
+def chat_url_part(chat_url):
+    return urlparse(chat_url).path.split('/')[-1][:20]
+
+def chat_state_name(chat_url):
+    # chat_url_part is truncated, so state files also carry a hash of the
+    # whole URL; two chats sharing a prefix never share a spool or checkpoint
+    digest = hashlib.sha256(chat_url.encode('utf-8')).hexdigest()[:16]
+    return f"{chat_url_part(chat_url)}_{digest}"
+
+def write_text_header(f, chat_url, bot_name):
+    f.write(f"Poe Chat Transcript\n")
+    f.write(f"URL: {chat_url}\n")
+    f.write(f"Bot Name: {bot_name or 'Unknown'}\n")
+    f.write(f"Downloaded on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    f.write("=" * 80 + "\n\n")
+
+def write_text_pairs(f, pairs, bot_name, first_index=1):
+    count = 0
+    for count, (human, bot) in enumerate(pairs, 1):
+        f.write(f"Message Pair {first_index + count - 1}:\n")
+        if human:
+            f.write("Human: " + human.strip() + "\n\n")
+        if bot:
+            f.write(f"{bot_name or 'Bot'}: " + bot.strip() + "\n\n")
+        if not human and not bot:
+            f.write("(Empty message pair)\n\n")
+        f.write("-" * 80 + "\n\n")
+    return count
+
+def write_text_transcript(f, pairs, chat_url, bot_name):
+    write_text_header(f, chat_url, bot_name)
+    return write_text_pairs(f, pairs, bot_name)
+
+def write_jsonl_pairs(f, pairs, bot_name, first_index=1):
+    count = 0
+    for count, (human, bot) in enumerate(pairs, 1):
+        f.write(json.dumps({'type': "pair", 'index': first_index + count - 1, 'human': human, 'bot': bot}) + "\n")
+    return count
+
+def write_jsonl_transcript(f, pairs, chat_url, bot_name):
+    f.write(json.dumps({'type': "chat", 'url': chat_url, 'bot_name': bot_name,
+                        'downloaded_on': datetime.now().isoformat(timespec='seconds')}) + "\n")
+    return write_jsonl_pairs(f, pairs, bot_name)
+
+WRITERS = {"text": (".txt", write_text_transcript, write_text_pairs),
+           "jsonl": (".jsonl", write_jsonl_transcript, write_jsonl_pairs)}
+
+def save_transcript(pairs, save_dir, chat_url, bot_name, output_format="text", archive=None):
+    extension, write, _ = WRITERS[output_format]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"poe_chat_{chat_url_part(chat_url)}_{timestamp}{extension}"
+    if archive is not None:
+        with archive.open_text(filename) as f:
+            write(f, pairs, chat_url, bot_name)
+        logging.info(f"Messages saved to {filename} in {archive.path}")
+        return f"{archive.path}:{filename}"
+
+    filepath = os.path.join(save_dir, filename)
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        write(f, pairs, chat_url, bot_name)
+    logging.info(f"Messages saved to {filepath}")
+    return filepath
+
+def append_transcript(pairs, filepath, bot_name, output_format="text", first_index=1):
+    # Continues an earlier transcript of the same chat, numbering on from it
+    _, _, write_pairs = WRITERS[output_format]
+    with open(filepath, 'a', encoding='utf-8') as f:
+        count = write_pairs(f, pairs, bot_name, first_index)
+    logging.info(f"Appended {count} message pairs to {filepath}")
+    return filepath
+
+class TranscriptBuffer:
+    # In-memory collector with the same interface as TranscriptWriter, used
+    # when the caller wants the pairs back as a list
+    def __init__(self):
+        self.seen = set()
+        self.batches = []
+        self.bot_name = None
+        self.reached_known = False
+
+    def add_batch(self, pairs):
+        # pairs are (key, human, bot) in DOM order; each batch is older than
+        # every batch before it
+        new = [(key, human, bot) for key, human, bot in pairs if key not in self.seen]
+        if new:
+            self.seen.update(key for key, _, _ in new)
+            self.batches.append([(human, bot) for _, human, bot in new])
+        return len(new)
+
+    def iter_pairs(self):
+        for batch in reversed(self.batches):
+            yield from batch
+
+    def __len__(self):
+        return len(self.seen)
+
+class TranscriptWriter:
+    # Streams message pairs to a JSONL spool in save_dir as they are found and
+    # checkpoints the spool size and batch offsets every checkpoint_every
+    # pairs. Only the keys of collected pairs stay in memory. A writer created
+    # for a chat with a checkpoint on disk resumes from it; finish() renders the
+    # oldest-first transcript by reading the batches back in reverse. With a
+    # search index, each batch is indexed as it is spooled.
+    def __init__(self, save_dir, chat_url, output_format="text", checkpoint_every=DEFAULT_CHECKPOINT_EVERY,
+                 search_index=None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}; expected one of {', '.join(OUTPUT_FORMATS)}")
+        os.makedirs(save_dir, exist_ok=True)
+        self.save_dir = save_dir
+        self.chat_url = chat_url
+        self.output_format = output_format
+        self.checkpoint_every = checkpoint_every
+        self.search_index = search_index
+        self.bot_name = None
+        self.reached_known = False
+        self.keys = []
+        self.seen = set()
+        self.batches = []
+        self.since_checkpoint = 0
+        self.filepath = None
+
+        base = os.path.join(save_dir, f".poe_chat_{chat_state_name(chat_url)}")
+        self.spool_path = base + ".spool.jsonl"
+        self.checkpoint_path = base + ".checkpoint.json"
+        self._resume()
+        self.spool = open(self.spool_path, 'ab')
+
+    def _discard(self):
+        for path in (self.checkpoint_path, self.spool_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _resume(self):
+        if not (os.path.exists(self.checkpoint_path) and os.path.exists(self.spool_path)):
+            # A spool without a checkpoint holds nothing we can order; start over
+            self._discard()
+            return
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable checkpoint {self.checkpoint_path}: {str(e)}")
+            self._discard()
+            return
+        if checkpoint.get('chat_url') != self.chat_url:
+            logging.warning(f"Checkpoint {self.checkpoint_path} belongs to {checkpoint.get('chat_url')}; starting over")
+            self._discard()
+            return
+
+        # Drop anything written after the last checkpoint
+        with open(self.spool_path, 'r+b') as spool:
+            spool.truncate(checkpoint['spool_size'])
+        self.batches = checkpoint['batches']
+        self.bot_name = checkpoint.get('bot_name')
+        for record in self._read_records(0, sum(count for _, count in self.batches)):
+            self.seen.add(record['key'])
+        logging.info(f"Resuming transcript from checkpoint with {len(self.seen)} message pairs")
+
+    def _read_records(self, offset, count):
+        with open(self.spool_path, 'rb') as spool:
+            spool.seek(offset)
+            for _ in range(count):
+                yield json.loads(spool.readline())
+
+    def add_batch(self, pairs):
+        offset = self.spool.tell()
+        new = []
+        for key, human, bot in pairs:
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            self.spool.write((json.dumps({'key': key, 'human': human, 'bot': bot}) + "\n").encode('utf-8'))
+            new.append((key, human, bot))
+        added = len(new)
+        if added:
+            if self.search_index is not None:
+                self.search_index.add_pairs(self.chat_url, new)
+            self.batches.append([offset, added])
+            self.since_checkpoint += added
+            if self.since_checkpoint >= self.checkpoint_every:
+                self.checkpoint()
+        return added
+
+    def checkpoint(self):
+        self.spool.flush()
+        os.fsync(self.spool.fileno())
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'chat_url': self.chat_url, 'bot_name': self.bot_name,
+                       'spool_size': self.spool.tell(), 'batches': self.batches}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.since_checkpoint = 0
+
+    def iter_records(self):
+        self.spool.flush()
+        for offset, count in reversed(self.batches):
+            yield from self._read_records(offset, count)
+
+    def iter_pairs(self):
+        for record in self.iter_records():
+            yield record['human'], record['bot']
+
+    def __len__(self):
+        return len(self.seen)
+
+    def finish(self, keep_checkpoint=False, archive=None, append_to=None, first_index=1):
+        # keep_checkpoint leaves the spool in place so a later run can resume;
+        # it marks partial output, so the search index keeps the pairs added
+        # so far but is not renumbered or pruned until the run completes.
+        # append_to adds the pairs to an earlier transcript instead, numbered
+        # from first_index.
+        if self.spool.closed:
+            return self.filepath
+        self.checkpoint()
+        if append_to:
+            self.filepath = append_transcript(self.iter_pairs(), append_to, self.bot_name, self.output_format,
+                                              first_index)
+        else:
+            self.filepath = save_transcript(self.iter_pairs(), self.save_dir, self.chat_url, self.bot_name,
+                                            self.output_format, archive)
+        self.keys = [record['key'] for record in self.iter_records()]
+        if self.search_index is not None and not keep_checkpoint:
+            self.search_index.finish_chat(self.chat_url, self.keys, self.bot_name, self.filepath, first_index,
+                                          replace=not append_to)
+        self.spool.close()
+        if not keep_checkpoint:
+            os.remove(self.checkpoint_path)
+            os.remove(self.spool_path)
+        return self.filepath
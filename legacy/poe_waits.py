@@ -0,0 +1,80 @@
+import time
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+
+# Timeouts are upper bounds; every wait returns as soon as its signal arrives.
+DEFAULT_POLL_INTERVAL = 0.1
+DEFAULT_SCROLL_TIMEOUT = 10
+DEFAULT_LOGIN_TIMEOUT = 30
+DEFAULT_PAGE_TIMEOUT = 10
+DEFAULT_NETWORK_IDLE_TIMEOUT = 10
+DEFAULT_NETWORK_IDLE_TIME = 0.5
+
+SCROLL_STATE_JS = """
+return {
+    pairs: document.querySelectorAll("div[class*='ChatMessagesView_messagePair']").length,
+    trigger: document.querySelector("div[class*='InfiniteScroll_pagingTrigger']") !== null,
+};
+"""
+
+# Counts finished resource requests with an observer installed on first use.
+# Counting buffered entries stops working on long pages: the resource timing
+# buffer holds 250 entries by default and silently drops the rest, but
+# observers see every entry.
+RESOURCE_COUNT_JS = """
+if (!window.__poeResourceCounter) {
+    const counter = {count: performance.getEntriesByType('resource').length};
+    new PerformanceObserver((list) => { counter.count += list.getEntries().length; }).observe({type: 'resource'});
+    window.__poeResourceCounter = counter;
+}
+return [document.readyState, window.__poeResourceCounter.count];
+"""
+
+def wait_until(driver, condition, timeout, poll_frequency=DEFAULT_POLL_INTERVAL):
+    # Like WebDriverWait.until, but a timeout returns False instead of raising
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(condition)
+    except TimeoutException:
+        return False
+
+def scroll_state(driver):
+    return driver.execute_script(SCROLL_STATE_JS)
+
+def count_message_pairs(driver):
+    return scroll_state(driver)['pairs']
+
+def wait_for_more_messages(driver, previous_count, timeout=DEFAULT_SCROLL_TIMEOUT):
+    # Returns the scroll state once the message pair count differs from
+    # previous_count or the paging trigger is gone, or False on timeout
+    def changed(d):
+        state = scroll_state(d)
+        if state['pairs'] != previous_count or not state['trigger']:
+            return state
+        return False
+    return wait_until(driver, changed, timeout)
+
+def wait_for_staleness(driver, element, timeout=DEFAULT_PAGE_TIMEOUT):
+    return wait_until(driver, EC.staleness_of(element), timeout)
+
+def wait_for_url_change(driver, old_fragment, timeout=DEFAULT_LOGIN_TIMEOUT):
+    return wait_until(driver, lambda d: old_fragment not in d.current_url, timeout)
+
+def wait_for_network_idle(driver, timeout=DEFAULT_NETWORK_IDLE_TIMEOUT, idle_time=DEFAULT_NETWORK_IDLE_TIME,
+                          poll_frequency=DEFAULT_POLL_INTERVAL):
+    # The page counts as idle once it has finished loading and no resource
+    # request has finished for idle_time seconds
+    deadline = time.time() + timeout
+    last_count = None
+    last_change = time.time()
+    while time.time() < deadline:
+        ready_state, count = driver.execute_script(RESOURCE_COUNT_JS)
+        now = time.time()
+        if count != last_count:
+            last_count = count
+            last_change = now
+        elif ready_state == 'complete' and now - last_change >= idle_time:
+            return True
+        time.sleep(poll_frequency)
+    return False
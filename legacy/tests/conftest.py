@@ -0,0 +1,27 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# The exporters are flat modules in the directory above
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from poe_fixture_server import FixtureHandler, attachment_url
+
+@pytest.fixture(scope="session")
+def fixture_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def attachment(fixture_server):
+    def make(name, size=4096, latency=0):
+        return attachment_url(fixture_server, name, size, latency)
+    return make
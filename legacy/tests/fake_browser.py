@@ -0,0 +1,56 @@
+from poe_chat_exporter import HARVEST_JS, SCROLL_UP_JS
+from poe_image_downloader import INSTALL_MEDIA_OBSERVER_JS
+from poe_sync_state import PAIR_KEYS_JS
+from poe_waits import SCROLL_STATE_JS, RESOURCE_COUNT_JS
+
+class FakeElement:
+    def __init__(self, text=""):
+        self.text = text
+
+class FakeChatDriver:
+    # Answers the scripts the single-pass harvester sends, for a chat of
+    # `messages` pairs that loads `page_size` older pairs per scroll. Every
+    # `images_every`th pair carries an image. Pair i has the DOM key "m{i}".
+    def __init__(self, messages=50, page_size=20, images_every=5):
+        self.messages = messages
+        self.page_size = page_size
+        self.images_every = images_every
+        self.loaded = min(messages, page_size)
+        self.drained = set()
+        self.visits = []
+        self.scrolls = 0
+
+    def visible(self):
+        return range(self.messages - self.loaded, self.messages)
+
+    def image_url(self, i):
+        return f"https://cdn.example/img_{i}.png"
+
+    def get(self, url):
+        self.visits.append(url)
+
+    def find_element(self, by, selector):
+        return FakeElement("FakeBot")
+
+    def execute_script(self, script, *args):
+        if script == INSTALL_MEDIA_OBSERVER_JS:
+            return True
+        if script == RESOURCE_COUNT_JS:
+            return ['complete', 1]
+        if script == SCROLL_STATE_JS:
+            return {'pairs': self.loaded, 'trigger': self.loaded < self.messages}
+        if script == PAIR_KEYS_JS:
+            return [f"m{i}" for i in self.visible()]
+        if script == SCROLL_UP_JS:
+            self.scrolls += 1
+            if self.loaded >= self.messages:
+                return False
+            self.loaded = min(self.messages, self.loaded + self.page_size)
+            return True
+        if script == HARVEST_JS:
+            urls = [self.image_url(i) for i in self.visible()
+                    if i % self.images_every == 0 and self.image_url(i) not in self.drained]
+            self.drained.update(urls)
+            pairs = [{'key': f"m{i}", 'human': f"Question {i}", 'bot': f"Answer {i}"} for i in self.visible()]
+            return {'media': {'urls': urls, 'pairs': self.loaded}, 'text': {'pairs': pairs, 'total': self.loaded}}
+        raise AssertionError(f"unexpected script: {script[:60]}")
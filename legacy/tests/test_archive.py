@@ -0,0 +1,105 @@
+import os
+import json
+import tarfile
+import zipfile
+import hashlib
+
+import pytest
+
+import poe_archive
+import poe_download_engine
+from poe_archive import ArchiveWriter, MANIFEST_NAME
+from poe_download_engine import download_images
+
+def read_entries(path, archive_format):
+    if archive_format == "tar":
+        with tarfile.open(path) as tar:
+            return {member.name: tar.extractfile(member).read() for member in tar.getmembers()}
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+def body_entries(path, archive_format):
+    entries = read_entries(path, archive_format)
+    return entries, json.loads(entries.pop(MANIFEST_NAME))['entries']
+
+def download_set(attachment):
+    return [attachment("a.png", 5000), attachment("b.png", 7000), attachment("a.png", 5000) + "?copy=1",
+            attachment("missing.png", "not-a-size")]
+
+@pytest.mark.parametrize("archive_format", ["zip", "zip-stored", "tar"])
+def test_downloads_land_in_the_archive_with_a_manifest(tmp_path, attachment, archive_format):
+    urls = download_set(attachment)
+    path = str(tmp_path / f"chat.{archive_format}")
+    with ArchiveWriter(path, archive_format) as archive:
+        download_images(urls, str(tmp_path), concurrency=2, archive=archive)
+
+    entries, manifest = body_entries(path, archive_format)
+    by_url = {entry['url']: entry for entry in manifest}
+    assert sorted(entries) == sorted(by_url[url]['entry'] for url in urls[:2])
+    for url in urls[:2]:
+        assert by_url[url]['hash'] == hashlib.md5(entries[by_url[url]['entry']]).hexdigest()
+    assert by_url[urls[2]]['duplicate_of'] == by_url[urls[0]]['entry']
+    assert 'entry' not in by_url[urls[2]]
+    assert 'error' in by_url[urls[3]]
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+@pytest.mark.parametrize("archive_format", ["zip", "tar"])
+@pytest.mark.parametrize("known_length", [True, False])
+def test_large_bodies_stream_into_their_entries(tmp_path, attachment, monkeypatch, archive_format, known_length):
+    monkeypatch.setattr(poe_archive, "BUFFER_MAX_BODY", 1024)
+    if not known_length:
+        monkeypatch.setattr(poe_download_engine, "body_length", lambda response: None)
+    urls = download_set(attachment) + [attachment("big.png", 256 * 1024)]
+    path = str(tmp_path / f"chat.{archive_format}")
+    with ArchiveWriter(path, archive_format) as archive:
+        download_images(urls, str(tmp_path), concurrency=4, archive=archive)
+        assert archive.buffered == 0
+
+    entries, manifest = body_entries(path, archive_format)
+    by_url = {entry['url']: entry for entry in manifest}
+    assert len(entries[by_url[urls[4]]['entry']]) == 256 * 1024
+    for url in [urls[0], urls[1], urls[4]]:
+        assert by_url[url]['hash'] == hashlib.md5(entries[by_url[url]['entry']]).hexdigest()
+    # Streamed content is hashed after it is written, so a duplicate keeps its
+    # entry; a tar body of unknown length is spooled and skipped instead
+    assert by_url[urls[2]]['duplicate_of'] == by_url[urls[0]]['entry']
+    assert by_url[urls[2]]['hash'] == by_url[urls[0]]['hash']
+    assert ('entry' in by_url[urls[2]]) == (archive_format == "zip" or known_length)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+def test_buffered_memory_is_capped_across_downloads(tmp_path):
+    with ArchiveWriter(str(tmp_path / "chat.zip")) as archive:
+        assert not archive.reserve(poe_archive.BUFFER_MAX_BODY + 1)
+        reserved = 0
+        while archive.reserve(poe_archive.BUFFER_MAX_BODY):
+            reserved += poe_archive.BUFFER_MAX_BODY
+        assert reserved == poe_archive.BUFFER_MAX_TOTAL
+        archive.release(poe_archive.BUFFER_MAX_BODY)
+        assert archive.reserve(poe_archive.BUFFER_MAX_BODY)
+
+def test_short_tar_entry_keeps_later_members_aligned(tmp_path):
+    path = str(tmp_path / "chat.tar")
+    with ArchiveWriter(path, "tar") as archive:
+        with pytest.raises(OSError):
+            with archive.lock, archive.open_entry("image_0.png", 1000) as dest:
+                dest.write(b"x" * 300)
+                raise OSError("connection dropped")
+        archive.add_bytes("image_0_2.png", b"y" * 1000)
+    entries = read_entries(path, "tar")
+    assert entries["image_0.png"] == b"x" * 300 + b"\0" * 700
+    assert entries["image_0_2.png"] == b"y" * 1000
+
+def test_retried_entries_get_fresh_names(tmp_path):
+    with ArchiveWriter(str(tmp_path / "chat.zip")) as archive:
+        assert [archive.unique_name("image_3.png") for _ in range(3)] == ["image_3.png", "image_3_2.png",
+                                                                           "image_3_3.png"]
+        archive.record("a", entry="image_3.png", incomplete=True)
+        archive.record("b", error="HTTP 404")
+        assert archive.recorded_urls() == {"b"}
+
+def test_text_entries_are_written_whole(tmp_path):
+    path = str(tmp_path / "chat.tar")
+    with ArchiveWriter(path, "tar") as archive:
+        with archive.open_text("transcript.txt") as f:
+            f.write("héllo\n" * 1000)
+    assert read_entries(path, "tar")["transcript.txt"].decode('utf-8') == "héllo\n" * 1000
@@ -0,0 +1,124 @@
+import os
+import time
+import queue
+
+import pytest
+
+from poe_batch_export import export_chat
+from poe_chat_exporter import UrlCollector
+from poe_download_journal import DownloadJournal, FAILED, DONE
+
+from fake_browser import FakeChatDriver
+
+URL = "https://poe.com/chat/abc123"
+
+def read_transcript(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def test_both_mode_collects_text_and_images_in_one_scroll(tmp_path):
+    driver = FakeChatDriver(messages=50, page_size=20, images_every=5)
+    downloads = queue.Queue()
+
+    detail = export_chat(lambda: driver, URL, "both", str(tmp_path), downloads)
+
+    assert driver.visits == [URL]
+    assert detail['message_pairs'] == 50
+    transcript = read_transcript(detail['transcript'])
+    assert transcript.index("Question 0") < transcript.index("Question 49")
+    url, _, img_urls, transcript_path, newest_keys = downloads.get_nowait()
+    assert url == URL and transcript_path == detail['transcript']
+    assert sorted(img_urls) == sorted(driver.image_url(i) for i in range(0, 50, 5))
+    assert newest_keys is None
+
+def test_incremental_both_mode_stops_at_the_last_export_and_retries_failures(tmp_path):
+    export_chat(lambda: FakeChatDriver(messages=50), URL, "both", str(tmp_path), queue.Queue(), incremental=True)
+    chat_dir = tmp_path / "abc123"
+    journal = DownloadJournal(str(chat_dir))
+    journal.record("https://cdn.example/failed.png", FAILED, status=503)
+    journal.record("https://cdn.example/done.png", DONE)
+    journal.close()
+
+    # Five newer pairs; the first page already reaches the last export
+    driver = FakeChatDriver(messages=55)
+    downloads = queue.Queue()
+    detail = export_chat(lambda: driver, URL, "both", str(tmp_path), downloads, incremental=True)
+
+    assert driver.scrolls == 0
+    assert detail['message_pairs'] == 5
+    _, _, img_urls, _, newest_keys = downloads.get_nowait()
+    assert img_urls[0] == "https://cdn.example/failed.png"
+    assert "https://cdn.example/done.png" not in img_urls
+    assert newest_keys[-1] == "m54"
+
+def test_url_collector_keeps_first_seen_order():
+    collector = UrlCollector(["a", "b", "a"])
+    assert collector.add(["b", "c", "d", "c"]) == 2
+    assert collector.urls == ["a", "b", "c", "d"]
+    assert len(collector) == 4
+
+SHARE_URLS = ["https://poe.com/s/first", "https://poe.com/s/crash", "https://poe.com/s/third"]
+
+def fake_export_chat(driver, url, mode, output_dir, download_queue, *args):
+    # Runs in the forked chat worker; "crash" kills it without a report
+    if url.endswith("/crash"):
+        # Let the queue's feeder thread deliver the earlier result first
+        time.sleep(0.5)
+        os._exit(3)
+    if mode != "text":
+        download_queue.put((url, output_dir, [], None, None))
+    return {'message_pairs': 1}
+
+@pytest.fixture
+def batch(monkeypatch):
+    import poe_batch_export
+    monkeypatch.setattr(poe_batch_export, "RESULT_POLL_INTERVAL", 0.2)
+    monkeypatch.setattr(poe_batch_export, "export_chat", fake_export_chat)
+    return poe_batch_export
+
+def test_dead_chat_worker_fails_its_chats_instead_of_hanging(tmp_path, batch):
+    report = batch.run_batch(SHARE_URLS, str(tmp_path), mode="text", workers=1)
+
+    assert report[SHARE_URLS[0]]['ok']
+    for url in SHARE_URLS[1:]:
+        assert not report[url]['ok']
+        assert "exited with code 3" in report[url]['stages']['collect']['error']
+
+def test_dead_download_worker_fails_pending_downloads(tmp_path, batch, monkeypatch):
+    def crash(*args, **kwargs):
+        os._exit(4)
+
+    monkeypatch.setattr(batch, "download_images", crash)
+    urls = [SHARE_URLS[0], SHARE_URLS[2]]
+    report = batch.run_batch(urls, str(tmp_path), mode="both", workers=1)
+
+    for url in urls:
+        assert report[url]['stages']['collect']['ok']
+        assert not report[url]['ok']
+        assert "exited with code 4" in report[url]['stages']['download']['error']
+
+def test_incremental_archive_keeps_the_transcript_for_the_next_run(tmp_path, attachment):
+    from poe_batch_export import download_into_archive
+    from poe_sync_state import SyncState
+    from poe_text_downloader import known_keys_for, finish_transcript
+    from poe_transcript_writer import TranscriptWriter
+
+    chat_dir = str(tmp_path)
+    sync = SyncState(chat_dir, URL, "text")
+    writer = TranscriptWriter(chat_dir, URL)
+    writer.add_batch([("m1", "Question 1", "Answer 1")])
+    transcript = finish_transcript(writer, sync)
+
+    download_into_archive([attachment("a.png")], chat_dir, URL, 2, "zip", transcript, incremental=True)
+
+    assert os.path.exists(transcript)
+    assert known_keys_for(SyncState(chat_dir, URL, "text"), "text") == {"m1"}
+    assert len([name for name in os.listdir(chat_dir) if name.endswith(".zip")]) == 1
+
+def test_archive_takes_the_transcript_in_a_full_export(tmp_path, attachment):
+    from poe_batch_export import download_into_archive
+    transcript = tmp_path / "poe_chat_abc123.txt"
+    transcript.write_text("transcript")
+    download_into_archive([attachment("a.png")], str(tmp_path), URL, 2, "zip", str(transcript))
+    assert not transcript.exists()
+    assert os.path.exists(tmp_path / "poe_chat_abc123.zip")
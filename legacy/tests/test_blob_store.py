@@ -0,0 +1,62 @@
+import os
+
+from poe_blob_store import BlobStore, INDEX_FILENAME
+from poe_download_engine import download_images
+
+def test_url_lookup_joins_the_blob(tmp_path):
+    path = tmp_path / "image_1_abc.png"
+    path.write_bytes(b"x" * 10)
+    store = BlobStore(str(tmp_path))
+    store.add_blob("abc", str(path))
+    store.record_url("https://cdn.example/a.png", "abc", etag='"e1"', last_modified="Tue, 01 Oct 2024 00:00:00 GMT")
+
+    assert store.path_for_hash("abc") == str(path)
+    assert store.lookup_url("https://cdn.example/a.png") == {
+        'hash': "abc", 'etag': '"e1"', 'last_modified': "Tue, 01 Oct 2024 00:00:00 GMT", 'path': str(path)}
+    assert store.lookup_url("https://cdn.example/other.png") is None
+    store.close()
+    assert os.path.exists(tmp_path / INDEX_FILENAME)
+
+def test_deleted_files_are_not_returned(tmp_path):
+    path = tmp_path / "gone.png"
+    path.write_bytes(b"x")
+    store = BlobStore(str(tmp_path))
+    store.add_blob("abc", str(path))
+    store.record_url("https://cdn.example/a.png", "abc")
+    os.remove(path)
+
+    assert store.path_for_hash("abc") is None
+    assert store.lookup_url("https://cdn.example/a.png") is None
+    store.close()
+
+def test_merge_blob_moves_urls_to_the_kept_hash(tmp_path):
+    kept, merged = tmp_path / "kept.png", tmp_path / "merged.png"
+    kept.write_bytes(b"k")
+    merged.write_bytes(b"m")
+    store = BlobStore(str(tmp_path))
+    store.add_blob("kept", str(kept))
+    store.add_blob("merged", str(merged))
+    store.record_url("https://cdn.example/m.png", "merged")
+    store.merge_blob("merged", "kept")
+
+    assert store.lookup_url("https://cdn.example/m.png")['path'] == str(kept)
+    assert store.path_for_hash("merged") is None
+    store.close()
+
+def test_index_survives_between_runs_and_can_live_elsewhere(tmp_path, attachment):
+    save_dir, index_path = str(tmp_path / "images"), str(tmp_path / "shared.sqlite3")
+    urls = [attachment("a.png"), attachment("b.png")]
+    first = download_images(urls, save_dir, index_path=index_path)
+    second = download_images(urls, save_dir, index_path=index_path)
+
+    assert all(success for success, _ in first)
+    assert second == [(False, img_hash) for _, img_hash in first]
+    assert not os.path.exists(os.path.join(save_dir, INDEX_FILENAME))
+
+def test_revalidation_keeps_unchanged_files(tmp_path, attachment):
+    url = attachment("etag.png")
+    [(saved, img_hash)] = download_images([url], str(tmp_path))
+    files = set(os.listdir(tmp_path))
+
+    assert download_images([url], str(tmp_path), revalidate=True) == [(False, img_hash)]
+    assert set(os.listdir(tmp_path)) == files
@@ -0,0 +1,38 @@
+import re
+
+import pytest
+
+from poe_capture import BLOCKED_URL_PATTERNS, block_heavy_resources
+
+def blocked(url):
+    # Network.setBlockedURLs patterns: '*' matches any run of characters
+    return any(re.fullmatch(".*".join(map(re.escape, pattern.split("*"))), url) for pattern in BLOCKED_URL_PATTERNS)
+
+@pytest.mark.parametrize("url", [
+    "https://cdn.example/image.png",
+    "https://cdn.example/image.png?w=512&sig=abc",
+    "https://cdn.example/clip.mp4?token=1",
+    "https://fonts.example/font.woff2?v=3",
+])
+def test_heavy_resources_are_blocked(url):
+    assert blocked(url)
+
+@pytest.mark.parametrize("url", [
+    "https://poe.com/chat/abc",
+    "https://poe.com/api/gql_POST?queryName=ChatPage",
+    "https://poe.com/_next/static/chunks/main.js?v=png",
+])
+def test_pages_and_scripts_are_not_blocked(url):
+    assert not blocked(url)
+
+class CdpRecorder:
+    def __init__(self):
+        self.commands = []
+
+    def execute_cdp_cmd(self, command, params):
+        self.commands.append((command, params))
+
+def test_patterns_are_sent_after_enabling_the_network_domain():
+    driver = CdpRecorder()
+    block_heavy_resources(driver)
+    assert driver.commands == [('Network.enable', {}), ('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})]
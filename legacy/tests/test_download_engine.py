@@ -0,0 +1,59 @@
+import os
+
+from poe_download_engine import download_images, BackgroundDownloader
+from poe_fixture_server import attachment_block
+
+def saved_files(save_dir):
+    return sorted(name for name in os.listdir(save_dir) if not name.startswith('.'))
+
+def test_download_images_saves_each_url(tmp_path, attachment):
+    urls = [attachment(f"file_{i}.png") for i in range(5)]
+    results = download_images(urls, str(tmp_path), concurrency=2)
+
+    assert all(success for success, _ in results)
+    files = saved_files(tmp_path)
+    assert len(files) == 5
+    assert all(name.startswith("image_") and name.endswith(".png") for name in files)
+
+def test_saved_file_holds_the_body(tmp_path, attachment):
+    download_images([attachment("body.png", size=1000)], str(tmp_path))
+
+    [name] = saved_files(tmp_path)
+    with open(tmp_path / name, 'rb') as f:
+        assert f.read() == attachment_block("body.png")[:1000]
+
+def test_duplicate_content_is_saved_once(tmp_path, attachment):
+    # The fixture body depends only on the name, so a query string gives a
+    # second URL with the same content
+    url = attachment("same.png")
+    results = download_images([url, url + "?w=64"], str(tmp_path), concurrency=1)
+
+    assert results[0][0] and not results[1][0]
+    assert results[0][1] == results[1][1]
+    assert len(saved_files(tmp_path)) == 1
+
+def test_failed_url_is_reported(tmp_path, fixture_server):
+    results = download_images([f"{fixture_server}/attachments/not-a-size"], str(tmp_path))
+
+    assert results == [(False, None)]
+    assert saved_files(tmp_path) == []
+
+def test_second_run_skips_known_urls(tmp_path, attachment):
+    urls = [attachment("again_1.png"), attachment("again_2.png")]
+    download_images(urls, str(tmp_path))
+    results = download_images(urls, str(tmp_path))
+
+    assert [success for success, _ in results] == [False, False]
+    assert all(img_hash for _, img_hash in results)
+    assert len(saved_files(tmp_path)) == 2
+
+def test_background_downloader_keeps_order_and_skips_repeats(tmp_path, attachment):
+    downloader = BackgroundDownloader(str(tmp_path), concurrency=2)
+    first = [attachment(f"bg_{i}.png") for i in range(3)]
+    assert downloader.add(first) == 3
+    assert downloader.add(first[:1] + [attachment("bg_3.png")]) == 1
+    results = downloader.finish()
+
+    assert len(results) == 4
+    assert all(success for success, _ in results)
+    assert len(saved_files(tmp_path)) == 4
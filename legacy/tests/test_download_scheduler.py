@@ -0,0 +1,115 @@
+import time
+import asyncio
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import poe_download_scheduler
+from poe_download_scheduler import AdaptiveLimiter, HostScheduler, parse_retry_after, backoff_delay
+from poe_download_engine import download_images
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+def test_backoff_honours_retry_after():
+    assert backoff_delay(0, retry_after=7) >= 7
+    assert all(0 <= backoff_delay(attempt) <= poe_download_scheduler.BACKOFF_CAP for attempt in range(20))
+
+def test_limit_grows_on_fast_responses_and_halves_on_throttling():
+    limiter = AdaptiveLimiter("cdn", initial=4, maximum=8)
+    for _ in range(40):
+        limiter.record_response(200, 0.01)
+    assert limiter.limit == 8
+    limiter.record_response(429, 0.01)
+    assert limiter.limit == 4
+    # A burst of errors inside DECREASE_INTERVAL only counts once
+    limiter.record_response(503, 0.01)
+    limiter.record_error()
+    assert limiter.limit == 4
+
+def test_rising_latency_trims_the_limit():
+    limiter = AdaptiveLimiter("cdn", initial=10, maximum=10)
+    limiter.record_response(200, 0.01)
+    for _ in range(10):
+        limiter.record_response(200, 1.0)
+    assert limiter.limit < 10
+
+def test_retry_after_pauses_the_host():
+    limiter = AdaptiveLimiter("cdn", initial=2, maximum=2)
+    limiter.record_response(429, 0.01, retry_after=0.3)
+
+    async def one_request():
+        started = time.monotonic()
+        async with limiter.slot() as slot_started:
+            return slot_started - started
+
+    assert asyncio.run(one_request()) >= 0.25
+
+def test_slots_never_exceed_the_limit():
+    limiter = AdaptiveLimiter("cdn", initial=3, maximum=3)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def many():
+        await asyncio.gather(*(request() for _ in range(20)))
+
+    asyncio.run(many())
+    assert peak == 3
+
+def test_each_host_gets_its_own_limiter():
+    scheduler = HostScheduler(4)
+    a = scheduler.for_url("https://a.example/1.png")
+    assert scheduler.for_url("https://a.example/2.png") is a
+    assert scheduler.for_url("https://b.example/1.png") is not a
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    # Each path answers 429 with Retry-After twice, then the body
+    attempts = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            attempt = self.attempts.get(self.path, 0)
+            self.attempts[self.path] = attempt + 1
+        if attempt < 2:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.path.encode('utf-8') * 100
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def throttling_server(monkeypatch):
+    monkeypatch.setattr(poe_download_scheduler, "BACKOFF_BASE", 0.01)
+    ThrottlingHandler.attempts = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_throttled_downloads_are_retried(tmp_path, throttling_server):
+    urls = [f"{throttling_server}/img_{i}.png" for i in range(5)]
+    results = download_images(urls, str(tmp_path), concurrency=2)
+    assert all(success for success, _ in results)
+    assert all(count == 3 for count in ThrottlingHandler.attempts.values())
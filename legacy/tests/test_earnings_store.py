@@ -0,0 +1,53 @@
+import pytest
+
+from poe_earnings_store import EarningsStore, parse_number
+
+def row(bot, earnings="$10.00", messages="1,000", users="100", followers="5", upvotes="90%"):
+    return (bot, earnings, messages, users, followers, upvotes)
+
+@pytest.fixture
+def store():
+    store = EarningsStore(":memory:")
+    yield store
+    store.close()
+
+@pytest.mark.parametrize("text, expected", [
+    ("$1,234.56", 1234.56), ("95%", 95.0), ("1.2K", 1200.0), ("3m", 3_000_000.0), ("-4", -4.0),
+    ("-", None), ("", None), (None, None), ("1.2.3", None), ("1..2", None), (".", None), ("N/A", None),
+])
+def test_parse_number(text, expected):
+    assert parse_number(text) == expected
+
+def test_only_changed_bots_get_a_row(store):
+    assert store.append_snapshot([row("a"), row("b")], ts=1) == 2
+    assert store.append_snapshot([row("a"), row("b", earnings="$11.00")], ts=2) == 1
+    assert store.bot_history("a") == [(1, 10.0, 1000, 100, 5, 90.0), (2, 10.0, 1000, 100, 5, 90.0)]
+    assert [h[1] for h in store.bot_history("b")] == [10.0, 11.0]
+
+def test_missing_bot_is_removed_from_totals_and_history(store):
+    store.append_snapshot([row("a"), row("b")], ts=1)
+    store.append_snapshot([row("a")], ts=2)
+    store.append_snapshot([row("a"), row("b", earnings="$20.00")], ts=3)
+
+    assert store.bots() == ["a", "b"]
+    assert [(h[0], h[1]) for h in store.bot_history("b")] == [(1, 10.0), (3, 20.0)]
+    totals = store.aggregate_history()
+    assert [(t[0], t[1], t[5]) for t in totals] == [(1, 20.0, 2), (2, 10.0, 1), (3, 30.0, 2)]
+
+def test_removed_bot_leaves_latest(store):
+    store.append_snapshot([row("a"), row("b")], ts=1)
+    store.append_snapshot([row("b")], ts=2)
+    assert store.bots() == ["b"]
+
+def test_partial_snapshot_keeps_missing_bots(store):
+    store.append_snapshot([row("a"), row("b")], ts=1)
+    store.append_snapshot([row("a", earnings="$12.00")], ts=2, partial=True)
+
+    assert store.bots() == ["a", "b"]
+    assert [h[0] for h in store.bot_history("b")] == [1, 2]
+    assert [(t[1], t[5], t[6]) for t in store.aggregate_history()] == [(20.0, 2, 0), (12.0, 1, 1)]
+
+def test_unparseable_cells_are_stored_as_null(store):
+    store.append_snapshot([row("a", earnings="1.2.3", messages="-")], ts=1)
+    assert store.bot_history("a") == [(1, None, None, 100, 5, 90.0)]
+    assert store.aggregate_history()[0][1:3] == (0.0, 0)
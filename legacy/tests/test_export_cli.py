@@ -0,0 +1,72 @@
+import os
+import json
+
+import pytest
+
+import poe_browser
+import poe_export
+from poe_chat_exporter import HARVEST_JS
+
+from fake_browser import FakeChatDriver
+
+GOOD = "https://poe.com/chat/good"
+BROKEN = "https://poe.com/chat/broken"
+
+class FlakyChatDriver(FakeChatDriver):
+    # Serves GOOD normally; BROKEN fails on its second harvest
+    def __init__(self, attachment):
+        super().__init__(messages=50)
+        self.attachment = attachment
+        self.harvests = 0
+
+    def image_url(self, i):
+        return self.attachment(f"img_{i}.png", 2048)
+
+    def get(self, url):
+        super().get(url)
+        self.loaded = min(self.messages, self.page_size)
+        self.drained = set()
+        self.harvests = 0
+
+    def execute_script(self, script, *args):
+        if script == HARVEST_JS:
+            self.harvests += 1
+            if self.visits[-1] == BROKEN and self.harvests > 1:
+                raise RuntimeError("tab crashed")
+        return super().execute_script(script, *args)
+
+@pytest.fixture
+def fake_session(monkeypatch, attachment):
+    driver = FlakyChatDriver(attachment)
+
+    class FakeSession:
+        def __init__(self, capture=None):
+            self.driver = driver
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(poe_browser, "BrowserSession", FakeSession)
+    return driver
+
+def transcripts(directory):
+    return [name for name in os.listdir(directory) if name.startswith("poe_chat_") and name.endswith(".txt")]
+
+def test_all_succeeds(tmp_path, fake_session):
+    assert poe_export.main(["all", GOOD, "-o", str(tmp_path), "--no-earnings"]) == 0
+    assert len(transcripts(tmp_path)) == 1
+
+def test_failed_chat_fails_the_run_but_not_the_other_chats(tmp_path, fake_session):
+    code = poe_export.main(["all", BROKEN, GOOD, "-o", str(tmp_path), "--no-earnings"])
+
+    assert code == 1
+    assert fake_session.visits == [BROKEN, GOOD]
+    # The partial transcript of the broken chat is still written
+    assert len(transcripts(tmp_path)) == 2
+
+def test_run_writes_one_metrics_file_covering_every_chat(tmp_path, fake_session):
+    assert poe_export.main(["all", GOOD, GOOD, "-o", str(tmp_path), "--no-earnings"]) == 0
+    with open(tmp_path / "poe_metrics.json", encoding='utf-8') as f:
+        summary = json.load(f)
+    assert summary['script'] == "all"
+    assert summary['counters']['message_pairs'] == 2 * fake_session.messages
@@ -0,0 +1,88 @@
+import os
+import random
+import hashlib
+
+from PIL import Image
+
+from poe_blob_store import BlobStore
+from poe_media_dedup import MultiIndex, group_near_duplicates, hardlink_duplicates, find_near_duplicates, popcount
+
+def entry(path, value, pixels=100, size=1000):
+    return (path, value, pixels, size)
+
+def test_multi_index_matches_brute_force():
+    rng = random.Random(7)
+    base = [rng.getrandbits(64) for _ in range(50)]
+    values = base + [value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for value in base]
+    for threshold in (0, 3, 6, 10):
+        index = MultiIndex(threshold)
+        for i, value in enumerate(values):
+            index.add(value, i)
+        for value in values[:20]:
+            expected = {i for i, other in enumerate(values) if popcount(value ^ other) <= threshold}
+            assert {i for i, _ in index.search(value)} == expected
+
+def test_groups_do_not_chain():
+    b = (1 << 6) - 1
+    c = (1 << 12) - 1
+    hashed = [entry("a.png", 0, pixels=300), entry("b.png", b, pixels=200), entry("c.png", c, pixels=100)]
+    groups = group_near_duplicates(hashed, threshold=6)
+    assert groups == [{'keep': "a.png", 'duplicates': [{'path': "b.png", 'distance': 6}]}]
+
+def test_largest_image_is_kept():
+    hashed = [entry("small.png", 0, pixels=10), entry("big.png", 1, pixels=1000), entry("other.png", ~0 & (2**64 - 1))]
+    groups = group_near_duplicates(hashed, threshold=2)
+    assert groups == [{'keep': "big.png", 'duplicates': [{'path': "small.png", 'distance': 1}]}]
+
+def test_twenty_thousand_hashes_group_quickly():
+    import time
+    rng = random.Random(1)
+    hashed = [entry(f"{i}.png", rng.getrandbits(64)) for i in range(20000)]
+    started = time.perf_counter()
+    group_near_duplicates(hashed, threshold=6)
+    assert time.perf_counter() - started < 10
+
+def save_image(path, size, color):
+    img = Image.new('RGB', size, color)
+    for x in range(size[0]):
+        img.putpixel((x, 0), (x * 7 % 256, 0, 0))
+    img.save(path)
+
+def md5(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def test_hardlink_renames_duplicates_and_updates_the_index(tmp_path):
+    keep_src, dup_src = str(tmp_path / "k.png"), str(tmp_path / "d.png")
+    save_image(keep_src, (64, 64), (10, 200, 30))
+    save_image(dup_src, (32, 32), (10, 200, 30))
+    keep_hash, dup_hash = md5(keep_src), md5(dup_src)
+    keep_path = str(tmp_path / f"image_1_{keep_hash}.png")
+    dup_path = str(tmp_path / f"image_2_{dup_hash}.png")
+    os.rename(keep_src, keep_path)
+    os.rename(dup_src, dup_path)
+
+    store = BlobStore(str(tmp_path))
+    store.add_blob(keep_hash, keep_path)
+    store.add_blob(dup_hash, dup_path)
+    store.record_url("https://cdn.example/keep.png", keep_hash)
+    store.record_url("https://cdn.example/dup.png", dup_hash)
+    store.close()
+
+    groups = find_near_duplicates(str(tmp_path), workers=1, hardlink=True)
+
+    linked_path = str(tmp_path / f"image_2_{keep_hash}.png")
+    assert groups[0]['duplicates'][0]['path'] == linked_path
+    assert not os.path.exists(dup_path)
+    assert os.path.samefile(linked_path, keep_path)
+    store = BlobStore(str(tmp_path))
+    assert store.lookup_url("https://cdn.example/dup.png")['hash'] == keep_hash
+    assert store.path_for_hash(dup_hash) is None
+    store.close()
+
+def test_hardlink_keeps_names_it_does_not_recognise(tmp_path):
+    keep, dup = str(tmp_path / "keep.png"), str(tmp_path / "copy.png")
+    save_image(keep, (64, 64), (0, 0, 255))
+    save_image(dup, (32, 32), (0, 0, 255))
+    assert hardlink_duplicates([{'keep': keep, 'duplicates': [{'path': dup, 'distance': 0}]}]) == 1
+    assert os.path.samefile(keep, dup)
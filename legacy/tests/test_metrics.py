@@ -0,0 +1,21 @@
+import threading
+
+from poe_metrics import RunMetrics
+
+def test_counts_from_several_threads_are_not_lost():
+    run = RunMetrics("test")
+
+    def work():
+        for _ in range(20000):
+            run.count('bytes_downloaded', 2)
+            with run.phase("download"):
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = run.summary()
+    assert summary['counters']['bytes_downloaded'] == 4 * 20000 * 2
+    assert summary['phases']['download']['count'] == 4 * 20000
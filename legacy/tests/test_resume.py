@@ -0,0 +1,95 @@
+import os
+
+from poe_download_engine import download_images, part_path_for
+from poe_download_journal import DownloadJournal, IN_PROGRESS, DONE, FAILED, QUEUED
+from poe_fixture_server import attachment_block
+
+SIZE = 200_000
+
+def body_for(name, size=SIZE):
+    block = attachment_block(name)
+    return (block * (size // len(block) + 1))[:size]
+
+def leave_part(save_dir, url, data, etag=None):
+    with open(part_path_for(str(save_dir), url), 'wb') as f:
+        f.write(data)
+    journal = DownloadJournal(str(save_dir))
+    journal.record(url, IN_PROGRESS, offset=len(data), etag=etag)
+    journal.close()
+
+def saved_body(save_dir):
+    [name] = [name for name in os.listdir(save_dir) if not name.startswith('.')]
+    with open(os.path.join(save_dir, name), 'rb') as f:
+        return f.read()
+
+def test_partial_file_is_resumed(tmp_path, attachment):
+    url = attachment("half.png", SIZE)
+    leave_part(tmp_path, url, body_for("half.png")[:SIZE // 2])
+
+    [(success, _)] = download_images([url], str(tmp_path))
+
+    assert success
+    assert saved_body(tmp_path) == body_for("half.png")
+    assert not os.path.exists(part_path_for(str(tmp_path), url))
+
+def test_complete_part_file_is_finalised(tmp_path, attachment):
+    # A crash between the last chunk and the rename leaves the whole body in
+    # the part file; the server answers the resume with 416
+    url = attachment("whole.png", SIZE)
+    leave_part(tmp_path, url, body_for("whole.png"))
+
+    [(success, img_hash)] = download_images([url], str(tmp_path))
+
+    assert success
+    assert saved_body(tmp_path) == body_for("whole.png")
+    assert not os.path.exists(part_path_for(str(tmp_path), url))
+    journal = DownloadJournal(str(tmp_path))
+    assert journal.get(url)['state'] == DONE
+    assert journal.get(url)['hash'] == img_hash
+    journal.close()
+
+def test_oversized_part_file_is_fetched_again(tmp_path, attachment):
+    url = attachment("long.png", SIZE)
+    leave_part(tmp_path, url, body_for("long.png") + b"junk")
+
+    [(success, _)] = download_images([url], str(tmp_path))
+
+    assert success
+    assert saved_body(tmp_path) == body_for("long.png")
+
+def test_changed_file_is_fetched_whole(tmp_path, attachment):
+    # If-Range with a stale validator gets the full body, not a range
+    url = attachment("changed.png", SIZE)
+    leave_part(tmp_path, url, b"x" * 1000, etag='"stale"')
+
+    [(success, _)] = download_images([url], str(tmp_path))
+
+    assert success
+    assert saved_body(tmp_path) == body_for("changed.png")
+
+def test_journal_keeps_the_last_record_and_compacts(tmp_path):
+    journal = DownloadJournal(str(tmp_path))
+    journal.record("a", QUEUED)
+    journal.record("a", IN_PROGRESS, offset=10)
+    journal.record("b", FAILED, status=404)
+    journal.record("c", DONE, hash="h")
+    journal.close()
+
+    journal = DownloadJournal(str(tmp_path))
+    assert journal.get("a")['offset'] == 10
+    assert sorted(journal.unfinished()) == ["a", "b"]
+    journal.close()
+    with open(journal.path) as f:
+        assert len(f.readlines()) == 3
+
+def test_journal_ignores_a_truncated_last_line(tmp_path):
+    journal = DownloadJournal(str(tmp_path))
+    journal.record("a", DONE)
+    journal.close()
+    with open(journal.path, 'a') as f:
+        f.write('{"url": "b", "sta')
+
+    journal = DownloadJournal(str(tmp_path))
+    assert journal.state("a") == DONE
+    assert journal.state("b") is None
+    journal.close()
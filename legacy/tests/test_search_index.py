@@ -0,0 +1,90 @@
+import pytest
+
+from poe_search_index import SearchIndex
+from poe_transcript_writer import TranscriptWriter
+
+URL = "https://poe.com/chat/abc123"
+
+@pytest.fixture
+def index():
+    index = SearchIndex(":memory:")
+    yield index
+    index.close()
+
+def rows(index):
+    return index.connection.execute(
+        "SELECT pair_key, role, pair_index, body FROM entries ORDER BY pair_index, role").fetchall()
+
+def test_share_reexport_replaces_rows(index):
+    index.index_transcript(URL, [("first question", "first answer"), ("second question", "second answer")], "Bot")
+    index.index_transcript(URL, [("first question", "first answer"), ("second question", "edited answer")], "Bot")
+
+    assert len(rows(index)) == 4
+    assert [hit['pair_index'] for hit in index.search("second")] == [2]
+    assert index.search("edited")[0]['pair_index'] == 2
+
+def test_share_reexport_drops_removed_pairs(index):
+    index.index_transcript(URL, [("alpha", "one"), ("beta", "two"), ("gamma", "three")])
+    index.index_transcript(URL, [("alpha", "one"), ("beta", "two")])
+    assert index.search("gamma") == []
+    assert len(rows(index)) == 4
+
+def test_other_chats_are_untouched(index):
+    index.index_transcript(URL, [("alpha", "one")])
+    index.index_transcript("https://poe.com/chat/other", [("alpha", "two")])
+    index.index_transcript(URL, [("beta", "three")])
+    assert [hit['chat_url'] for hit in index.search("alpha")] == ["https://poe.com/chat/other"]
+
+def export(tmp_path, index, pairs, append_to=None, first_index=1):
+    writer = TranscriptWriter(str(tmp_path), URL, search_index=index)
+    writer.add_batch(pairs)
+    return writer.finish(append_to=append_to, first_index=first_index)
+
+def test_positional_keys_do_not_collide_across_exports(tmp_path, index):
+    # Pairs without DOM ids are keyed by distance from the newest pair
+    path = export(tmp_path, index, [("tail:2", "old question", "old answer"), ("tail:1", "last question", "last answer")])
+    export(tmp_path, index, [("tail:1", "new question", "new answer")], append_to=path, first_index=3)
+
+    assert [r[2] for r in rows(index)] == [1, 1, 2, 2, 3, 3]
+    assert index.search("last")[0]['pair_index'] == 2
+    assert index.search("new")[0]['pair_index'] == 3
+
+def test_full_reexport_leaves_one_row_per_message(tmp_path, index):
+    pairs = [("m1", "hello there", "hi"), ("m2", "bye now", "bye")]
+    export(tmp_path, index, pairs)
+    export(tmp_path, index, [("tail:2", "hello there", "hi"), ("tail:1", "bye now", "bye")])
+
+    assert [(r[0], r[2]) for r in rows(index)] == [("pair:1", 1), ("pair:1", 1), ("pair:2", 2), ("pair:2", 2)]
+    assert len(index.search("hello")) == 1
+
+def check_fts(index):
+    # rank 1 also checks the index against the external content table
+    index.connection.execute("INSERT INTO entries_fts(entries_fts, rank) VALUES ('integrity-check', 1)")
+
+def test_append_over_an_existing_numbering_keeps_the_full_text_table_in_step(tmp_path, index):
+    path = export(tmp_path, index, [("tail:2", "alpha question", "alpha answer"),
+                                    ("tail:1", "beta question", "beta answer")])
+    export(tmp_path, index, [("tail:1", "gamma question", "gamma answer")], append_to=path, first_index=2)
+
+    check_fts(index)
+    assert [(r[0], r[3]) for r in rows(index) if r[1] == "human"] == [("pair:1", "alpha question"),
+                                                                       ("pair:2", "gamma question")]
+    assert index.search("gamma")[0]['pair_index'] == 2
+    assert index.connection.execute("SELECT COUNT(*) FROM entries_fts WHERE entries_fts MATCH 'beta'").fetchone() == (0,)
+
+def test_partial_incremental_run_keeps_earlier_messages(tmp_path, index):
+    path = export(tmp_path, index, [(f"m{i}", f"hello{i}", f"reply{i}") for i in range(5)])
+
+    writer = TranscriptWriter(str(tmp_path), URL, search_index=index)
+    writer.add_batch([(f"m{i}", f"hello{i}", f"reply{i}") for i in range(5, 7)])
+    writer.finish(keep_checkpoint=True)
+
+    assert len(rows(index)) == 14
+    assert index.search("hello0")[0]['pair_index'] == 1
+    check_fts(index)
+
+    # The resumed run completes the append and numbers the new pairs
+    resumed = TranscriptWriter(str(tmp_path), URL, search_index=index)
+    resumed.finish(append_to=path, first_index=6)
+    assert index.search("hello6")[0]['pair_index'] == 7
+    assert len(rows(index)) == 14
@@ -0,0 +1,80 @@
+import os
+import stat
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import poe_session
+from poe_session import session_path, load_cookies, save_session, session_is_valid, DEFAULT_SESSION_FILE
+
+class SettingsHandler(BaseHTTPRequestHandler):
+    # /live is a logged-in settings page, /form shows the login form with a
+    # 200, /redirect sends to the login page and /cleared drops the cookie
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/login")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b'<form><input type="email" name="email"></form>' if self.path == "/form" else b"<h1>Settings</h1>"
+        self.send_response(200)
+        if self.path == "/cleared":
+            self.send_header("Set-Cookie", f"{poe_session.AUTH_COOKIE}=; Max-Age=0; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture(scope="module")
+def settings_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SettingsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def auth_cookies(expiry=None):
+    cookie = {'name': poe_session.AUTH_COOKIE, 'value': "secret", 'domain': "127.0.0.1", 'path': "/"}
+    if expiry is not None:
+        cookie['expiry'] = expiry
+    return [cookie]
+
+class CookieDriver:
+    def get_cookies(self):
+        return auth_cookies() + [{'name': "other", 'value': "1", 'extra': "dropped"}]
+
+def test_session_file_is_read_from_the_environment_at_call_time(monkeypatch):
+    monkeypatch.delenv('POE_SESSION_FILE', raising=False)
+    assert session_path() == DEFAULT_SESSION_FILE
+    monkeypatch.setenv('POE_SESSION_FILE', "from_env.json")
+    assert session_path() == "from_env.json"
+    assert session_path("explicit.json") == "explicit.json"
+
+def test_saved_session_is_private_and_loads_back(tmp_path, monkeypatch):
+    monkeypatch.setenv('POE_SESSION_FILE', str(tmp_path / "session.json"))
+    save_session(CookieDriver())
+
+    assert stat.S_IMODE(os.stat(tmp_path / "session.json").st_mode) == 0o600
+    cookies = load_cookies()
+    assert [c['name'] for c in cookies] == [poe_session.AUTH_COOKIE, "other"]
+    assert 'extra' not in cookies[1]
+
+def test_unreadable_session_file_is_ignored(tmp_path):
+    (tmp_path / "bad.json").write_text("{not json")
+    assert load_cookies(str(tmp_path / "bad.json")) is None
+
+@pytest.mark.parametrize("path, valid", [("/live", True), ("/form", False), ("/redirect", False), ("/cleared", False)])
+def test_session_check_needs_a_logged_in_page(settings_server, monkeypatch, path, valid):
+    monkeypatch.setattr(poe_session, 'SESSION_CHECK_URL', settings_server + path)
+    assert session_is_valid(auth_cookies()) is valid
+
+def test_session_check_needs_a_live_auth_cookie(settings_server, monkeypatch):
+    monkeypatch.setattr(poe_session, 'SESSION_CHECK_URL', settings_server + "/live")
+    assert not session_is_valid([{'name': "other", 'value': "1"}])
+    assert not session_is_valid(auth_cookies(expiry=time.time() - 60))
+    assert session_is_valid(auth_cookies(expiry=time.time() + 3600))
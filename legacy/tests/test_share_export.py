@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+import poe_share_export
+from poe_share_export import (NextDataParser, normalize_share_url, parse_share_messages, pair_messages,
+                              all_attachment_urls, bot_name_from, fetch_next_data)
+
+NEXT_DATA = {
+    'props': {'pageProps': {'data': {'mainQuery': {'chatShare': {'messagesConnection': {'edges': [
+        {'node': {'author': "Claude-3", 'text': "Welcome back"}},
+        {'node': {'author': "human", 'text': "Draw a cat", 'attachments': [
+            {'file': {'url': "https://cdn.example/cat-sketch.png"}}]}},
+        {'node': {'author': "Claude-3", 'text': "Here is a cat </b> & more", 'attachments': [
+            {'url': " https://cdn.example/cat.png "}, {'file': {'url': "https://cdn.example/cat.png"}},
+            {'url': ""}, None]}},
+        {'node': {'author': "human", 'text': "Thanks"}},
+        {'node': {'author': "human", 'text': "Another one?"}},
+        None,
+    ]}}}}}},
+}
+
+def share_page(next_data):
+    # The payload as Next.js embeds it, with some markup on either side
+    payload = json.dumps(next_data).replace("</", "<\\/")
+    return ('<!DOCTYPE html><html><head><script src="/app.js"></script></head><body><div id="__next"></div>'
+            f'<script id="__NEXT_DATA__" type="application/json">{payload}</script>'
+            '<script>window.late = true;</script></body></html>')
+
+def parse_page(page, chunk_size):
+    parser = NextDataParser()
+    for start in range(0, len(page), chunk_size):
+        parser.feed(page[start:start + chunk_size])
+    return parser
+
+@pytest.mark.parametrize("raw_url, expected", [
+    ("https://poe.com/s/AbC123", "https://poe.com/s/AbC123"),
+    ("  https://poe.com/s/AbC123\n", "https://poe.com/s/AbC123"),
+    ("https://POE.com/s/AbC123", "https://poe.com/s/AbC123"),
+    ("http://poe.com/s/AbC123", None),
+    ("https://poe.com/s/AbC123?ref=x", None),
+    ("https://poe.com/s/AbC123#top", None),
+    ("https://poe.com/s/AbC123/extra", None),
+    ("https://poe.com/chat/AbC123", None),
+    ("https://user:pw@poe.com/s/AbC123", None),
+    ("https://poe.com.evil.example/s/AbC123", None),
+    ("https://[poe.com/s/AbC123", None),
+])
+def test_normalize_share_url(raw_url, expected):
+    assert normalize_share_url(raw_url) == expected
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1 << 20])
+def test_parser_collects_next_data_across_chunks(chunk_size):
+    parser = parse_page(share_page(NEXT_DATA), chunk_size)
+    assert parser.saw_next_data and parser.done
+    assert json.loads("".join(parser.parts)) == NEXT_DATA
+
+def test_parser_ignores_other_scripts():
+    parser = parse_page('<script>var a = "{}";</script><script id="other">{}</script>', 8)
+    assert not parser.saw_next_data and parser.parts == []
+
+def test_fixture_page_parses_into_pairs():
+    parser = parse_page(share_page(NEXT_DATA), 50)
+    messages = parse_share_messages(json.loads("".join(parser.parts)))
+
+    assert [message['role'] for message in messages] == ["bot", "human", "bot", "human", "human", "bot"]
+    assert messages[2]['text'] == "Here is a cat </b> & more"
+    assert messages[5] == {'role': "bot", 'author': None, 'text': "", 'attachments': []}
+    assert bot_name_from(messages) == "Claude-3"
+    # Paired messages, in order: a bot message with nothing before it, a full
+    # pair, a human message with no reply, and one answered by an empty bot
+    assert pair_messages(messages) == [
+        ("", "Welcome back"),
+        ("Draw a cat", "Here is a cat </b> & more"),
+        ("Thanks", ""),
+        ("Another one?", ""),
+    ]
+
+def test_attachments_are_collected_once_in_order():
+    messages = parse_share_messages(NEXT_DATA)
+    assert messages[1]['attachments'] == ["https://cdn.example/cat-sketch.png"]
+    assert messages[2]['attachments'] == ["https://cdn.example/cat.png"]
+    assert all_attachment_urls(messages) == ["https://cdn.example/cat-sketch.png", "https://cdn.example/cat.png"]
+
+def test_trailing_human_message_is_kept():
+    messages = [{'role': "human", 'text': "Q1"}, {'role': "bot", 'text': "A1"}, {'role': "human", 'text': "Q2"}]
+    assert pair_messages(messages) == [("Q1", "A1"), ("Q2", "")]
+
+def test_older_payload_shape_is_read():
+    next_data = {'props': {'pageProps': {'data': {'mainQuery': {'chatShare': {'messages': [
+        {'author': "human", 'text': "Hi"}, {'author': "GPT-4", 'text': None}]}}}}}}
+    assert pair_messages(parse_share_messages(next_data)) == [("Hi", "")]
+
+def test_missing_chat_data_is_an_error():
+    with pytest.raises(ValueError):
+        parse_share_messages({'props': {'pageProps': {}}})
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body.encode('utf-8')
+        self.status_code = status_code
+        self.read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            self.read += 1
+            yield self.body[start:start + chunk_size]
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, **kwargs):
+        return self.response
+
+def test_fetch_stops_reading_after_the_payload(monkeypatch):
+    monkeypatch.setattr(poe_share_export, "READ_CHUNK_SIZE", 64)
+    page = share_page(NEXT_DATA) + "<p>" + "x" * 10000 + "</p>"
+    response = FakeResponse(page)
+    assert fetch_next_data("https://poe.com/s/AbC123", FakeSession(response)) == NEXT_DATA
+    assert response.read < len(page) // 64
+
+def test_fetch_reports_a_missing_share():
+    with pytest.raises(ValueError, match="not found"):
+        fetch_next_data("https://poe.com/s/gone", FakeSession(FakeResponse("", status_code=404)))
@@ -0,0 +1,74 @@
+import json
+
+from poe_sync_state import SyncState, KEPT_KEYS, pairs_after_known, stable_keys
+from poe_text_downloader import known_keys_for, finish_transcript
+from poe_transcript_writer import TranscriptWriter
+
+URL = "https://poe.com/chat/abc123"
+
+def test_state_round_trips(tmp_path):
+    SyncState(str(tmp_path), URL, "text").save(["m1", "m2"], transcript="t.txt", pairs=2)
+    state = SyncState(str(tmp_path), URL, "text")
+    assert state.known_keys == {"m1", "m2"}
+    assert state.get('pairs') == 2
+    assert SyncState(str(tmp_path), URL, "images").known_keys == set()
+
+def test_keys_merge_with_earlier_runs_and_are_capped(tmp_path):
+    state = SyncState(str(tmp_path), URL, "text")
+    state.save([f"m{i}" for i in range(15)])
+    state.save([f"m{i}" for i in range(10, 30)] + ["tail:1"])
+    assert state.data['keys'] == [f"m{i}" for i in range(30 - KEPT_KEYS, 30)]
+
+def test_positional_keys_are_never_kept():
+    assert stable_keys(["m1", "tail:2", "", None, "m2"]) == ["m1", "m2"]
+
+def test_state_for_another_chat_is_ignored(tmp_path):
+    state = SyncState(str(tmp_path), URL, "text")
+    state.save(["m1"])
+    with open(state.path, encoding='utf-8') as f:
+        data = json.load(f)
+    data['chat_url'] = "https://poe.com/chat/other"
+    with open(state.path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    assert SyncState(str(tmp_path), URL, "text").known_keys == set()
+
+def test_unreadable_state_is_ignored(tmp_path):
+    state = SyncState(str(tmp_path), URL, "text")
+    with open(state.path, 'w', encoding='utf-8') as f:
+        f.write("{not json")
+    assert SyncState(str(tmp_path), URL, "text").known_keys == set()
+
+def test_pairs_after_the_newest_known_pair_are_new():
+    pairs = [{'key': key} for key in ("m1", "m2", "m3", "m4")]
+    assert pairs_after_known(pairs, {"m1", "m2"}) == (pairs[2:], True)
+    assert pairs_after_known(pairs, {"x"}) == (pairs, False)
+
+def test_known_keys_need_the_transcript_in_the_same_format(tmp_path):
+    transcript = tmp_path / "t.txt"
+    transcript.write_text("")
+    state = SyncState(str(tmp_path), URL, "text")
+    state.save(["m1"], transcript=str(transcript), format="text")
+    assert known_keys_for(state, "text") == {"m1"}
+    assert known_keys_for(state, "jsonl") is None
+    transcript.unlink()
+    assert known_keys_for(state, "text") is None
+
+def test_incremental_export_appends_and_numbers_on(tmp_path):
+    save_dir = str(tmp_path)
+    sync = SyncState(save_dir, URL, "text")
+    writer = TranscriptWriter(save_dir, URL)
+    writer.add_batch([(f"m{i}", f"Question {i}", f"Answer {i}") for i in range(1, 4)])
+    first = finish_transcript(writer, sync)
+
+    sync = SyncState(save_dir, URL, "text")
+    known_keys = known_keys_for(sync, "text")
+    writer = TranscriptWriter(save_dir, URL)
+    writer.add_batch([(f"m{i}", f"Question {i}", f"Answer {i}") for i in range(4, 6)])
+    writer.reached_known = True
+    second = finish_transcript(writer, sync, known_keys)
+
+    assert second == first
+    with open(first, encoding='utf-8') as f:
+        text = f.read()
+    assert [f"Message Pair {i}:" in text for i in range(1, 6)] == [True] * 5
+    assert SyncState(save_dir, URL, "text").get('pairs') == 5
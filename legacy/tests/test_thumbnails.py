@@ -0,0 +1,64 @@
+import os
+import hashlib
+
+import pytest
+from PIL import Image
+
+import poe_thumbnails
+from poe_thumbnails import build_previews, load_cache, THUMBS_DIRNAME, INDEX_FILENAME
+
+@pytest.fixture
+def images(tmp_path):
+    # One file named the way downloads are, and one that has to be hashed
+    Image.new('RGB', (800, 400), (200, 30, 30)).save(tmp_path / "photo & co.png")
+    body = tmp_path / "tmp.png"
+    Image.new('RGB', (300, 600), (30, 30, 200)).save(body)
+    saved = tmp_path / f"image_0_{hashlib.md5(body.read_bytes()).hexdigest()}.png"
+    os.rename(body, saved)
+    return tmp_path
+
+def thumb_sizes(directory):
+    thumbs = os.path.join(directory, THUMBS_DIRNAME)
+    sizes = {}
+    for name in os.listdir(thumbs):
+        if name.endswith("_thumb.jpg"):
+            with Image.open(os.path.join(thumbs, name)) as img:
+                sizes[name] = img.size
+    return sizes
+
+def test_second_run_reuses_the_cache(images, monkeypatch):
+    build_previews(str(images), workers=1)
+    first = thumb_sizes(images)
+    assert sorted(first.values()) == [(128, 256), (256, 128)]
+
+    # Nothing is left to render, so no worker pool is started
+    monkeypatch.setattr(poe_thumbnails, "ProcessPoolExecutor", None)
+    build_previews(str(images), workers=1)
+    assert thumb_sizes(images) == first
+
+def test_changed_size_renders_new_previews(images):
+    build_previews(str(images), workers=1)
+    build_previews(str(images), workers=1, thumb_size=64, preview_size=200)
+
+    cache = load_cache(os.path.join(images, THUMBS_DIRNAME))
+    small = {key: info for key, info in cache.items() if key.endswith("_64_200")}
+    assert sorted(tuple(info['thumb']) for info in small.values()) == [(32, 64), (64, 32)]
+    assert sorted(size for name, size in thumb_sizes(images).items() if "_64_200_" in name) == [(32, 64), (64, 32)]
+    with open(images / INDEX_FILENAME, encoding='utf-8') as f:
+        page = f.read()
+    for key in small:
+        assert f'{THUMBS_DIRNAME}/{key}_thumb.jpg' in page
+
+def test_contact_sheet_links_every_image(images):
+    index_path = build_previews(str(images), workers=1)
+    with open(index_path, encoding='utf-8') as f:
+        page = f.read()
+
+    assert page.count("<figure>") == 2
+    assert 'href="photo &amp; co.png"' in page
+    assert 'width="256" height="128"' in page
+    assert "800&times;400" in page
+    # The downloaded file keeps the position from its name
+    assert page.index("image_0_") < page.index("photo &amp; co.png")
+    for key in load_cache(os.path.join(images, THUMBS_DIRNAME)):
+        assert f'{THUMBS_DIRNAME}/{key}_preview.jpg' in page
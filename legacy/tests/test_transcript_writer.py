@@ -0,0 +1,60 @@
+import os
+import json
+
+from poe_transcript_writer import TranscriptWriter, chat_state_name
+
+URL = "https://poe.com/chat/abcdefghijklmnopqrstuvwxyz"
+
+def pairs(start, stop):
+    return [(f"m{i}", f"Question {i}", f"Answer {i}") for i in range(start, stop)]
+
+def test_state_names_differ_for_chats_sharing_a_prefix():
+    other = URL + "-2"
+    assert chat_state_name(URL) != chat_state_name(other)
+    assert chat_state_name(URL).startswith("abcdefghijklmnopqrst_")
+
+def test_batches_are_written_oldest_first(tmp_path):
+    writer = TranscriptWriter(str(tmp_path), URL, "jsonl")
+    writer.add_batch(pairs(10, 20))
+    writer.add_batch(pairs(0, 12))
+    path = writer.finish()
+
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f][1:]
+    assert [r['human'] for r in records] == [f"Question {i}" for i in range(20)]
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".poe_chat_")]
+
+def test_writer_resumes_from_checkpoint(tmp_path):
+    writer = TranscriptWriter(str(tmp_path), URL, checkpoint_every=5)
+    writer.add_batch(pairs(10, 20))
+    writer.spool.close()
+
+    resumed = TranscriptWriter(str(tmp_path), URL)
+    assert len(resumed) == 10
+    assert resumed.add_batch(pairs(0, 12)) == 10
+    assert [h for h, _ in resumed.iter_pairs()] == [f"Question {i}" for i in range(20)]
+    resumed.finish()
+
+def test_checkpoint_for_another_chat_starts_fresh(tmp_path):
+    writer = TranscriptWriter(str(tmp_path), URL, checkpoint_every=1)
+    writer.add_batch(pairs(0, 3))
+    writer.spool.close()
+    with open(writer.checkpoint_path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    checkpoint['chat_url'] = "https://poe.com/chat/someone-else"
+    with open(writer.checkpoint_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+
+    fresh = TranscriptWriter(str(tmp_path), URL)
+    assert len(fresh) == 0
+    assert fresh.add_batch(pairs(0, 3)) == 3
+    fresh.finish()
+
+def test_unreadable_checkpoint_starts_fresh(tmp_path):
+    writer = TranscriptWriter(str(tmp_path), URL, checkpoint_every=1)
+    writer.add_batch(pairs(0, 3))
+    writer.spool.close()
+    with open(writer.checkpoint_path, 'w', encoding='utf-8') as f:
+        f.write("{")
+
+    assert len(TranscriptWriter(str(tmp_path), URL)) == 0
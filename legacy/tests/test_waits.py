@@ -0,0 +1,48 @@
+from poe_waits import wait_for_more_messages, wait_for_network_idle, RESOURCE_COUNT_JS, SCROLL_STATE_JS
+
+class ScriptedDriver:
+    # Answers execute_script for one script from a list of results; the last
+    # result repeats once the list runs out
+    def __init__(self, script, results):
+        self.script = script
+        self.results = list(results)
+        self.calls = 0
+
+    def execute_script(self, script, *args):
+        assert script == self.script
+        self.calls += 1
+        return self.results.pop(0) if len(self.results) > 1 else self.results[0]
+
+def test_more_messages_waits_for_the_count_to_change():
+    driver = ScriptedDriver(SCROLL_STATE_JS, [{'pairs': 20, 'trigger': True}] * 3 + [{'pairs': 40, 'trigger': True}])
+
+    state = wait_for_more_messages(driver, 20, timeout=2)
+
+    assert state == {'pairs': 40, 'trigger': True}
+    assert driver.calls == 4
+
+def test_more_messages_returns_when_the_trigger_is_gone():
+    driver = ScriptedDriver(SCROLL_STATE_JS, [{'pairs': 20, 'trigger': False}])
+
+    assert wait_for_more_messages(driver, 20, timeout=2) == {'pairs': 20, 'trigger': False}
+
+def test_more_messages_times_out():
+    driver = ScriptedDriver(SCROLL_STATE_JS, [{'pairs': 20, 'trigger': True}])
+
+    assert wait_for_more_messages(driver, 20, timeout=0.3) is False
+
+def test_network_idle_needs_a_stable_count():
+    counts = [['loading', 1], ['complete', 300], ['complete', 301], ['complete', 302]]
+    driver = ScriptedDriver(RESOURCE_COUNT_JS, counts)
+
+    assert wait_for_network_idle(driver, timeout=3, idle_time=0.2, poll_frequency=0.05)
+    assert driver.calls > len(counts)
+
+def test_network_idle_times_out_while_requests_keep_finishing():
+    driver = ScriptedDriver(RESOURCE_COUNT_JS, [['complete', n] for n in range(1000)])
+
+    assert not wait_for_network_idle(driver, timeout=0.5, idle_time=0.2, poll_frequency=0.01)
+
+def test_resource_count_uses_an_observer():
+    # The resource timing buffer stops at 250 entries; only an observer keeps counting
+    assert "PerformanceObserver" in RESOURCE_COUNT_JS